@@ -1,10 +1,23 @@
 import os
+import sys
 import time
 import shutil
 
+# 여러 단계가 함께 쓰는 common 패키지를 불러올 수 있도록 저장소 루트를 추가한다
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from utils.video_slicing import VideoProcessor
+from utils.frame_sampling import FrameSampler
+from utils.frame_writer import FrameWriter
+from utils.area_table import AreaTable
+from utils.backbone_features import BackboneFeatureSink
+from utils.prediction_sinks import ResultsStoreSink
 from utils.ultralytics import InstanceSegmentation
 from utils.convert_inference_to_video import InstanceSegmentationImageComposer
+from common.model_registry import registry
+from common.results_store import ResultsStore
+from common.frame_manifest import FrameManifest
+from common.frame_pack import FramePack
 
 class Main:
     """
@@ -18,6 +31,28 @@ class Main:
         - inference_results_name (str): Name of the directory to save instance segmentation results.
         - pred (str): Path to the directory containing instance segmentation prediction results.
         - result_name (str): Name of the directory to save the final result video.
+        - stream (bool): Feed decoded frames straight into inference instead of reading them back from disk.
+        - save_frames (bool): Whether to keep writing the extracted frames in stream mode (frame_matching reads them).
+        - sampler (FrameSampler, optional): Sampler deciding which frames are kept. None keeps every frame.
+        - manifest_path (str, optional): Path to save the FrameManifest of the kept frames, ending with '.npy'.
+        - label_manifest_path (str, optional): Path of the FrameManifest of the video whose results are in label_dir.
+                                               Its detection flags replace scanning label_dir.
+        - writer_workers (int): Number of parallel frame writer workers. 0 writes frames on the decoding thread.
+                                With decode_workers > 1 they are split between the decoding processes.
+        - decode_workers (int): Number of processes decoding time segments in parallel when not streaming. 1 decodes serially.
+                                Packed frames are always decoded serially.
+        - device (int or str, optional): Inference device. None uses CUDA if available, otherwise cpu.
+        - export_format (str, optional): None, 'onnx' or 'torchscript' to run an exported graph of the model.
+        - save_labels (bool): Whether to write YOLO label files. Areas go to the area table either way.
+        - save_images (bool): Whether to write annotated images and compose the result video from them afterwards.
+                              When False, the result video is composed during inference.
+        - backbone_features (bool): Whether to save the pooled backbone activations of every frame as retrieval features for frame_matching.
+        - store (ResultsStore, optional): Results store receiving the frames, detections and polygons of the video,
+                                          under the video file name as survey. None writes _image_info.txt instead.
+        - area_mode (str): 'sum' or 'union' per-class area recorded in the area table and the results store.
+                           Must match the area_mode of comparative_analysis for the table to be used there.
+        - pack_frames (bool): Whether to append the extracted frames to one FramePack (output_folder + '.pack') and the annotated
+                              images to another (pred + '.pack') instead of writing one image file per frame.
 
     Methods:
         - runner(): Execute the video processing, instance segmentation, and result video creation.
@@ -35,7 +70,10 @@ class Main:
         main_instance.runner()
     """
     
-    def __init__(self, video_path, output_folder, model_path, source_dir, inference_results_name, label_dir, pred, result_name):
+    def __init__(self, video_path, output_folder, model_path, source_dir, inference_results_name, label_dir, pred, result_name,
+                 stream=False, save_frames=True, sampler=None, manifest_path=None, label_manifest_path=None,
+                 writer_workers=0, decode_workers=1, device=None, export_format=None,
+                 save_labels=False, save_images=False, backbone_features=False, store=None, area_mode='sum', pack_frames=False):
         """
         Initializes the Main class with input parameters.
 
@@ -47,6 +85,21 @@ class Main:
             - inference_results_name (str): Name of the directory to save instance segmentation results.
             - pred (str): Path to the directory containing instance segmentation prediction results.
             - result_name (str): Name of the directory to save the final result video.
+            - stream (bool): Feed decoded frames straight into inference instead of reading them back from disk. Default is False.
+            - save_frames (bool): Whether to keep writing the extracted frames in stream mode. Default is True.
+            - sampler (FrameSampler, optional): Sampler deciding which frames are kept. Default is None.
+            - manifest_path (str, optional): Path to save the FrameManifest of the kept frames. Default is None.
+            - label_manifest_path (str, optional): Path of the FrameManifest of the video whose results are in label_dir. Default is None.
+            - writer_workers (int): Number of parallel frame writer workers. Default is 0 (no writer pool).
+            - decode_workers (int): Number of segment decoding processes when not streaming. Default is 1.
+            - device (int or str, optional): Inference device. Default is None (automatic).
+            - export_format (str, optional): None, 'onnx' or 'torchscript'. Default is None.
+            - save_labels (bool): Whether to write YOLO label files. Default is False.
+            - save_images (bool): Whether to write annotated images and compose the video from them. Default is False.
+            - backbone_features (bool): Whether to save the pooled backbone activations as retrieval features. Default is False.
+            - store (ResultsStore, optional): Results store receiving the inference results. Default is None.
+            - area_mode (str): 'sum' or 'union' per-class area. Default is 'sum'.
+            - pack_frames (bool): Whether to pack the extracted frames and the annotated images. Default is False.
         """
         self.video_path = video_path
         self.output_folder = output_folder
@@ -56,23 +109,89 @@ class Main:
         self.label_dir = label_dir
         self.pred = pred
         self.result_name = result_name
+        self.stream = stream
+        self.save_frames = save_frames
+        self.sampler = sampler
+        self.manifest_path = manifest_path
+        self.label_manifest_path = label_manifest_path
+        self.writer_workers = writer_workers
+        self.decode_workers = decode_workers
+        self.device = device
+        self.export_format = export_format
+        self.save_labels = save_labels
+        self.save_images = save_images
+        self.backbone_features = backbone_features
+        self.store = store
+        self.area_mode = area_mode
+        self.pack_frames = pack_frames
+        self.survey = os.path.splitext(os.path.basename(video_path))[0]
         
     def main(self):
         """
         Execute the video processing, instance segmentation, and result video creation.
         """
-        processor = VideoProcessor(self.video_path, self.output_folder)
-        processor.extract_frames_from_video()
+        pack = None
+        source_dir = self.source_dir
+        if self.pack_frames and (self.save_frames or not self.stream):
+            # 프레임마다 파일을 만들지 않고 영상 하나를 pack 파일 하나에 이어 붙인다
+            pack = FramePack(self.output_folder + FramePack.SUFFIX, 'w')
+            source_dir = pack.path
+        writer = FrameWriter(self.output_folder, workers=self.writer_workers, pack=pack) if self.writer_workers else None
+        processor = VideoProcessor(self.video_path, self.output_folder, self.sampler, writer, pack)
         
         instance_seg = InstanceSegmentation(model_path = self.model_path, 
-                                            source_dir = self.source_dir, 
+                                            source_dir = source_dir, 
                                             inference_results_name = self.inference_results_name,
-                                            label_dir = self.label_dir)
-        instance_seg.predictor()
-        instance_seg.make_label_image_info()
+                                            label_dir = self.label_dir,
+                                            device = self.device,
+                                            export_format = self.export_format,
+                                            pack_images = self.pack_frames)
+        imgs_path = self.pred + FramePack.SUFFIX if self.pack_frames else self.pred
+        composer = InstanceSegmentationImageComposer(imgs_path, 60, self.result_name)
+        area_table = AreaTable(area_mode=self.area_mode)
+        # 주석 이미지를 저장하지 않으면 추론하면서 바로 결과 영상을 만든다
+        extra_sinks = [] if self.save_images else [composer]
+        if self.backbone_features:
+            # 분할 추론 한 번으로 frame_matching에서 쓸 검색 feature도 함께 얻는다
+            extra_sinks.append(BackboneFeatureSink(instance_seg.model,
+                                                   os.path.join(instance_seg.save_dir, BackboneFeatureSink.FILE_NAME),
+                                                   frame_dir=pack.path if pack is not None else self.output_folder))
+        if self.store is not None:
+            extra_sinks.append(ResultsStoreSink(self.store, self.survey, area_table))
+        try:
+            if self.stream:
+                instance_seg.stream_predictor(processor.iter_frames(save=self.save_frames),
+                                              area_table=area_table,
+                                              save_images=self.save_images,
+                                              save_labels=self.save_labels,
+                                              extra_sinks=extra_sinks)
+            else:
+                if self.decode_workers > 1 and pack is None:
+                    processor.extract_frames_parallel(workers=self.decode_workers)
+                else:
+                    processor.extract_frames_from_video()
+                instance_seg.stream_source_predictor(area_table=area_table,
+                                                     save_images=self.save_images,
+                                                     save_labels=self.save_labels,
+                                                     extra_sinks=extra_sinks)
+        finally:
+            if writer is not None:
+                writer.close()
+            if pack is not None:
+                pack.close()
+        manifest = None
+        if self.manifest_path:
+            # 추론 결과의 클래스별 검출 여부를 매니페스트에 함께 기록한다
+            manifest = processor.write_manifest(self.manifest_path,
+                                                detections=dict(zip(area_table.frames, area_table.instances)))
+        if self.store is None:
+            label_manifest = None
+            if self.label_manifest_path and os.path.exists(self.label_manifest_path):
+                label_manifest = FrameManifest(self.label_manifest_path)
+            instance_seg.make_label_image_info(label_manifest)
         
-        composer = InstanceSegmentationImageComposer(self.pred, 60, self.result_name)
-        composer.frame_to_video()
+        if self.save_images:
+            composer.frame_to_video(manifest)
         
 if __name__ == "__main__":
     PATH = os.getcwd()
@@ -103,11 +222,22 @@ if __name__ == "__main__":
     pred_02 = os.path.join(PATH, 'runs/segment', 'inference_video_02')
     result_name_02 = 'pred_result_video_02'  
     
-    run_01 = Main(videos_01, outfolder_01, model_path, source_dir_01, inference_results_name_01, label_dir_01, pred_01, result_name_01)
+    # 거의 같은 연속 프레임은 건너뛰고, 변화가 적어도 0.5초마다 한 장은 남긴다
+    sampler = FrameSampler(mode='scene', scene_threshold=0.2, max_gap_sec=0.5)
+    manifest_01 = os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_01.npy')
+    manifest_02 = os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_02.npy')
+    store = ResultsStore(os.path.join(PATH, 'dataset', 'results.db'))
+    
+    run_01 = Main(videos_01, outfolder_01, model_path, source_dir_01, inference_results_name_01, label_dir_01, pred_01, result_name_01,
+                  stream=True, sampler=sampler, manifest_path=manifest_01, label_manifest_path=manifest_01, writer_workers=4, store=store,
+                  pack_frames=True)
     run_01.main()
     
-    run_02 = Main(videos_02, outfolder_02, model_path, source_dir_02, inference_results_name_02, label_dir_01, pred_02, result_name_02)
+    run_02 = Main(videos_02, outfolder_02, model_path, source_dir_02, inference_results_name_02, label_dir_01, pred_02, result_name_02,
+                  stream=True, sampler=sampler, manifest_path=manifest_02, label_manifest_path=manifest_01, writer_workers=4, store=store,
+                  pack_frames=True)
     run_02.main()
+    store.close()
     
     pred_result_video_01_path = os.path.join(pred_01, 'pred_result_video_01.mp4')
     destination_pred_result_video_01_path = os.path.join(PATH, 'results')
@@ -116,4 +246,6 @@ if __name__ == "__main__":
     pred_result_video_02_path = os.path.join(pred_02, 'pred_result_video_02.mp4')
     destination_pred_result_video_02_path = os.path.join(PATH, 'results')
     shutil.move(pred_result_video_02_path, destination_pred_result_video_02_path)
+    
+    registry.report()
     
\ No newline at end of file
@@ -0,0 +1,226 @@
+import pickle
+import numpy as np
+
+from common.polygon_raster import UnionRasterizer
+
+def mask_polygons(result):
+    """
+    Extract the mask polygons of a Results object, the same polygons save_txt writes to label files.
+    ultralytics recomputes masks.xyn on every access, so the polygons are kept on the result
+    and every sink of a prediction shares one extraction.
+
+    Parameters:
+        - result: ultralytics Results object.
+
+    Returns:
+        - polygons (list): List of (class_id, confidence, normalized polygon) tuples.
+    """
+    polygons = getattr(result, 'mask_polygons', None)
+    if polygons is None:
+        polygons = []
+        if result.masks is not None:
+            class_ids = result.boxes.cls.cpu().numpy().astype(int)
+            confidences = result.boxes.conf.cpu().numpy()
+            polygons = list(zip(class_ids, confidences, result.masks.xyn))
+        result.mask_polygons = polygons
+    return polygons
+
+class AreaTable:
+    """
+    A compact per-frame table of mask areas and confidences, filled straight from ultralytics results
+    during inference instead of being re-parsed from label files.
+
+    Parameters:
+        - image_width (int): Width of the frames the areas are measured in. Default is 1280.
+        - image_height (int): Height of the frames the areas are measured in. Default is 720.
+        - num_classes (int): Number of classes. Default is 3 (reinforcement, white_bleeding, red_bleeding).
+        - area_mode (str): 'sum' adds up the polygon areas of each class, 'union' counts the pixels covered by them,
+                           like PolygonAreaEngine of comparative_analysis. Default is 'sum'.
+
+    Attributes:
+        - frames (list): Frame names such as 'frame_0.5s'.
+        - areas (list): Per-frame total polygon area (or covered pixels in 'union' mode) of each class in pixels.
+        - confidences (list): Per-frame highest confidence of each class.
+        - instances (list): Per-frame number of instances of each class.
+
+    Methods:
+        - polygons(result): Extract (class_id, confidence, polygon) tuples from a Results object.
+        - measure(result): Polygons, per-class areas, highest confidences and instance counts of a Results object.
+        - polygon_area(polygon): Calculate the area of a normalized polygon in pixels.
+        - summarize(polygons): Per-class areas (of area_mode), highest confidences and instance counts of a frame.
+        - add(filename, result): Add a frame to the table.
+        - frames_with_detections(): Names of the frames with at least one instance.
+        - save(path): Save the table.
+        - load(path): Load a saved table.
+
+    Example:
+        area_table = AreaTable()
+        for filename, result in instance_segmentation.predict_frames(frames):
+            area_table.add(filename, result)
+        area_table.save('runs/segment/inference_video_01/area_table.pkl')
+    """
+
+    FILE_NAME = 'area_table.pkl'
+    MODES = ('sum', 'union')
+
+    def __init__(self, image_width=1280, image_height=720, num_classes=3, area_mode='sum'):
+        """
+        Initializes the AreaTable class.
+
+        Parameters:
+            - image_width (int): Width of the frames the areas are measured in. Default is 1280.
+            - image_height (int): Height of the frames the areas are measured in. Default is 720.
+            - num_classes (int): Number of classes. Default is 3.
+            - area_mode (str): 'sum' or 'union'. Default is 'sum'.
+        """
+        if area_mode not in self.MODES:
+            raise ValueError(f"Error: Unknown area mode '{area_mode}'.")
+
+        self.image_width = image_width
+        self.image_height = image_height
+        self.num_classes = num_classes
+        self.area_mode = area_mode
+        self.rasterizer = UnionRasterizer(image_width, image_height, num_classes) if area_mode == 'union' else None
+        self.frames = []
+        self.areas = []
+        self.confidences = []
+        self.instances = []
+        # 같은 결과를 받는 sink들이 면적을 다시 계산하지 않도록 마지막 결과를 기억한다
+        self.last_result = None
+        self.last_measure = None
+
+    def polygons(self, result):
+        """
+        Extract the mask polygons of a Results object, the same polygons save_txt writes to label files.
+
+        Parameters:
+            - result: ultralytics Results object.
+
+        Returns:
+            - polygons (list): List of (class_id, confidence, normalized polygon) tuples.
+        """
+        return mask_polygons(result)
+
+    def polygon_area(self, polygon):
+        """
+        Calculate the area of a normalized polygon in pixels with the shoelace formula.
+
+        Parameters:
+            - polygon (numpy.ndarray): (N, 2) array of normalized coordinates.
+
+        Returns:
+            - area (float): Area of the polygon. Polygons with fewer than 3 points have no area.
+        """
+        if len(polygon) < 3:
+            return 0.0
+        x = polygon[:, 0] * self.image_width
+        y = polygon[:, 1] * self.image_height
+        return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+    def summarize(self, polygons):
+        """
+        Per-class areas, highest confidences and instance counts of the polygons of a frame.
+
+        Parameters:
+            - polygons (list): List of (class_id, confidence, normalized polygon) tuples from polygons().
+
+        Returns:
+            - areas (numpy.ndarray): (num_classes,) total polygon area, or covered pixels in 'union' mode, of each class.
+            - confidences (numpy.ndarray): (num_classes,) highest confidence of each class.
+            - instances (numpy.ndarray): (num_classes,) number of instances of each class.
+        """
+        areas = np.zeros(self.num_classes, dtype=np.float64)
+        confidences = np.zeros(self.num_classes, dtype=np.float32)
+        instances = np.zeros(self.num_classes, dtype=np.int32)
+
+        for class_id, confidence, polygon in polygons:
+            if self.rasterizer is None:
+                areas[class_id] += self.polygon_area(polygon)
+            confidences[class_id] = max(confidences[class_id], confidence)
+            instances[class_id] += 1
+        if self.rasterizer is not None:
+            scale = np.array([self.image_width, self.image_height], dtype=np.float64)
+            areas = self.rasterizer.union_areas([class_id for class_id, _, _ in polygons],
+                                                [np.asarray(polygon) * scale for _, _, polygon in polygons])
+        return areas, confidences, instances
+
+    def measure(self, result):
+        """
+        Polygons and summary of a Results object. The sinks of a prediction are called one after another,
+        so the summary of the last result is reused instead of measuring the polygons again.
+
+        Parameters:
+            - result: ultralytics Results object.
+
+        Returns:
+            - polygons (list): List of (class_id, confidence, normalized polygon) tuples.
+            - areas, confidences, instances (numpy.ndarray): As returned by summarize().
+        """
+        if self.last_result is not result:
+            polygons = self.polygons(result)
+            self.last_measure = (polygons, *self.summarize(polygons))
+            self.last_result = result
+        return self.last_measure
+
+    def add(self, filename, result):
+        """
+        Add a frame to the table.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object of the frame.
+        """
+        _, areas, confidences, instances = self.measure(result)
+
+        self.frames.append(filename.split('.jpg')[0])
+        self.areas.append(areas)
+        self.confidences.append(confidences)
+        self.instances.append(instances)
+
+    def frames_with_detections(self):
+        """
+        Names of the frames with at least one instance, in the order they were added.
+
+        Returns:
+            - frames (list): Frame names such as 'frame_0.5s'.
+        """
+        return [name for name, instances in zip(self.frames, self.instances) if instances.any()]
+
+    def save(self, path):
+        """
+        Save the table.
+
+        Parameters:
+            - path (str): Output file path.
+        """
+        table = {
+            'image_size': (self.image_width, self.image_height),
+            'area_mode': self.area_mode,
+            'frames': self.frames,
+            'areas': np.array(self.areas, dtype=np.float64).reshape(-1, self.num_classes),
+            'confidences': np.array(self.confidences, dtype=np.float32).reshape(-1, self.num_classes),
+            'instances': np.array(self.instances, dtype=np.int32).reshape(-1, self.num_classes),
+        }
+        with open(path, 'wb') as f:
+            pickle.dump(table, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a saved table.
+
+        Parameters:
+            - path (str): Path of the saved table.
+
+        Returns:
+            - area_table (AreaTable): Loaded table.
+        """
+        with open(path, 'rb') as f:
+            table = pickle.load(f)
+
+        area_table = cls(*table['image_size'], num_classes=table['areas'].shape[1], area_mode=table.get('area_mode', 'sum'))
+        area_table.frames = table['frames']
+        area_table.areas = list(table['areas'])
+        area_table.confidences = list(table['confidences'])
+        area_table.instances = list(table['instances'])
+        return area_table
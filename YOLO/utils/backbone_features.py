@@ -0,0 +1,114 @@
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+import torch
+
+class BackboneFeatureSink:
+    """
+    Captures the globally pooled activations of a YOLO backbone layer during the segmentation forward pass
+    and saves them as a frame_matching feature dictionary, so the same network pass serves retrieval.
+
+    Parameters:
+        - model: ultralytics YOLO model loaded from a .pt file.
+        - save_path (str): Path to save the feature dictionary to.
+        - layer_index (int, optional): Index of the hooked layer in the model. Default is None (the last SPPF layer, end of the backbone).
+        - frame_dir (str, optional): Folder of the frame images, used for the 'path' entries. Default is None.
+
+    Methods:
+        - find_backbone_end(): Index of the last SPPF layer.
+        - hook(module, inputs, output): Forward hook pooling the activations of a batch.
+        - reset(predictor): Drops activations of forward passes that produced no results, e.g. warm-up.
+        - write(filename, result): Assign the next pooled activation to a prediction.
+        - close(): Remove the hook and save the feature dictionary.
+
+    Example:
+        sink = BackboneFeatureSink(instance_seg.model, os.path.join(instance_seg.save_dir, BackboneFeatureSink.FILE_NAME))
+        instance_seg.stream_predictor(frames, extra_sinks=[sink])
+    """
+
+    FILE_NAME = 'backbone_features.pkl'
+
+    def __init__(self, model, save_path, layer_index=None, frame_dir=None):
+        """
+        Initializes the BackboneFeatureSink class.
+
+        Parameters:
+            - model: ultralytics YOLO model loaded from a .pt file.
+            - save_path (str): Path to save the feature dictionary to.
+            - layer_index (int, optional): Index of the hooked layer. Default is None (last SPPF layer).
+            - frame_dir (str, optional): Folder of the frame images. Default is None.
+        """
+        if not isinstance(getattr(model, 'model', None), torch.nn.Module):
+            raise ValueError("Error: Backbone features need the PyTorch model, not an exported graph.")
+
+        self.model = model
+        self.save_path = save_path
+        self.frame_dir = frame_dir
+        self.layers = model.model.model
+        self.layer_index = layer_index if layer_index is not None else self.find_backbone_end()
+        self.pending = deque()
+        self.names = []
+        self.features = []
+
+        self.handle = self.layers[self.layer_index].register_forward_hook(self.hook)
+        model.add_callback('on_predict_batch_start', self.reset)
+
+    def find_backbone_end(self):
+        """
+        Index of the last SPPF layer, which ends the YOLOv8 backbone.
+
+        Returns:
+            - index (int): Layer index.
+        """
+        indexes = [i for i, layer in enumerate(self.layers) if type(layer).__name__ == 'SPPF']
+        if not indexes:
+            raise ValueError("Error: No SPPF layer found, pass layer_index explicitly.")
+        return indexes[-1]
+
+    def hook(self, module, inputs, output):
+        """
+        Forward hook pooling the (B, C, H, W) activations of a batch to (B, C) vectors.
+        """
+        pooled = output.float().mean(dim=(2, 3)).cpu().numpy()
+        self.pending.extend(pooled)
+
+    def reset(self, predictor):
+        """
+        Drops activations of forward passes that produced no results, e.g. the warm-up pass.
+        Called by ultralytics at the start of every batch, after the results of the previous batch were consumed.
+        """
+        self.pending.clear()
+
+    def write(self, filename, result):
+        """
+        Assign the next pooled activation to a prediction.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        self.names.append(filename)
+        self.features.append(self.pending.popleft())
+
+    def close(self):
+        """
+        Remove the hook and save the feature dictionary.
+        """
+        self.handle.remove()
+        callbacks = self.model.callbacks['on_predict_batch_start']
+        if self.reset in callbacks:
+            callbacks.remove(self.reset)
+
+        paths = [os.path.join(self.frame_dir, name) if self.frame_dir else name for name in self.names]
+        dim = self.features[0].shape[0] if self.features else 0
+        feature_dict = {
+            'indexes': list(range(len(self.names))),
+            'name': self.names,
+            'path': np.array(paths),
+            'features': np.array(self.features, dtype=np.float32).reshape(-1, dim),
+        }
+        os.makedirs(os.path.dirname(self.save_path), exist_ok=True)
+        with open(self.save_path, 'wb') as f:
+            pickle.dump(feature_dict, f)
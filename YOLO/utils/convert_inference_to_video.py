@@ -1,51 +1,87 @@
 import os
+import re
 import cv2
 import natsort
+import numpy as np
+
+from common.frame_pack import FramePack, list_frames, read_image
+from utils.area_table import mask_polygons
 
 class InstanceSegmentationImageComposer:
     """
     A class for creating a video using instance segmentation images.
+    The video is either composed offline from the annotated images, or streamed during inference
+    by drawing the mask polygons onto the original frames (write(), write_frame(), close()).
+    The images may also be read from a FramePack, in which case the video is saved next to it, in imgs_path without '.pack'.
+    Frames named with their timestamp ('frame_{t}s.jpg') are held until the next frame's timestamp,
+    so a video of sampled frames still plays in real time at fps.
 
     Parameters:
-        - imgs_path (str): Path to the folder containing input images.
+        - imgs_path (str): Path to the folder containing input images, or a FramePack path ending with '.pack'.
         - fps (int): Frame rate of the generated video.
         - out_file_name (str): Name of the generated video file. Default is 'pred_result'.
 
     Methods:
-        - img_file_sort(without_file_type=False): Sorts and returns the image files.
-        - frame_to_video(): Generates a video using the sorted image files.
+        - img_file_sort(without_file_type=False, manifest=None): Sorts and returns the image files.
+        - frame_time(filename): Timestamp of a frame from its filename.
+        - repeats(filename): Number of video frames the previous frame is held for before this one.
+        - frame_to_video(manifest=None): Generates a video using the sorted image files.
+        - open(width, height): Opens the video writer for streamed frames.
+        - draw_overlay(frame, polygons): Draws mask polygons and their labels onto a frame.
+        - write_frame(frame, polygons, filename=None): Draws the overlay and writes the frame to the open video.
+        - write(filename, result): Writes an ultralytics result, so the composer can be used as a prediction sink.
+        - close(): Releases the video writer.
 
     Example:
         composer = InstanceSegmentationImageComposer(imgs_path='input_images',
                                                      fps=30,
                                                      out_file_name='output_video')
         composer.frame_to_video()
+
+        # 추론 중에 바로 영상 만들기
+        composer = InstanceSegmentationImageComposer(imgs_path='runs/segment/inference_video_01', fps=60)
+        instance_segmentation.stream_predictor(frames, extra_sinks=[composer])
     """
+
+    CLASS_NAMES = {0: 'reinforcement', 1: 'white_bleeding', 2: 'red_bleeding'}
+    CLASS_COLORS = {0: (0, 128, 255), 1: (255, 255, 255), 2: (0, 0, 255)}
     
     def __init__(self, imgs_path, fps, out_file_name='pred_result'):
         """
         Initializes the InstanceSegmentationImageComposer.
 
         Parameters:
-            - imgs_path (str): Path to the folder containing input images.
+            - imgs_path (str): Path to the folder containing input images, or a FramePack path.
             - fps (int): Frame rate of the generated video.
             - out_file_name (str): Name of the generated video file. Default is 'pred_result'.
         """
         self.imgs_path = imgs_path
+        self.video_dir = imgs_path[:-len(FramePack.SUFFIX)] if imgs_path.endswith(FramePack.SUFFIX) else imgs_path
         self.fps = fps
         self.out_file_name = out_file_name
+        self.video_writer = None
+        # 샘플링된 프레임을 실제 시간만큼 보여 주기 위해 첫 프레임의 시각과 쓴 프레임 수를 기억한다
+        self.start_time = None
+        self.written = 0
+        self.last_frame = None
 
-    def img_file_sort(self, without_file_type=False):
+    def img_file_sort(self, without_file_type=False, manifest=None):
         """
         Sorts and returns the image files.
 
         Parameters:
             - without_file_type (bool): Whether to sort without file type. Default is False.
+            - manifest (FrameManifest, optional): Manifest of the inferred frames, already in time order.
+                                                  Default is None (scan imgs_path).
 
         Returns:
             - img_files (list): Sorted list of image files.
         """
-        img_files = [f for f in os.listdir(self.imgs_path) if f.endswith('.jpg') or f.endswith('.png')]
+        if manifest is not None:
+            img_files = manifest.names()
+            return img_files if without_file_type else [name + '.jpg' for name in img_files]
+
+        img_files = [f for f in list_frames(self.imgs_path) if f.endswith('.jpg') or f.endswith('.png')]
         img_files = [float((item.split('s')[0]).split('_')[1]) for item in img_files]
         img_files = natsort.natsorted(img_files)
 
@@ -55,25 +91,157 @@ class InstanceSegmentationImageComposer:
             img_files = ['frame_'+str(name)+'s.jpg' for name in img_files]
         return img_files
 
-    def frame_to_video(self):
+    def frame_time(self, filename):
+        """
+        Timestamp of a frame from its filename.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+
+        Returns:
+            - time_in_sec (float): Timestamp in seconds, or None when the filename has none.
+        """
+        match = re.search(r'frame_([0-9.]+)s', filename)
+        return float(match.group(1)) if match else None
+
+    def repeats(self, filename):
+        """
+        Number of extra copies of the previous frame needed before this frame, so it appears at its timestamp.
+        Also counts this frame as written.
+
+        Parameters:
+            - filename (str, optional): Frame filename such as 'frame_0.5s.jpg'.
+
+        Returns:
+            - repeats (int): Copies of the previous frame to write first. 0 without a timestamp.
+        """
+        time_in_sec = self.frame_time(filename) if filename else None
+        repeats = 0
+        if time_in_sec is not None:
+            if self.start_time is None:
+                self.start_time = time_in_sec
+            repeats = max(0, round((time_in_sec - self.start_time) * self.fps) - self.written)
+        self.written += repeats + 1
+        return repeats
+
+    def frame_to_video(self, manifest=None):
         """
         Generates a video using the sorted image files.
+
+        Parameters:
+            - manifest (FrameManifest, optional): Manifest of the inferred frames. Default is None (scan imgs_path).
         """
-        img_files = self.img_file_sort()
+        img_files = self.img_file_sort(manifest=manifest)
 
-        video_file = os.path.join(self.imgs_path, f'{self.out_file_name}.mp4')
+        os.makedirs(self.video_dir, exist_ok=True)
+        video_file = os.path.join(self.video_dir, f'{self.out_file_name}.mp4')
 
-        first_image = cv2.imread(os.path.join(self.imgs_path, img_files[0]))
+        first_image = read_image(os.path.join(self.imgs_path, img_files[0]))
         height, width = first_image.shape[:2] 
 
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         video_writer = cv2.VideoWriter(video_file, fourcc, self.fps, (width, height))
         print('video width:', width, ', height:', height)
 
+        self.start_time, self.written = None, 0
+        previous = None
         for image_file in img_files:
-            img = cv2.imread(os.path.join(self.imgs_path, image_file)) 
+            img = read_image(os.path.join(self.imgs_path, image_file))
+            # 첫 프레임은 기준 시각이므로 반복할 이전 프레임이 없다
+            for _ in range(self.repeats(image_file)):
+                video_writer.write(previous)
             video_writer.write(img)
+            previous = img
 
         video_writer.release()
         print(f'비디오가 생성되었습니다: {video_file}')
-        
\ No newline at end of file
+
+    def open(self, width, height):
+        """
+        Opens the video writer for streamed frames.
+
+        Parameters:
+            - width (int): Frame width.
+            - height (int): Frame height.
+        """
+        os.makedirs(self.video_dir, exist_ok=True)
+        self.video_file = os.path.join(self.video_dir, f'{self.out_file_name}.mp4')
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.video_writer = cv2.VideoWriter(self.video_file, fourcc, self.fps, (width, height))
+        print('video width:', width, ', height:', height)
+
+    def draw_overlay(self, frame, polygons, alpha=0.4):
+        """
+        Draws mask polygons and their labels onto a copy of the frame.
+
+        Parameters:
+            - frame (numpy.ndarray): BGR frame.
+            - polygons (list): List of (class_id, confidence, polygon) tuples with polygons in pixel coordinates.
+            - alpha (float): Opacity of the filled masks. Default is 0.4.
+
+        Returns:
+            - frame (numpy.ndarray): Annotated frame.
+        """
+        if not polygons:
+            return frame
+        
+        overlay = frame.copy()
+        for class_id, _, polygon in polygons:
+            if len(polygon) < 3:
+                continue
+            cv2.fillPoly(overlay, [np.asarray(polygon, dtype=np.int32)], self.CLASS_COLORS[class_id])
+        annotated = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
+        
+        for class_id, confidence, polygon in polygons:
+            if len(polygon) < 3:
+                continue
+            points = np.asarray(polygon, dtype=np.int32)
+            color = self.CLASS_COLORS[class_id]
+            cv2.polylines(annotated, [points], True, color, 2)
+            x, y = points.min(axis=0)
+            cv2.putText(annotated, f'{self.CLASS_NAMES[class_id]} {confidence:.2f}', (int(x), max(int(y) - 5, 15)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        return annotated
+
+    def write_frame(self, frame, polygons, filename=None):
+        """
+        Draws the overlay and writes the frame to the open video. Opens the video on the first frame.
+        With a timestamped filename, the previous frame is held until this frame's timestamp.
+
+        Parameters:
+            - frame (numpy.ndarray): BGR frame.
+            - polygons (list): List of (class_id, confidence, polygon) tuples with polygons in pixel coordinates.
+            - filename (str, optional): Frame filename such as 'frame_0.5s.jpg'. Default is None (no hold).
+        """
+        if self.video_writer is None:
+            height, width = frame.shape[:2]
+            self.open(width, height)
+        annotated = self.draw_overlay(frame, polygons)
+        for _ in range(self.repeats(filename)):
+            self.video_writer.write(self.last_frame)
+        self.video_writer.write(annotated)
+        self.last_frame = annotated
+
+    def write(self, filename, result):
+        """
+        Writes an ultralytics result to the open video, so the composer can be used as a prediction sink.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        height, width = result.orig_shape
+        scale = np.array([width, height], dtype=np.float32)
+        polygons = [(class_id, confidence, polygon * scale) for class_id, confidence, polygon in mask_polygons(result)]
+        self.write_frame(result.orig_img, polygons, filename)
+
+    def close(self):
+        """
+        Releases the video writer.
+        """
+        if self.video_writer is None:
+            return
+        self.video_writer.release()
+        self.video_writer = None
+        self.start_time, self.written, self.last_frame = None, 0, None
+        print(f'비디오가 생성되었습니다: {self.video_file}')
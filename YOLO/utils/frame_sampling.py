@@ -0,0 +1,159 @@
+import cv2
+import numpy as np
+
+class FrameSampler:
+    """
+    Utility class for choosing which decoded frames are kept, so that near-identical consecutive frames
+    are not passed on to inference, feature extraction and area analysis.
+
+    Parameters:
+        - mode (str): Sampling mode. 'all' keeps every frame, 'stride' keeps one frame every stride_sec seconds,
+                      'scene' keeps a frame when it differs enough from the last kept frame. Default is 'stride'.
+        - stride_sec (float): Time between kept frames in 'stride' mode. Default is 0.5.
+        - scene_method (str): 'histogram' (HSV histogram distance) or 'difference' (mean absolute difference of
+                              downscaled grayscale frames) in 'scene' mode. Default is 'histogram'.
+        - scene_threshold (float): Distance in [0, 1] above which a frame counts as a scene change. Default is 0.2.
+        - max_gap_sec (float, optional): In 'scene' mode, keep a frame at least this often even without a scene change,
+                                         so slow pans still get coverage. Default is 1.0, None disables it.
+        - blur_threshold (float, optional): Frames whose variance of Laplacian is below this value are rejected
+                                            in every mode. Default is None (no blur rejection).
+
+    Methods:
+        - reset(): Forget the previously kept frame.
+        - due(time_in_sec): Check whether a frame at the given time can be kept without looking at its content.
+        - keep(time_in_sec, frame): Decide whether the frame is kept and update the sampler state.
+        - sharpness(frame): Variance of Laplacian of the frame.
+        - signature(frame): Compact representation of a frame used for scene change detection.
+        - scene_distance(signature): Distance between a frame signature and the last kept frame.
+
+    Example:
+        sampler = FrameSampler(mode='scene', scene_threshold=0.2, blur_threshold=50.0)
+        video_processor = VideoProcessor(video_path='path/to/video.mp4', output_folder='path/to/output', sampler=sampler)
+        video_processor.extract_frames_from_video()
+    """
+
+    MODES = ('all', 'stride', 'scene')
+    SCENE_METHODS = ('histogram', 'difference')
+
+    def __init__(self, mode='stride', stride_sec=0.5, scene_method='histogram', scene_threshold=0.2,
+                 max_gap_sec=1.0, blur_threshold=None):
+        """
+        Initializes the FrameSampler class.
+
+        Parameters:
+            - mode (str): 'all', 'stride' or 'scene'. Default is 'stride'.
+            - stride_sec (float): Time between kept frames in 'stride' mode. Default is 0.5.
+            - scene_method (str): 'histogram' or 'difference'. Default is 'histogram'.
+            - scene_threshold (float): Scene change threshold in [0, 1]. Default is 0.2.
+            - max_gap_sec (float, optional): Longest time between kept frames in 'scene' mode. Default is 1.0.
+            - blur_threshold (float, optional): Minimum variance of Laplacian of a kept frame. Default is None.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Error: Unknown sampling mode '{mode}'.")
+        if scene_method not in self.SCENE_METHODS:
+            raise ValueError(f"Error: Unknown scene method '{scene_method}'.")
+
+        self.mode = mode
+        self.stride_sec = stride_sec
+        self.scene_method = scene_method
+        self.scene_threshold = scene_threshold
+        self.max_gap_sec = max_gap_sec
+        self.blur_threshold = blur_threshold
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previously kept frame. Called at the start of every video.
+        """
+        self.last_time = None
+        self.last_signature = None
+
+    def due(self, time_in_sec):
+        """
+        Check whether a frame at the given time can be kept without looking at its content.
+        Frames that are not due can be skipped before they are decoded.
+
+        Parameters:
+            - time_in_sec (float): Time of the frame in seconds.
+
+        Returns:
+            - due (bool): False if the frame is certainly dropped.
+        """
+        if self.mode != 'stride' or self.last_time is None:
+            return True
+        # 반올림 오차로 프레임이 밀리지 않도록 약간의 여유를 둔다
+        return time_in_sec - self.last_time >= self.stride_sec - 1e-6
+
+    def keep(self, time_in_sec, frame):
+        """
+        Decide whether the frame is kept and update the sampler state.
+
+        Parameters:
+            - time_in_sec (float): Time of the frame in seconds.
+            - frame (numpy.ndarray): BGR frame.
+
+        Returns:
+            - keep (bool): Whether the frame is kept.
+        """
+        if not self.due(time_in_sec):
+            return False
+        if self.blur_threshold is not None and self.sharpness(frame) < self.blur_threshold:
+            return False
+
+        signature = None
+        if self.mode == 'scene':
+            signature = self.signature(frame)
+            gap_exceeded = (self.max_gap_sec is not None and self.last_time is not None
+                            and time_in_sec - self.last_time >= self.max_gap_sec - 1e-6)
+            if self.last_signature is not None and not gap_exceeded \
+                    and self.scene_distance(signature) < self.scene_threshold:
+                return False
+
+        self.last_time = time_in_sec
+        self.last_signature = signature
+        return True
+
+    def sharpness(self, frame):
+        """
+        Variance of Laplacian of the frame. Low values mean a blurry frame.
+
+        Parameters:
+            - frame (numpy.ndarray): BGR frame.
+
+        Returns:
+            - sharpness (float): Variance of Laplacian.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    def signature(self, frame):
+        """
+        Compact representation of a frame used for scene change detection.
+
+        Parameters:
+            - frame (numpy.ndarray): BGR frame.
+
+        Returns:
+            - signature (numpy.ndarray): Normalized HSV histogram or downscaled grayscale frame.
+        """
+        if self.scene_method == 'histogram':
+            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+            return cv2.normalize(hist, hist).flatten()
+
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    def scene_distance(self, signature):
+        """
+        Distance between a frame signature and the signature of the last kept frame.
+
+        Parameters:
+            - signature (numpy.ndarray): Signature returned by signature().
+
+        Returns:
+            - distance (float): Distance in [0, 1].
+        """
+        if self.scene_method == 'histogram':
+            return cv2.compareHist(self.last_signature, signature, cv2.HISTCMP_BHATTACHARYYA)
+        return float(np.mean(np.abs(signature - self.last_signature))) / 255
@@ -0,0 +1,227 @@
+import os
+import cv2
+import time
+import threading
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+
+def resize_and_write(filepath, frame, size, params):
+    """
+    Resize a frame if needed and encode it to disk. Runs inside the worker pool.
+
+    Parameters:
+        - filepath (str): Output file path.
+        - frame (numpy.ndarray): BGR frame.
+        - size (tuple): Output (width, height).
+        - params (list): cv2.imwrite parameters.
+    """
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size)
+    if not cv2.imwrite(filepath, frame, params):
+        raise ValueError(f"Error: Cannot write frame {filepath}.")
+
+def resize_and_encode(frame, size, params):
+    """
+    Resize a frame if needed and encode it to JPEG in memory. Runs inside the worker pool.
+
+    Parameters:
+        - frame (numpy.ndarray): BGR frame.
+        - size (tuple): Output (width, height).
+        - params (list): cv2.imencode parameters.
+
+    Returns:
+        - data (bytes): Encoded image.
+    """
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size)
+    ok, encoded = cv2.imencode('.jpg', frame, params)
+    if not ok:
+        raise ValueError("Error: Cannot encode frame.")
+    return encoded.tobytes()
+
+class FrameWriter:
+    """
+    Writes frames to disk from a thread or process pool behind a bounded queue,
+    so the decoder keeps running while resizing and encoding happen in parallel.
+    Frames are always written as JPEG, because the later stages address them by their 'frame_{t}s.jpg' names.
+
+    Parameters:
+        - output_folder (str): Output folder for storing frames.
+        - workers (int): Number of pool workers. Default is os.cpu_count().
+        - max_pending (int): Maximum number of frames queued or being written. Bounds memory use. Default is 4 * workers.
+        - quality (int): JPEG quality in [1, 100]. Default is 95 (cv2 default).
+        - size (tuple): Output (width, height). Default is (1280, 720).
+        - use_processes (bool): Use a process pool instead of a thread pool. Default is False.
+                                cv2 releases the GIL while encoding, so threads are usually enough.
+        - pack (FramePack, optional): Pack receiving the encoded frames instead of output_folder, in submit order.
+                                      Default is None.
+        - verbose (bool): Print the throughput on every flush. Default is False.
+
+    Methods:
+        - submit(filename, frame, time_in_sec=np.nan): Queue a frame for writing, blocking while the queue is full.
+        - flush(): Wait for all queued frames, and print the throughput if verbose.
+        - stats(): Throughput statistics since the last flush.
+        - close(): Flush and shut down the pool.
+
+    Example:
+        with FrameWriter(output_folder='path/to/output', workers=8, quality=90, verbose=True) as writer:
+            video_processor = VideoProcessor(video_path='path/to/video.mp4', output_folder='path/to/output', writer=writer)
+            video_processor.extract_frames_from_video()
+    """
+
+    def __init__(self, output_folder, workers=None, max_pending=None, quality=95, size=(1280, 720),
+                 use_processes=False, pack=None, verbose=False):
+        """
+        Initializes the FrameWriter class.
+
+        Parameters:
+            - output_folder (str): Output folder for storing frames.
+            - workers (int, optional): Number of pool workers. Default is os.cpu_count().
+            - max_pending (int, optional): Maximum number of frames in flight. Default is 4 * workers.
+            - quality (int): JPEG quality. Default is 95.
+            - size (tuple): Output (width, height). Default is (1280, 720).
+            - use_processes (bool): Use a process pool instead of a thread pool. Default is False.
+            - pack (FramePack, optional): Pack receiving the encoded frames. Default is None.
+            - verbose (bool): Print the throughput on every flush. Default is False.
+        """
+        self.output_folder = output_folder
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending or 4 * self.workers
+        self.quality = quality
+        self.size = size
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.pack = pack
+        self.verbose = verbose
+        # pack에는 제출한 순서대로 붙이기 위해 인코딩이 끝난 프레임을 순서대로 꺼낸다
+        self.ordered = deque()
+
+        executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.pool = executor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        """
+        Reset the throughput counters.
+        """
+        self.frames = 0
+        self.blocked_sec = 0.0
+        self.start_time = None
+
+    def submit(self, filename, frame, time_in_sec=np.nan):
+        """
+        Queue a frame for writing. Blocks while max_pending frames are already in flight.
+
+        Parameters:
+            - filename (str): Generated filename such as 'frame_0.5s.jpg'.
+            - frame (numpy.ndarray): BGR frame, resized in the worker if needed.
+            - time_in_sec (float): Timestamp in seconds, recorded in the pack index. Default is NaN.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+        wait_start = time.perf_counter()
+        self.slots.acquire()
+        self.blocked_sec += time.perf_counter() - wait_start
+
+        if self.pack is not None:
+            future = self.pool.submit(resize_and_encode, frame, self.size, self.params)
+        else:
+            future = self.pool.submit(resize_and_write, os.path.join(self.output_folder, filename), frame, self.size, self.params)
+        with self.lock:
+            self.pending.add(future)
+            if self.pack is not None:
+                self.ordered.append((future, filename, time_in_sec))
+        future.add_done_callback(self._done)
+        self.frames += 1
+
+    def _done(self, future):
+        """
+        Keep the error of a finished frame, if any, and free its queue slot.
+        With a pack, the slot is freed only once the frame has left the submit-order queue.
+        Cancelled frames (the pool shutting down) have no error to keep, and exception() would raise for them.
+        """
+        if not future.cancelled() and future.exception() is not None and self.error is None:
+            self.error = future.exception()
+        with self.lock:
+            self.pending.discard(future)
+            if self.pack is not None:
+                self._append_done()
+                return
+        self.slots.release()
+
+    def _append_done(self):
+        """
+        Append the encoded frames at the head of the submit order that are finished to the pack and free their slots.
+        Called with the lock held.
+        """
+        while self.ordered and self.ordered[0][0].done():
+            future, filename, time_in_sec = self.ordered.popleft()
+            # 앞 프레임이 끝날 때까지 기다리는 프레임도 슬롯을 차지하므로 ordered는 max_pending을 넘지 않는다
+            self.slots.release()
+            if not future.cancelled() and future.exception() is None:
+                self.pack.append(filename, future.result(), time_in_sec)
+
+    def stats(self):
+        """
+        Throughput statistics since the last flush.
+
+        Returns:
+            - stats (dict): Number of frames, elapsed seconds, frames per second, and the seconds the decoder
+                            spent blocked on a full queue. A large blocked time means more workers would help.
+        """
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        return {
+            'frames': self.frames,
+            'elapsed_sec': elapsed,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'blocked_sec': self.blocked_sec,
+        }
+
+    def flush(self):
+        """
+        Wait for all queued frames to be written, print the throughput if verbose and reset the statistics.
+
+        Returns:
+            - stats (dict): Statistics as returned by stats().
+        """
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending)
+        if self.pack is not None:
+            # 마지막 콜백이 끝나기 전에 돌아올 수 있으므로 남은 프레임을 여기서 붙인다
+            with self.lock:
+                self._append_done()
+            self.pack.flush()
+
+        stats = self.stats()
+        self._reset_stats()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if self.verbose and stats['frames']:
+            print(f"frame writer: {stats['frames']} frames, {stats['fps']:.1f} frames/s with {self.workers} workers, "
+                  f"decoder blocked {stats['blocked_sec']:.1f}s")
+        return stats
+
+    def close(self):
+        """
+        Flush the queued frames and shut down the pool.
+        """
+        try:
+            self.flush()
+        finally:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
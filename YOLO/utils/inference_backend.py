@@ -0,0 +1,149 @@
+import os
+import time
+
+from ultralytics import YOLO
+from common.model_registry import registry
+from common.torch_device import select_device, set_threads
+
+class InferenceBackend:
+    """
+    A class for running batched YOLO inference on GPU or CPU, optionally from an exported graph.
+
+    Parameters:
+        - model_path (str): Path to the YOLO model (best.pt).
+        - device (int or str, optional): Inference device. Default is None (CUDA if available, otherwise cpu).
+        - batch_size (int): Number of frames passed to the model at once. Default is 16.
+        - export_format (str, optional): None runs best.pt directly, 'onnx' or 'torchscript' exports it next to best.pt
+                                         once and runs the exported graph. Default is None.
+        - imgsz (int): Inference image size. Default is 512.
+        - num_threads (int, optional): Number of intra-op CPU threads. Default is None (torch default).
+        - num_interop_threads (int, optional): Number of inter-op CPU threads. Default is None (torch default).
+
+    Methods:
+        - set_threads(): Apply the configured CPU thread counts to torch.
+        - exported_path(): Path of the exported graph next to best.pt.
+        - load_model(): Load best.pt or its exported graph.
+        - predict(frames): Run the model on a batch of frames.
+        - benchmark(frames): Compare the throughput of the configured backend against per-image best.pt inference.
+
+    Example:
+        backend = InferenceBackend(model_path='data/best.pt', device='cpu', batch_size=8, export_format='onnx', num_threads=8)
+        results = backend.predict(frames)
+    """
+
+    EXPORT_FORMATS = {'onnx': '.onnx', 'torchscript': '.torchscript'}
+
+    def __init__(self, model_path, device=None, batch_size=16, export_format=None, imgsz=512,
+                 num_threads=None, num_interop_threads=None):
+        """
+        Initializes the InferenceBackend class.
+
+        Parameters:
+            - model_path (str): Path to the YOLO model (best.pt).
+            - device (int or str, optional): Inference device. Default is None (automatic).
+            - batch_size (int): Number of frames passed to the model at once. Default is 16.
+            - export_format (str, optional): None, 'onnx' or 'torchscript'. Default is None.
+            - imgsz (int): Inference image size. Default is 512.
+            - num_threads (int, optional): Number of intra-op CPU threads. Default is None.
+            - num_interop_threads (int, optional): Number of inter-op CPU threads. Default is None.
+        """
+        if export_format is not None and export_format not in self.EXPORT_FORMATS:
+            raise ValueError(f"Error: Unsupported export format '{export_format}'.")
+
+        self.model_path = model_path
+        self.device = select_device(device)
+        self.batch_size = batch_size
+        self.export_format = export_format
+        self.imgsz = imgsz
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+
+        self.set_threads()
+        self.model = self.load_model()
+
+    def set_threads(self):
+        """
+        Apply the configured CPU thread counts to torch.
+        """
+        set_threads(self.num_threads, self.num_interop_threads)
+
+    def exported_path(self):
+        """
+        Path of the exported graph next to best.pt.
+
+        Returns:
+            - path (str): Path of the exported model.
+        """
+        return os.path.splitext(self.model_path)[0] + self.EXPORT_FORMATS[self.export_format]
+
+    def load_model(self):
+        """
+        Load best.pt, or export it once and load the exported graph.
+        Models come from the process-wide registry, so every video shares one loaded model.
+
+        Returns:
+            - model: YOLO model instance.
+        """
+        if self.export_format is None:
+            return registry.get(('yolo', self.model_path), lambda: YOLO(self.model_path))
+
+        path = self.exported_path()
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(self.model_path):
+            # ONNX는 batch 크기를 바꿔 쓸 수 있도록 dynamic axis로 내보낸다
+            path = YOLO(self.model_path).export(
+                format = self.export_format,
+                imgsz = self.imgsz,
+                dynamic = self.export_format == 'onnx',
+                device = self.device
+            )
+        return registry.get(('yolo', path), lambda: YOLO(path, task='segment'))
+
+    def predict(self, frames, model=None):
+        """
+        Run the model on a batch of frames.
+
+        Parameters:
+            - frames (list): List of BGR frames.
+            - model (optional): Model to run instead of the configured one. Default is None.
+
+        Returns:
+            - results (list): List of ultralytics Results objects.
+        """
+        model = model if model is not None else self.model
+        return model.predict(
+            source = frames,
+            classes = [0, 1, 2],
+            imgsz = (self.imgsz, self.imgsz),
+            device = self.device,
+            verbose = False
+        )
+
+    def _throughput(self, model, frames, batch_size):
+        """
+        Frames per second of the given model and batch size, after one warm-up batch.
+        """
+        self.predict(frames[:batch_size], model)
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            self.predict(frames[i:i + batch_size], model)
+        return len(frames) / (time.perf_counter() - start)
+
+    def benchmark(self, frames):
+        """
+        Compare the throughput of the configured backend against the current path
+        (best.pt predicted one image at a time) on the same frames.
+
+        Parameters:
+            - frames (list): List of BGR frames.
+
+        Returns:
+            - throughput (dict): Frames per second of each path.
+        """
+        backend_name = f"{self.export_format or 'pt'} batch {self.batch_size} on {self.device}"
+        throughput = {
+            f'pt per-image on {self.device}': self._throughput(YOLO(self.model_path), frames, 1),
+            backend_name: self._throughput(self.model, frames, self.batch_size),
+        }
+        for name, fps in throughput.items():
+            print(f'{name}: {fps:.2f} frames/s')
+        return throughput
@@ -0,0 +1,204 @@
+import os
+import cv2
+import shutil
+import numpy as np
+
+from utils.area_table import mask_polygons
+
+class ImageSink:
+    """
+    Saves the annotated image of every prediction, like ultralytics' save=True.
+
+    Parameters:
+        - save_dir (str): Directory to save the annotated images.
+        - pack (FramePack, optional): Pack receiving the annotated images instead of save_dir. Default is None.
+
+    Methods:
+        - write(filename, result): Save the annotated image of a prediction.
+        - close(): Close the pack, if any.
+    """
+
+    def __init__(self, save_dir, pack=None):
+        """
+        Initializes the ImageSink class.
+
+        Parameters:
+            - save_dir (str): Directory to save the annotated images.
+            - pack (FramePack, optional): Pack receiving the annotated images. Default is None.
+        """
+        self.save_dir = save_dir
+        self.pack = pack
+        os.makedirs(save_dir, exist_ok=True)
+
+    def write(self, filename, result):
+        """
+        Save the annotated image of a prediction.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        if self.pack is not None:
+            self.pack.append_frame(filename, result.plot())
+        else:
+            cv2.imwrite(os.path.join(self.save_dir, filename), result.plot())
+
+    def close(self):
+        """
+        Close the pack, if any.
+        """
+        if self.pack is not None:
+            self.pack.close()
+
+class LabelSink:
+    """
+    Saves the label file of every prediction with confidences, in the format of ultralytics' save_txt=True, save_conf=True,
+    from the polygons shared with the other sinks. Frames without detections get no label file.
+    The labels folder is emptied when the sink opens, so a rerun into the same folder leaves no label file
+    of a frame that no longer has detections.
+
+    Parameters:
+        - save_dir (str): Directory whose labels folder receives the label files.
+
+    Methods:
+        - write(filename, result): Save the label file of a prediction.
+        - close(): Nothing to release.
+    """
+
+    def __init__(self, save_dir):
+        """
+        Initializes the LabelSink class.
+
+        Parameters:
+            - save_dir (str): Directory whose labels folder receives the label files.
+        """
+        self.labels_dir = os.path.join(save_dir, 'labels')
+        # 이전 실행의 label 파일에 이어 쓰지 않도록 폴더를 비운다
+        shutil.rmtree(self.labels_dir, ignore_errors=True)
+        os.makedirs(self.labels_dir, exist_ok=True)
+
+    def write(self, filename, result):
+        """
+        Save the label file of a prediction.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        polygons = mask_polygons(result)
+        if not polygons:
+            return
+        stem = os.path.splitext(filename)[0]
+        with open(os.path.join(self.labels_dir, stem + '.txt'), 'w') as f:
+            for class_id, confidence, polygon in polygons:
+                line = (class_id, *np.asarray(polygon).reshape(-1), confidence)
+                f.write(('%g ' * len(line)).rstrip() % line + '\n')
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+        pass
+
+class AreaTableSink:
+    """
+    Adds every prediction to an area table and saves the table when the stream ends.
+
+    Parameters:
+        - area_table (AreaTable): Table receiving the per-frame class areas.
+        - path (str): Path to save the table to.
+
+    Methods:
+        - write(filename, result): Add a prediction to the table.
+        - close(): Save the table.
+    """
+
+    def __init__(self, area_table, path):
+        """
+        Initializes the AreaTableSink class.
+
+        Parameters:
+            - area_table (AreaTable): Table receiving the per-frame class areas.
+            - path (str): Path to save the table to.
+        """
+        self.area_table = area_table
+        self.path = path
+
+    def write(self, filename, result):
+        """
+        Add a prediction to the table.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        self.area_table.add(filename, result)
+
+    def close(self):
+        """
+        Save the table.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.area_table.save(self.path)
+
+class ResultsStoreSink:
+    """
+    Appends every prediction to the results store as it arrives: the frame with its detection flag,
+    the per-class detections and the mask polygons.
+
+    Parameters:
+        - store (ResultsStore): Results store shared by the stages.
+        - survey (str): Survey identifier such as 'video_01'.
+        - area_table (AreaTable): Table used to extract polygons and measure their areas.
+                                  Pass the table of the AreaTableSink to reuse its measurement of every frame.
+        - commit_every (int): Number of frames between commits. Default is 256.
+
+    Methods:
+        - write(filename, result): Append a prediction to the store.
+        - close(): Commit the remaining rows.
+    """
+
+    def __init__(self, store, survey, area_table, commit_every=256):
+        """
+        Initializes the ResultsStoreSink class.
+
+        Parameters:
+            - store (ResultsStore): Results store shared by the stages.
+            - survey (str): Survey identifier such as 'video_01'.
+            - area_table (AreaTable): Table used to extract polygons and measure their areas.
+            - commit_every (int): Number of frames between commits. Default is 256.
+        """
+        self.store = store
+        self.survey = survey
+        self.area_table = area_table
+        self.commit_every = commit_every
+        self.pending = 0
+        # 같은 영상을 다시 추론하면 이전 결과를 지우고 새로 쌓는다
+        for table in ('frames', 'detections', 'polygons'):
+            store.clear(table, survey)
+
+    def write(self, filename, result):
+        """
+        Append a prediction to the store.
+
+        Parameters:
+            - filename (str): Frame filename such as 'frame_0.5s.jpg'.
+            - result: ultralytics Results object.
+        """
+        polygons, areas, confidences, instances = self.area_table.measure(result)
+        detected = instances.nonzero()[0]
+
+        self.store.add_frame(self.survey, filename, len(detected) > 0)
+        self.store.add_detections(self.survey, filename,
+                                  [(c, instances[c], confidences[c], areas[c]) for c in detected])
+        self.store.add_polygons(self.survey, filename, polygons)
+        self.pending += 1
+        if self.pending == self.commit_every:
+            self.store.commit()
+            self.pending = 0
+
+    def close(self):
+        """
+        Commit the remaining rows.
+        """
+        self.store.commit()
@@ -1,7 +1,10 @@
 import os
 import pickle
 
-from ultralytics import YOLO
+from utils.area_table import AreaTable
+from utils.inference_backend import InferenceBackend
+from utils.prediction_sinks import ImageSink, LabelSink, AreaTableSink
+from common.frame_pack import FramePack
 
 class InstanceSegmentation:
     """
@@ -9,17 +12,31 @@ class InstanceSegmentation:
 
     Parameters:
         - model_path (str): Path to the YOLO model.
-        - source_dir (str): Directory containing input images for inference.
+        - source_dir (str): Directory containing input images for inference, or a FramePack path ending with '.pack'.
         - inference_results_name (str): Name of the directory to save the inference results.
+        - device (int or str, optional): Inference device. None uses CUDA if available, otherwise cpu.
+        - batch_size (int): Number of frames passed to the model at once in predict_frames().
+        - export_format (str, optional): None, 'onnx' or 'torchscript'. Runs an exported graph of best.pt.
+        - num_threads (int, optional): Number of intra-op CPU threads.
+        - pack_images (bool): Whether to save the annotated images to one FramePack (save_dir + '.pack') instead of one file each.
 
     Attributes:
+        - backend: InferenceBackend running the model.
         - model: YOLO model instance.
         - source (str): Directory containing input images for inference.
         - name (str): Name of the directory to save the inference results.
 
     Methods:
-        - predictor(): Perform instance segmentation on input images and save the results.
-        - make_label_image_info(): Create a file containing information about labeled images.
+        - predictor(): Perform instance segmentation on input images, save the results and return them all.
+        - predict_source(): Yield the predictions of the images in source_dir, a folder or a FramePack, one at a time.
+        - make_sinks(area_table=None, save_images=True, save_labels=True): Create the sinks receiving every prediction.
+        - consume(predictions, sinks, keep_results=False): Pass every prediction to the sinks as it arrives.
+        - predict_frames(frames, batch_size=None): Perform batched instance segmentation on in-memory frames.
+        - stream_predictor(frames, batch_size=None, area_table=None, save_images=True, save_labels=True, extra_sinks=()):
+          Run predict_frames(), fill an area table and save the requested results like predictor().
+        - stream_source_predictor(area_table=None, save_images=True, save_labels=True, extra_sinks=()):
+          Run predict_source() with constant memory, flushing every result to the requested outputs.
+        - make_label_image_info(manifest=None): Create a file containing information about labeled images.
 
     Example:
         instance_segmentation = InstanceSegmentation(model_path='path/to/yolo_model.pth',
@@ -29,7 +46,8 @@ class InstanceSegmentation:
         instance_segmentation.make_label_image_info()
     """
     
-    def __init__(self, model_path, source_dir, inference_results_name, label_dir):
+    def __init__(self, model_path, source_dir, inference_results_name, label_dir,
+                 device=None, batch_size=16, export_format=None, num_threads=None, pack_images=False):
         """
         Initializes the InstanceSegmentation class.
 
@@ -37,36 +55,182 @@ class InstanceSegmentation:
             - model_path (str): Path to the YOLO model.
             - source_dir (str): Directory containing input images for inference.
             - inference_results_name (str): Name of the directory to save the inference results.
+            - device (int or str, optional): Inference device. Default is None (automatic).
+            - batch_size (int): Number of frames passed to the model at once. Default is 16.
+            - export_format (str, optional): None, 'onnx' or 'torchscript'. Default is None.
+            - num_threads (int, optional): Number of intra-op CPU threads. Default is None.
+            - pack_images (bool): Whether to save the annotated images to one FramePack. Default is False.
         """
-        self.model = YOLO(model_path)
+        self.backend = InferenceBackend(model_path, device=device, batch_size=batch_size,
+                                        export_format=export_format, num_threads=num_threads)
+        self.model = self.backend.model
         self.source = source_dir
         self.name = inference_results_name
         self.label_dir = label_dir
+        self.save_dir = os.path.join(os.getcwd(), 'runs/segment', inference_results_name)
+        self.pack_images = pack_images
         
     def predictor(self):
         """
         Perform instance segmentation on input images and save the results.
+        Thin wrapper over predict_source() that keeps every result in memory; prefer stream_source_predictor()
+        for long videos.
 
         Returns:
-            - results: Dictionary containing inference results.
+            - results (list): List of ultralytics Results objects.
         """
+        sinks = self.make_sinks(save_images=True, save_labels=True)
+        return self.consume(self.predict_source(), sinks, keep_results=True)
+
+    def predict_source(self):
+        """
+        Perform instance segmentation on the images in source_dir one at a time with ultralytics' stream mode,
+        so no more than one result is held at once. A FramePack source is decoded from its memory map and batched like predict_frames().
+
+        Yields:
+            - (filename, result) (tuple): Image filename and its ultralytics Results object.
+        """
+        if self.source.endswith(FramePack.SUFFIX):
+            yield from self.predict_frames(FramePack(self.source).iter_frames())
+            return
+
         results = self.model.predict(
             source = self.source,
-            save = True,
+            stream = True,
             classes = [0, 1, 2],
-            save_txt = True,
-            save_conf = True,
-            name = self.name,
             imgsz=(512, 512),
-            device=0
+            device=self.backend.device,
+            verbose=False
         )
+        for result in results:
+            yield os.path.basename(result.path), result
+
+    def make_sinks(self, area_table=None, save_images=True, save_labels=True):
+        """
+        Create the sinks receiving every prediction.
+
+        Parameters:
+            - area_table (AreaTable, optional): Table receiving the per-frame class areas. Default is None.
+            - save_images (bool): Whether to save annotated images. Default is True.
+            - save_labels (bool): Whether to save label files. Default is True.
+
+        Returns:
+            - sinks (list): List of sinks writing to save_dir.
+        """
+        sinks = []
+        if area_table is not None:
+            sinks.append(AreaTableSink(area_table, os.path.join(self.save_dir, AreaTable.FILE_NAME)))
+        if save_images:
+            pack = FramePack(self.save_dir + FramePack.SUFFIX, 'w') if self.pack_images else None
+            sinks.append(ImageSink(self.save_dir, pack))
+        if save_labels:
+            sinks.append(LabelSink(self.save_dir))
+        return sinks
+
+    def consume(self, predictions, sinks, keep_results=False):
+        """
+        Pass every prediction to the sinks as it arrives and close them at the end.
+        Unless keep_results is set, results are dropped right after the sinks, so memory does not grow with the video.
+
+        Parameters:
+            - predictions (iterable): Iterable of (filename, result) tuples.
+            - sinks (list): List of sinks with write(filename, result) and close() methods.
+            - keep_results (bool): Whether to collect and return the results. Default is False.
+
+        Returns:
+            - results (list): Collected results, empty unless keep_results is set.
+        """
+        results = []
+        try:
+            for filename, result in predictions:
+                for sink in sinks:
+                    sink.write(filename, result)
+                if keep_results:
+                    results.append(result)
+        finally:
+            for sink in sinks:
+                sink.close()
         return results
-        
-    def make_label_image_info(self):
+
+    def predict_frames(self, frames, batch_size=None):
+        """
+        Perform batched instance segmentation on in-memory frames without reading them from disk.
+
+        Parameters:
+            - frames (iterable): Iterable of (filename, frame) tuples, e.g. VideoProcessor.iter_frames().
+            - batch_size (int, optional): Number of frames passed to the model at once. Default is the backend batch size.
+
+        Yields:
+            - (filename, result) (tuple): Frame filename and its ultralytics Results object.
+        """
+        batch_size = batch_size or self.backend.batch_size
+        batch = []
+        for filename, frame in frames:
+            batch.append((filename, frame))
+            if len(batch) == batch_size:
+                yield from self._predict_batch(batch)
+                batch = []
+        if batch:
+            yield from self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        """
+        Run the model on a single batch of (filename, frame) tuples.
+        """
+        results = self.backend.predict([frame for _, frame in batch])
+        for (filename, _), result in zip(batch, results):
+            yield filename, result
+
+    def stream_predictor(self, frames, batch_size=None, area_table=None, save_images=True, save_labels=True, extra_sinks=()):
+        """
+        Perform instance segmentation on in-memory frames. Mask areas and confidences go straight into the area table,
+        and annotated images and labels are only saved on request, under the same names and folders as predictor().
+
+        Parameters:
+            - frames (iterable): Iterable of (filename, frame) tuples, e.g. VideoProcessor.iter_frames().
+            - batch_size (int, optional): Number of frames passed to the model at once. Default is the backend batch size.
+            - area_table (AreaTable, optional): Table receiving the per-frame class areas. Default is None.
+            - save_images (bool): Whether to save annotated images. Default is True.
+            - save_labels (bool): Whether to save label files. Default is True.
+            - extra_sinks (list): Additional sinks, e.g. an InstanceSegmentationImageComposer. Default is ().
+        """
+        sinks = self.make_sinks(area_table, save_images, save_labels) + list(extra_sinks)
+        self.consume(self.predict_frames(frames, batch_size), sinks)
+
+    def stream_source_predictor(self, area_table=None, save_images=True, save_labels=True, extra_sinks=()):
+        """
+        Perform instance segmentation on the images in source_dir with constant memory,
+        flushing every result to the requested outputs instead of returning them.
+
+        Parameters:
+            - area_table (AreaTable, optional): Table receiving the per-frame class areas. Default is None.
+            - save_images (bool): Whether to save annotated images. Default is True.
+            - save_labels (bool): Whether to save label files. Default is True.
+            - extra_sinks (list): Additional sinks, e.g. an InstanceSegmentationImageComposer. Default is ().
+        """
+        sinks = self.make_sinks(area_table, save_images, save_labels) + list(extra_sinks)
+        self.consume(self.predict_source(), sinks)
+
+    def make_label_image_info(self, manifest=None):
         """
         Create a file containing information about labeled images.
+        Uses the detection flags of the manifest, otherwise the label files in label_dir, or its area table when labels were not saved.
+
+        Parameters:
+            - manifest (FrameManifest, optional): Manifest of the video whose results are in label_dir. Default is None.
         """
-        txt_files = [f for f in os.listdir(os.path.join(self.label_dir, 'labels')) if f.endswith('.txt')]
+        if manifest is not None:
+            # 매니페스트는 이미 시간 순서이므로 폴더를 읽거나 정렬할 필요가 없다
+            with open(os.path.join(os.getcwd(), 'dataset/result_txt', '_image_info.txt'), 'wb') as f:
+                pickle.dump(manifest.names(detected=True), f)
+            return
+
+        labels_dir = os.path.join(self.label_dir, 'labels')
+        if os.path.isdir(labels_dir):
+            txt_files = [f for f in os.listdir(labels_dir) if f.endswith('.txt')]
+        else:
+            # label 파일 없이 추론한 경우 area table에서 검출된 프레임을 가져온다
+            txt_files = AreaTable.load(os.path.join(self.label_dir, AreaTable.FILE_NAME)).frames_with_detections()
         txt_files = sorted([float((item.split('s')[0]).split('_')[1]) for item in txt_files])
         txt_files = ['frame_'+str(name)+'s' for name in txt_files]
         with open(os.path.join(os.getcwd(), 'dataset/result_txt', '_image_info.txt'), 'wb') as f:
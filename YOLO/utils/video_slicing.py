@@ -1,6 +1,38 @@
 import os
 import cv2
 
+from concurrent.futures import ProcessPoolExecutor
+
+from common.frame_manifest import FrameManifest
+from utils.frame_writer import FrameWriter
+
+def extract_segment(video_path, output_folder, sampler, start, stop, start_time, writer_config=None):
+    """
+    Decode one time segment of a video and save its frames. Runs inside a worker process.
+
+    Parameters:
+        - video_path (str): Path to the input video file.
+        - output_folder (str): Output folder for storing extracted frames.
+        - sampler (FrameSampler, optional): Sampler deciding which frames are kept.
+        - start (int): Index of the first frame of the segment.
+        - stop (int, optional): Index one past the last frame of the segment. None reads to the end of the video.
+        - start_time (float): Accumulated time in seconds before the first frame of the segment.
+        - writer_config (dict, optional): FrameWriter arguments of the segment's own writer. Default is None (write on the decoding thread).
+
+    Returns:
+        - kept_frames (list): Names of the frames kept in the segment, in decoding order.
+        - kept_times (list): Exact timestamps of the kept frames.
+    """
+    writer = FrameWriter(output_folder, **writer_config) if writer_config else None
+    processor = VideoProcessor(video_path, output_folder, sampler, writer=writer)
+    try:
+        for _ in processor.iter_frames(save=True, resize=processor.resize_on_decode(), start=start, stop=stop, start_time=start_time):
+            pass
+    finally:
+        if writer is not None:
+            writer.close()
+    return processor.kept_frames, processor.kept_times
+
 class VideoProcessor:
     """
     Utility class for processing videos and extracting frames.
@@ -8,27 +40,45 @@ class VideoProcessor:
     Parameters:
         - video_path (str): Path to the input video file.
         - output_folder (str): Output folder for storing extracted frames.
+        - sampler (FrameSampler, optional): Sampler deciding which frames are kept. Default is None (keep every frame).
+        - writer (FrameWriter, optional): Parallel writer used to save frames. Default is None (write on the decoding thread).
+        - pack (FramePack, optional): Pack receiving the frames instead of one image file each in the output folder.
+                                      Give the writer the same pack to encode in parallel. Default is None.
 
     Methods:
         - generate_filename(time_in_sec): Generate a filename based on the given time in seconds.
         - calculate_time_in_sec(cap): Calculate the time in seconds for the next frame.
+        - iter_frames(save=False, resize=True, start=0, stop=None, start_time=0): Yield resized frames from the input video, optionally saving them as well.
+        - resize_on_decode(): Whether frames must be resized on the decoding thread when saving.
+        - seek(cap, index): Move the capture to the given frame index.
         - extract_frames_from_video(): Extract frames from the input video and save them to the output folder.
+        - extract_frames_parallel(workers=None, segments=None): Extract frames with one worker process per time segment.
+        - write_manifest(manifest_path, detections=None): Save the FrameManifest of the kept frames for the later stages.
 
     Example:
         video_processor = VideoProcessor(video_path='path/to/video.mp4', output_folder='path/to/output')
         video_processor.extract_frames_from_video()
     """
     
-    def __init__(self, video_path, output_folder):
+    def __init__(self, video_path, output_folder, sampler=None, writer=None, pack=None):
         """
         Initializes the VideoProcessor class.
 
         Parameters:
             - video_path (str): Path to the input video file.
             - output_folder (str): Output folder for storing extracted frames.
+            - sampler (FrameSampler, optional): Sampler deciding which frames are kept. Default is None.
+            - writer (FrameWriter, optional): Parallel writer used to save frames. Default is None.
+            - pack (FramePack, optional): Pack receiving the frames. Default is None.
         """
         self.video_path = video_path
         self.output_folder = output_folder
+        self.sampler = sampler
+        self.writer = writer
+        self.pack = pack
+        self.kept_frames = []
+        self.kept_times = []
+        self.saved = False
 
     def generate_filename(self, time_in_sec):
         """
@@ -57,26 +107,195 @@ class VideoProcessor:
         """
         return 1 / cap.get(cv2.CAP_PROP_FPS)
 
-    def extract_frames_from_video(self):
+    def iter_frames(self, save=False, resize=True, start=0, stop=None, start_time=0):
         """
-        Extract frames from the input video and save them to the output folder.
+        Decode the input video and yield the resized frames kept by the sampler one at a time.
+
+        Parameters:
+            - save (bool): Whether to also write each frame to the output folder. Default is False.
+            - resize (bool): Whether to resize frames on the decoding thread. Only a writer may skip this,
+                             since it resizes in its workers. Default is True.
+            - start (int): Index of the first frame to decode. Default is 0.
+            - stop (int, optional): Index one past the last frame to decode. Default is None (end of the video).
+            - start_time (float): Accumulated time in seconds before frame start. Default is 0.
+
+        Yields:
+            - (filename, frame) (tuple): Generated filename and the BGR frame.
         """
         cap = cv2.VideoCapture(self.video_path)
         if not cap.isOpened():
             raise ValueError("Error: Cannot open video.")
         
-        time_in_sec = 0
+        time_in_sec = start_time
+        self.kept_frames = []
+        self.kept_times = []
+        self.saved = save
+        if self.sampler is not None:
+            self.sampler.reset()
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            if start:
+                self.seek(cap, start)
             
-            frame = cv2.resize(frame, (1280, 720))
-            time_in_sec += self.calculate_time_in_sec(cap)
-            filename = self.generate_filename(time_in_sec)
-            filepath = os.path.join(self.output_folder, filename)
-            cv2.imwrite(filepath, frame)
+            index = start
+            while cap.isOpened() and (stop is None or index < stop):
+                if not cap.grab():
+                    break
+                
+                index += 1
+                time_in_sec += self.calculate_time_in_sec(cap)
+                # 시간 조건으로 버려지는 프레임은 디코딩 결과를 꺼내지 않는다
+                if self.sampler is not None and not self.sampler.due(time_in_sec):
+                    continue
+                
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                
+                if resize:
+                    frame = cv2.resize(frame, (1280, 720))
+                if self.sampler is not None and not self.sampler.keep(time_in_sec, frame):
+                    continue
+                
+                filename = self.generate_filename(time_in_sec)
+                self.kept_frames.append(os.path.splitext(filename)[0])
+                self.kept_times.append(time_in_sec)
+                if save and self.writer is not None:
+                    self.writer.submit(filename, frame, time_in_sec)
+                elif save and self.pack is not None:
+                    self.pack.append_frame(filename, frame, time_in_sec)
+                elif save:
+                    cv2.imwrite(os.path.join(self.output_folder, filename), frame)
+                yield filename, frame
+        finally:
+            cap.release()
+            if save and self.writer is not None:
+                self.writer.flush()
+            elif save and self.pack is not None:
+                self.pack.flush()
+
+    def seek(self, cap, index):
+        """
+        Move the capture to the given frame index. The seek lands on the frame before index, which is grabbed
+        and checked against its expected timestamp, since CAP_PROP_POS_FRAMES only reports the requested position
+        even when the backend landed on a nearby keyframe. Falls back to grabbing frames from the start
+        when the timestamp does not match (inexact seeking, variable frame rate or a non-zero start time).
 
+        Parameters:
+            - cap: OpenCV VideoCapture object.
+            - index (int): Index of the next frame to decode.
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index - 1)
+        if cap.grab() and fps > 0:
+            expected = (index - 1) * 1000 / fps
+            # 반 프레임 이내면 원하는 프레임에 도착한 것이다
+            if abs(cap.get(cv2.CAP_PROP_POS_MSEC) - expected) < 500 / fps:
+                return
+        
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(index):
+            if not cap.grab():
+                break
+
+    def segment_bounds(self, segments):
+        """
+        Split the video into time segments and compute the accumulated start time of each one.
+        Start times are accumulated exactly like the serial decode, so frame names do not change.
+
+        Parameters:
+            - segments (int): Number of segments.
+
+        Returns:
+            - bounds (list): List of (start, stop, start_time) tuples. The last stop is None (end of the video).
+        """
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise ValueError("Error: Cannot open video.")
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = self.calculate_time_in_sec(cap)
         cap.release()
-        
\ No newline at end of file
+        
+        segments = max(1, min(segments, frame_count))
+        starts = [frame_count * i // segments for i in range(segments)]
+        
+        bounds = []
+        time_in_sec = 0
+        index = 0
+        for i, begin in enumerate(starts):
+            while index < begin:
+                time_in_sec += step
+                index += 1
+            stop = starts[i + 1] if i + 1 < len(starts) else None
+            bounds.append((begin, stop, time_in_sec))
+        return bounds
+
+    def extract_frames_parallel(self, workers=None, segments=None):
+        """
+        Extract frames with one worker process per time segment and merge the kept frames in order.
+        Frame names match a serial extraction. The sampler state restarts at every segment boundary.
+        Not available with a pack, whose frames are appended in time order.
+
+        The writer's pool is not used here, since its frames cannot be sent to this process cheaply.
+        Instead every worker process opens its own FrameWriter with the writer's quality and size,
+        and the writer's threads are split between them (at least one each), so writer_workers stays the total.
+
+        Parameters:
+            - workers (int, optional): Number of worker processes. Default is os.cpu_count().
+            - segments (int, optional): Number of time segments. Default is workers.
+        """
+        if self.pack is not None:
+            raise ValueError("Error: A frame pack is appended in time order by one process. Use extract_frames_from_video().")
+        workers = workers or os.cpu_count()
+        bounds = self.segment_bounds(segments or workers)
+        writer_config = None
+        if self.writer is not None:
+            writer_config = {'workers': max(1, self.writer.workers // workers),
+                             'quality': self.writer.quality,
+                             'size': self.writer.size}
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(extract_segment, self.video_path, self.output_folder, self.sampler, start, stop, start_time, writer_config)
+                       for start, stop, start_time in bounds]
+            results = [future.result() for future in futures]
+        self.saved = True
+        self.kept_frames = [name for names, _ in results for name in names]
+        self.kept_times = [t for _, times in results for t in times]
+
+    def resize_on_decode(self):
+        """
+        Whether frames must be resized on the decoding thread when saving.
+
+        Returns:
+            - resize (bool): False when a writer resizes in its workers and no sampler needs the resized frame.
+        """
+        # 샘플러가 없으면 resize도 writer의 worker에서 처리한다
+        return self.writer is None or self.sampler is not None
+
+    def extract_frames_from_video(self):
+        """
+        Extract frames from the input video and save them to the output folder.
+        """
+        for _ in self.iter_frames(save=True, resize=self.resize_on_decode()):
+            pass
+
+    def write_manifest(self, manifest_path, detections=None):
+        """
+        Save the FrameManifest of the frames kept by the last extraction, with their exact timestamps and image paths,
+        so the later stages only consume the sampled frames and never scan the frame folder.
+        When the frames were not saved (iter_frames(save=False)), the manifest records their names without image paths.
+
+        Parameters:
+            - manifest_path (str): Path of the manifest file, ending with '.npy'.
+            - detections (dict, optional): Mapping of frame name to its per-class instance counts. Default is None.
+
+        Returns:
+            - manifest (FrameManifest): The saved manifest.
+        """
+        filenames = [name + '.jpg' for name in self.kept_frames]
+        paths = None
+        if self.saved:
+            # pack에 넣은 프레임은 pack 안의 가상 경로로 기록한다
+            folder = self.pack.path if self.pack is not None else self.output_folder
+            paths = [os.path.join(folder, filename) for filename in filenames]
+        return FrameManifest.write(manifest_path, paths, self.kept_times, detections, names=filenames)
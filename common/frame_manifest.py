@@ -0,0 +1,164 @@
+import os
+import numpy as np
+
+class FrameManifest:
+    """
+    A compact, array-backed index of the frames kept by VideoProcessor, saved as one .npy structured array
+    and memory-mapped on load, so the stages never scan frame or label folders.
+    Rows are in time order and hold the frame id, its exact timestamp, its file name, its image path and a per-class detection bitmask.
+    The image path is empty when the frames were not saved, e.g. in stream mode with save_frames=False.
+
+    Parameters:
+        - path (str): Path of the manifest file, ending with '.npy'.
+
+    Methods:
+        - write(path, paths, times, detections=None, names=None): Save a manifest and open it.
+        - detected(class_id=None): Mask of the frames with a detection (of a class).
+        - names(detected=None, extension=False): Frame names such as 'frame_0.5s'.
+        - saved(): Whether the images of the frames were saved.
+        - paths(detected=None): Image paths of the frames.
+        - times(detected=None): Exact timestamps of the frames.
+
+    Example:
+        manifest = FrameManifest('dataset/result_txt/_frame_manifest_01.npy')
+        query_names = manifest.names(detected=True)
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the FrameManifest class.
+
+        Parameters:
+            - path (str): Path of the manifest file, ending with '.npy'.
+        """
+        self.path = path
+        self.frames = np.load(path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.frames)
+
+    @classmethod
+    def write(cls, path, paths, times, detections=None, names=None):
+        """
+        Save a manifest and open it.
+
+        Parameters:
+            - path (str): Path of the manifest file, ending with '.npy'.
+            - paths (list): Image path of every frame, or None when the frames were not saved (names is then required).
+            - times (list): Exact timestamp of every frame in seconds.
+            - detections (dict, optional): Mapping of frame name such as 'frame_0.5s' to its per-class instance counts.
+                                           Default is None (no detection flags).
+            - names (list, optional): File name of every frame such as 'frame_0.5s.jpg'. Default is None (taken from paths).
+
+        Returns:
+            - manifest (FrameManifest): The saved manifest.
+        """
+        if not path.endswith('.npy'):
+            raise ValueError(f"Error: Manifest path '{path}' must end with '.npy'.")
+        if paths is None and names is None:
+            raise ValueError("Error: A manifest needs the image paths or the file names of the frames.")
+        if names is None:
+            names = [os.path.basename(p) for p in paths]
+        if len(names) != len(times) or (paths is not None and len(paths) != len(times)):
+            raise ValueError("Error: Every frame needs one path and one timestamp.")
+
+        encoded_names = [n.encode('utf-8') for n in names]
+        # 저장하지 않은 프레임은 경로를 비워 둔다
+        encoded_paths = [p.encode('utf-8') for p in paths] if paths is not None else [b''] * len(names)
+        dtype = np.dtype([('id', '<i8'), ('time', '<f8'),
+                          ('name', f'S{max([1] + [len(n) for n in encoded_names])}'),
+                          ('path', f'S{max([1] + [len(p) for p in encoded_paths])}'),
+                          ('detections', 'u1')])
+
+        order = np.argsort(np.asarray(times, dtype=np.float64), kind='stable')
+        frames = np.zeros(len(names), dtype=dtype)
+        frames['id'] = np.arange(len(names))
+        frames['time'] = np.asarray(times, dtype=np.float64)[order]
+        frames['name'] = [encoded_names[i] for i in order]
+        frames['path'] = [encoded_paths[i] for i in order]
+
+        if detections:
+            for row, i in enumerate(order):
+                instances = detections.get(os.path.splitext(names[i])[0])
+                if instances is not None:
+                    # 클래스마다 한 비트씩, 검출된 클래스의 비트를 켠다
+                    frames['detections'][row] = np.sum((np.asarray(instances) > 0) << np.arange(len(instances)))
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.save(path, frames)
+        return cls(path)
+
+    def detected(self, class_id=None):
+        """
+        Mask of the frames with at least one detection, or with a detection of class_id.
+
+        Parameters:
+            - class_id (int, optional): Class to test. Default is None (any class).
+
+        Returns:
+            - mask (numpy.ndarray): (len(manifest),) bool mask.
+        """
+        if class_id is None:
+            return self.frames['detections'] != 0
+        return (self.frames['detections'] >> class_id) & 1 == 1
+
+    def _select(self, field, detected):
+        """
+        A field of all frames, or of the frames with (True) or without (False) detections.
+        """
+        values = self.frames[field]
+        if detected is None:
+            return values
+        mask = self.detected()
+        return values[mask if detected else ~mask]
+
+    def names(self, detected=None, extension=False):
+        """
+        Frame names in time order.
+
+        Parameters:
+            - detected (bool, optional): Only frames with (True) or without (False) detections. Default is None (all).
+            - extension (bool): Whether to keep the image extension, e.g. 'frame_0.5s.jpg'. Default is False.
+
+        Returns:
+            - names (list): Frame names such as 'frame_0.5s'.
+        """
+        names = [n.decode('utf-8') for n in self._select('name', detected).tolist()]
+        if extension:
+            return names
+        return [name.rpartition('.')[0] for name in names]
+
+    def saved(self):
+        """
+        Whether the images of the frames were saved, i.e. every frame has an image path.
+
+        Returns:
+            - saved (bool): False when the frames were only streamed to inference.
+        """
+        return bool(np.all(self.frames['path'] != b''))
+
+    def paths(self, detected=None):
+        """
+        Image paths of the frames in time order.
+
+        Parameters:
+            - detected (bool, optional): Only frames with (True) or without (False) detections. Default is None (all).
+
+        Returns:
+            - paths (list): Image paths.
+        """
+        if not self.saved():
+            raise ValueError(f"Error: The frames of {self.path} were not saved, so it has no image paths.")
+        return [p.decode('utf-8') for p in self._select('path', detected).tolist()]
+
+    def times(self, detected=None):
+        """
+        Exact timestamps of the frames in time order.
+
+        Parameters:
+            - detected (bool, optional): Only frames with (True) or without (False) detections. Default is None (all).
+
+        Returns:
+            - times (numpy.ndarray): Timestamps in seconds.
+        """
+        return np.asarray(self._select('time', detected))
@@ -0,0 +1,341 @@
+import io
+import os
+import cv2
+import numpy as np
+
+class FramePack:
+    """
+    A packed frame container: the encoded frames of a video appended one after another to a single file,
+    with an append-only index of fixed-size records (name, timestamp, offset, length) next to it.
+    Reads are random access through memory maps of both files, so one video is two files instead of one file per frame.
+
+    Frames in a pack are addressed by virtual paths inside it, e.g. 'dataset/image_extraction/video_01.pack/frame_0.5s.jpg',
+    which open_frame(), read_image() and list_frames() resolve, so these paths can go wherever frame paths are expected.
+
+    Parameters:
+        - path (str): Path of the container file, ending with '.pack'. The index is path + '.idx'.
+        - mode (str): 'r' to read, 'w' to create (or truncate) and append, 'a' to append to an existing pack. Default is 'r'.
+
+    Methods:
+        - append(name, data, time=np.nan): Append an encoded frame.
+        - append_frame(name, frame, time=np.nan, quality=95): Encode a BGR frame to JPEG and append it.
+        - flush(): Flush the appended frames to disk.
+        - refresh(): Map the frames appended since opening.
+        - names(): Frame names in append order.
+        - times(): Frame timestamps in append order.
+        - position(key): Row of a frame name.
+        - read(key): Encoded bytes of a frame.
+        - read_image(key): Decoded BGR frame.
+        - iter_frames(): Yield (name, frame) tuples in append order.
+        - path_of(name): Virtual path of a frame.
+        - close(): Flush and close the pack.
+
+    Example:
+        with FramePack('dataset/image_extraction/video_01.pack', 'w') as pack:
+            pack.append_frame('frame_0.5s.jpg', frame, 0.5)
+        frame = FramePack('dataset/image_extraction/video_01.pack').read_image('frame_0.5s.jpg')
+    """
+
+    SUFFIX = '.pack'
+    INDEX_DTYPE = np.dtype([('name', 'S64'), ('time', '<f8'), ('offset', '<u8'), ('length', '<u4')])
+    MODES = ('r', 'w', 'a')
+
+    def __init__(self, path, mode='r'):
+        """
+        Initializes the FramePack class.
+
+        Parameters:
+            - path (str): Path of the container file, ending with '.pack'.
+            - mode (str): 'r', 'w' or 'a'. Default is 'r'.
+        """
+        if not path.endswith(self.SUFFIX):
+            raise ValueError(f"Error: Frame pack path '{path}' must end with '{self.SUFFIX}'.")
+        if mode not in self.MODES:
+            raise ValueError(f"Error: Unknown frame pack mode '{mode}'.")
+
+        self.path = path
+        self.index_path = path + '.idx'
+        self.mode = mode
+        self.data_file = None
+        self.index_file = None
+        if mode != 'r':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            file_mode = 'wb' if mode == 'w' else 'ab'
+            self.data_file = open(path, file_mode)
+            self.index_file = open(self.index_path, file_mode)
+        self.refresh()
+        # 쓰는 중이면 파일 끝에서부터 이어 붙인다
+        self.offset = os.path.getsize(path)
+        self.count = len(self.index)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def refresh(self):
+        """
+        Map the index and data files again, so frames appended since opening (or the last refresh) can be read.
+        """
+        if self.data_file is not None:
+            self.flush()
+        records = os.path.getsize(self.index_path) // self.INDEX_DTYPE.itemsize
+        # 빈 파일은 memory map을 만들 수 없으므로 빈 배열로 둔다
+        self.index = (np.memmap(self.index_path, dtype=self.INDEX_DTYPE, mode='r', shape=(records,))
+                      if records else np.zeros(0, dtype=self.INDEX_DTYPE))
+        size = os.path.getsize(self.path)
+        self.data = np.memmap(self.path, dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+        self.positions = None
+
+    def append(self, name, data, time=np.nan):
+        """
+        Append an encoded frame. The frame bytes are written before its index record,
+        so an interrupted write never leaves a record pointing past the data.
+
+        Parameters:
+            - name (str): Frame filename such as 'frame_0.5s.jpg'.
+            - data (bytes): Encoded image.
+            - time (float): Timestamp in seconds. Default is NaN.
+
+        Returns:
+            - position (int): Row of the frame.
+        """
+        if self.data_file is None:
+            raise ValueError("Error: Frame pack is opened read-only.")
+        encoded_name = name.encode('utf-8')
+        if len(encoded_name) > self.INDEX_DTYPE['name'].itemsize:
+            raise ValueError(f"Error: Frame name '{name}' is too long for the pack index.")
+
+        record = np.zeros(1, dtype=self.INDEX_DTYPE)
+        record['name'] = encoded_name
+        record['time'] = time
+        record['offset'] = self.offset
+        record['length'] = len(data)
+
+        self.data_file.write(data)
+        self.index_file.write(record.tobytes())
+        self.offset += len(data)
+        self.count += 1
+        return self.count - 1
+
+    def append_frame(self, name, frame, time=np.nan, quality=95):
+        """
+        Encode a BGR frame to JPEG and append it.
+
+        Parameters:
+            - name (str): Frame filename such as 'frame_0.5s.jpg'.
+            - frame (numpy.ndarray): BGR frame.
+            - time (float): Timestamp in seconds. Default is NaN.
+            - quality (int): JPEG quality. Default is 95.
+
+        Returns:
+            - position (int): Row of the frame.
+        """
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError(f"Error: Cannot encode frame '{name}'.")
+        return self.append(name, encoded.tobytes(), time)
+
+    def flush(self):
+        """
+        Flush the appended frames to disk.
+        """
+        if self.data_file is not None:
+            self.data_file.flush()
+            self.index_file.flush()
+
+    def names(self):
+        """
+        Frame names in append order.
+
+        Returns:
+            - names (list): Frame filenames such as 'frame_0.5s.jpg'.
+        """
+        return [name.decode('utf-8') for name in self.index['name'].tolist()]
+
+    def times(self):
+        """
+        Frame timestamps in append order.
+
+        Returns:
+            - times (numpy.ndarray): Timestamps in seconds, NaN where unknown.
+        """
+        return np.asarray(self.index['time'])
+
+    def position(self, key):
+        """
+        Row of a frame.
+
+        Parameters:
+            - key (int or str): Row, or frame filename such as 'frame_0.5s.jpg'.
+
+        Returns:
+            - position (int): Row of the frame.
+        """
+        if isinstance(key, (int, np.integer)):
+            return int(key)
+        if self.positions is None or key not in self.positions:
+            if self.data_file is not None:
+                self.refresh()
+            # 같은 이름이 다시 추가되면 마지막 프레임을 쓴다
+            self.positions = {name: i for i, name in enumerate(self.names())}
+        if key not in self.positions:
+            raise ValueError(f"Error: Frame '{key}' is not in {self.path}.")
+        return self.positions[key]
+
+    def read(self, key):
+        """
+        Encoded bytes of a frame, read through the memory map.
+
+        Parameters:
+            - key (int or str): Row, or frame filename.
+
+        Returns:
+            - data (memoryview): Encoded image.
+        """
+        position = self.position(key)
+        if position >= len(self.index):
+            self.refresh()
+        record = self.index[position]
+        offset = int(record['offset'])
+        return memoryview(self.data[offset:offset + int(record['length'])])
+
+    def read_image(self, key):
+        """
+        Decoded BGR frame.
+
+        Parameters:
+            - key (int or str): Row, or frame filename.
+
+        Returns:
+            - frame (numpy.ndarray): BGR frame.
+        """
+        return cv2.imdecode(np.frombuffer(self.read(key), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def iter_frames(self):
+        """
+        Yield the decoded frames in append order, e.g. as input of InstanceSegmentation.predict_frames().
+
+        Yields:
+            - (name, frame) (tuple): Frame filename and BGR frame.
+        """
+        if self.data_file is not None:
+            self.refresh()
+        for position, name in enumerate(self.names()):
+            yield name, self.read_image(position)
+
+    def path_of(self, name):
+        """
+        Virtual path of a frame inside the pack.
+
+        Parameters:
+            - name (str): Frame filename such as 'frame_0.5s.jpg'.
+
+        Returns:
+            - path (str): Path such as 'dataset/image_extraction/video_01.pack/frame_0.5s.jpg'.
+        """
+        return os.path.join(self.path, name)
+
+    def close(self):
+        """
+        Flush and close the pack.
+        """
+        if self.data_file is not None:
+            self.flush()
+            self.data_file.close()
+            self.index_file.close()
+            self.data_file = None
+            self.index_file = None
+
+# 프로세스마다 한 번만 연 pack을 재사용한다. 값은 (pack, 열 때의 파일 상태)
+_open_packs = {}
+
+def split_pack_path(path):
+    """
+    Container path and frame name of a virtual path inside a pack.
+
+    Parameters:
+        - path (str): Frame path.
+
+    Returns:
+        - (pack_path, name) (tuple): Container path and frame filename, or None for a regular file.
+    """
+    pack_path, name = os.path.split(path)
+    if pack_path.endswith(FramePack.SUFFIX):
+        return pack_path, name
+    return None
+
+def pack_state(pack_path):
+    """
+    Size and modification time of the index and data files of a pack, which change whenever it is appended to or rewritten.
+
+    Parameters:
+        - pack_path (str): Container path ending with '.pack'.
+
+    Returns:
+        - state (tuple): (size, mtime_ns) of the index file and of the data file.
+    """
+    index, data = os.stat(pack_path + '.idx'), os.stat(pack_path)
+    return index.st_size, index.st_mtime_ns, data.st_size, data.st_mtime_ns
+
+def open_pack(pack_path):
+    """
+    Read-only pack shared by every read of this process.
+    It is opened again when its files changed since, e.g. after this process rewrote it with mode 'w',
+    so reads never miss new frames or go through stale memory maps.
+    """
+    state = pack_state(pack_path)
+    cached = _open_packs.get(pack_path)
+    if cached is None or cached[1] != state:
+        _open_packs[pack_path] = (FramePack(pack_path), state)
+    return _open_packs[pack_path][0]
+
+def open_frame(path):
+    """
+    Open a frame for reading, from a pack or from a regular file.
+
+    Parameters:
+        - path (str): Frame path, possibly a virtual path inside a pack.
+
+    Returns:
+        - file: Binary file object of the encoded image.
+    """
+    packed = split_pack_path(path)
+    if packed is None:
+        return open(path, 'rb')
+    pack_path, name = packed
+    return io.BytesIO(open_pack(pack_path).read(name))
+
+def read_image(path):
+    """
+    Decoded BGR frame, from a pack or from a regular file.
+
+    Parameters:
+        - path (str): Frame path, possibly a virtual path inside a pack.
+
+    Returns:
+        - frame (numpy.ndarray): BGR frame, or None when a regular file cannot be read (like cv2.imread).
+    """
+    packed = split_pack_path(path)
+    if packed is None:
+        return cv2.imread(path)
+    pack_path, name = packed
+    return open_pack(pack_path).read_image(name)
+
+def list_frames(path):
+    """
+    Frame filenames of a folder or of a pack, like os.listdir().
+
+    Parameters:
+        - path (str): Folder of frame images, or a pack path ending with '.pack'.
+
+    Returns:
+        - names (list): Frame filenames, in append order for a pack.
+    """
+    if path.endswith(FramePack.SUFFIX):
+        return open_pack(path).names()
+    return os.listdir(path)
@@ -0,0 +1,83 @@
+import os
+import time
+import threading
+
+import psutil
+
+class ModelRegistry:
+    """
+    A process-wide registry that loads every model once, lazily, and shares it across all instances and videos.
+    It records the load time and the resident memory added by each model.
+
+    Methods:
+        - get(key, loader): Returns the model registered under key, loading it with loader() on first use.
+        - stats(): Load time and resident memory of every loaded model.
+        - report(): Prints stats().
+        - clear(): Drops every loaded model.
+
+    Example:
+        from common.model_registry import registry
+
+        model = registry.get(('yolo', 'data/best.pt'), lambda: YOLO('data/best.pt'))
+        registry.report()
+    """
+
+    def __init__(self):
+        """
+        Initializes the ModelRegistry class.
+        """
+        self.models = {}
+        self.load_stats = {}
+        self.lock = threading.Lock()
+        self.process = psutil.Process(os.getpid())
+
+    def get(self, key, loader):
+        """
+        Returns the model registered under key, loading it with loader() on first use.
+
+        Parameters:
+            - key (hashable): Model identity, e.g. ('yolo', model_path).
+            - loader (callable): Function returning the loaded model.
+
+        Returns:
+            - model: The shared model instance.
+        """
+        with self.lock:
+            if key not in self.models:
+                rss_before = self.process.memory_info().rss
+                start = time.perf_counter()
+                self.models[key] = loader()
+                self.load_stats[key] = {
+                    'load_sec': time.perf_counter() - start,
+                    'rss_mb': (self.process.memory_info().rss - rss_before) / 1024**2,
+                    'uses': 0,
+                }
+            self.load_stats[key]['uses'] += 1
+            return self.models[key]
+
+    def stats(self):
+        """
+        Load time, resident memory added at load time, and number of uses of every loaded model.
+
+        Returns:
+            - stats (dict): Mapping of key to {'load_sec', 'rss_mb', 'uses'}.
+        """
+        return {key: dict(value) for key, value in self.load_stats.items()}
+
+    def report(self):
+        """
+        Prints stats() and the current resident memory of the process.
+        """
+        for key, value in self.load_stats.items():
+            print(f"model {key}: loaded in {value['load_sec']:.2f}s, +{value['rss_mb']:.0f} MB resident, used {value['uses']} times")
+        print(f'process resident memory: {self.process.memory_info().rss / 1024**2:.0f} MB')
+
+    def clear(self):
+        """
+        Drops every loaded model.
+        """
+        with self.lock:
+            self.models.clear()
+            self.load_stats.clear()
+
+registry = ModelRegistry()
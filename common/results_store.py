@@ -0,0 +1,267 @@
+import re
+import sqlite3
+import numpy as np
+
+def frame_time(name):
+    """
+    Timestamp of a frame named like 'frame_0.5s' or 'frame_0.5s.jpg'.
+
+    Parameters:
+        - name (str): Frame name.
+
+    Returns:
+        - time (float): Timestamp in seconds.
+    """
+    return float(re.search(r'frame_([0-9.]+)s', name).group(1))
+
+def frame_key(name):
+    """
+    Frame name without the image or label extension, e.g. 'frame_0.5s'.
+    """
+    return re.sub(r'\.(jpg|txt)$', '', name)
+
+class ResultsStore:
+    """
+    A typed SQLite results store shared by all stages, replacing the pickled lists in dataset/result_txt.
+    Rows are appended as each stage produces them, and every table is indexed by survey and timestamp.
+
+    Tables:
+        - frames: Frames inferred per survey, with a detection flag.
+        - detections: Per-frame, per-class instance count, highest confidence and mask area from inference.
+        - polygons: Every mask polygon from inference, as float32 normalized (x, y) pairs.
+        - areas: Per-frame, per-class area computed by comparative_analysis.
+        - matches: Search frame matched to every query frame by frame_matching.
+
+    Methods:
+        - add_frame(survey, name, detected): Append a frame.
+        - add_detections(survey, name, rows): Append the per-class detections of a frame.
+        - add_polygons(survey, name, polygons): Append the polygons of a frame.
+        - add_areas(survey, rows): Append per-class areas.
+        - add_matches(query_survey, search_survey, pairs): Append frame matches.
+        - clear(table, survey): Delete the rows of a survey before it is written again.
+        - commit(): Commit the pending rows.
+        - frames(survey, detected=None): Frame names of a survey in time order.
+        - detection_areas(survey): Inference mask area of each class per frame.
+        - areas(survey): Area of each class per frame.
+        - matches(query_survey, search_survey): Matched frame pairs in query time order.
+        - close(): Commit and close the database.
+
+    Example:
+        store = ResultsStore('dataset/results.db')
+        query_frames = store.frames('video_01', detected=True)
+        store.add_matches('video_01', 'video_02', [('frame_0.5s', 'frame_0.6s.jpg', 0.12)])
+        store.commit()
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS frames (
+            survey TEXT NOT NULL, name TEXT NOT NULL, time REAL NOT NULL, detected INTEGER NOT NULL,
+            PRIMARY KEY (survey, name));
+        CREATE INDEX IF NOT EXISTS frames_time ON frames (survey, time);
+
+        CREATE TABLE IF NOT EXISTS detections (
+            survey TEXT NOT NULL, name TEXT NOT NULL, time REAL NOT NULL, class_id INTEGER NOT NULL,
+            instances INTEGER NOT NULL, confidence REAL NOT NULL, area REAL NOT NULL,
+            PRIMARY KEY (survey, name, class_id));
+        CREATE INDEX IF NOT EXISTS detections_time ON detections (survey, time);
+
+        CREATE TABLE IF NOT EXISTS polygons (
+            survey TEXT NOT NULL, name TEXT NOT NULL, time REAL NOT NULL, instance INTEGER NOT NULL,
+            class_id INTEGER NOT NULL, confidence REAL NOT NULL, points BLOB NOT NULL,
+            PRIMARY KEY (survey, name, instance));
+        CREATE INDEX IF NOT EXISTS polygons_time ON polygons (survey, time);
+
+        CREATE TABLE IF NOT EXISTS areas (
+            survey TEXT NOT NULL, name TEXT NOT NULL, time REAL NOT NULL, class_id INTEGER NOT NULL, area REAL NOT NULL,
+            PRIMARY KEY (survey, name, class_id));
+        CREATE INDEX IF NOT EXISTS areas_time ON areas (survey, time);
+
+        CREATE TABLE IF NOT EXISTS matches (
+            query_survey TEXT NOT NULL, query_name TEXT NOT NULL, query_time REAL NOT NULL,
+            search_survey TEXT NOT NULL, search_name TEXT NOT NULL, search_time REAL NOT NULL, distance REAL,
+            PRIMARY KEY (query_survey, search_survey, query_name));
+        CREATE INDEX IF NOT EXISTS matches_time ON matches (query_survey, search_survey, query_time);
+    """
+    TABLES = {'frames': 'survey', 'detections': 'survey', 'polygons': 'survey', 'areas': 'survey', 'matches': 'query_survey'}
+
+    def __init__(self, path, num_classes=3):
+        """
+        Initializes the ResultsStore class.
+
+        Parameters:
+            - path (str): Path of the SQLite database file. Created if missing.
+            - num_classes (int): Number of classes. Default is 3.
+        """
+        self.path = path
+        self.num_classes = num_classes
+        self.connection = sqlite3.connect(path)
+        # 여러 단계가 번갈아 쓰므로 WAL 모드로 읽기와 쓰기가 서로 막지 않게 한다
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self.SCHEMA)
+
+    def add_frame(self, survey, name, detected):
+        """
+        Append a frame.
+
+        Parameters:
+            - survey (str): Survey identifier such as 'video_01'.
+            - name (str): Frame name such as 'frame_0.5s.jpg'.
+            - detected (bool): Whether any instance was detected in the frame.
+        """
+        name = frame_key(name)
+        self.connection.execute('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)',
+                                (survey, name, frame_time(name), int(detected)))
+
+    def add_detections(self, survey, name, rows):
+        """
+        Append the per-class detections of a frame.
+
+        Parameters:
+            - survey (str): Survey identifier.
+            - name (str): Frame name.
+            - rows (list): (class_id, instances, confidence, area) tuples.
+        """
+        name = frame_key(name)
+        time = frame_time(name)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(survey, name, time, int(c), int(n), float(conf), float(area)) for c, n, conf, area in rows])
+
+    def add_polygons(self, survey, name, polygons):
+        """
+        Append the polygons of a frame.
+
+        Parameters:
+            - survey (str): Survey identifier.
+            - name (str): Frame name.
+            - polygons (list): (class_id, confidence, (N, 2) normalized polygon) tuples.
+        """
+        name = frame_key(name)
+        time = frame_time(name)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO polygons VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(survey, name, time, i, int(c), float(conf), np.asarray(points, dtype=np.float32).tobytes())
+             for i, (c, conf, points) in enumerate(polygons)])
+
+    def add_areas(self, survey, rows):
+        """
+        Append per-class areas.
+
+        Parameters:
+            - survey (str): Survey identifier.
+            - rows (list): (frame name, per-class areas) tuples.
+        """
+        records = []
+        for name, areas in rows:
+            name = frame_key(name)
+            time = frame_time(name)
+            records += [(survey, name, time, class_id, float(area)) for class_id, area in enumerate(areas)]
+        self.connection.executemany('INSERT OR REPLACE INTO areas VALUES (?, ?, ?, ?, ?)', records)
+
+    def add_matches(self, query_survey, search_survey, pairs):
+        """
+        Append frame matches.
+
+        Parameters:
+            - query_survey (str): Survey of the query frames.
+            - search_survey (str): Survey of the matched frames.
+            - pairs (list): (query name, search name, distance) tuples.
+        """
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(query_survey, frame_key(q), frame_time(q), search_survey, frame_key(s), frame_time(s), d)
+             for q, s, d in pairs])
+
+    def clear(self, table, survey):
+        """
+        Delete the rows of a survey, so a stage run again does not leave rows of the previous run.
+
+        Parameters:
+            - table (str): Table name.
+            - survey (str): Survey identifier (query survey for matches).
+        """
+        if table not in self.TABLES:
+            raise ValueError(f"Error: Unknown table '{table}'.")
+        self.connection.execute(f'DELETE FROM {table} WHERE {self.TABLES[table]} = ?', (survey,))
+
+    def commit(self):
+        """
+        Commit the pending rows.
+        """
+        self.connection.commit()
+
+    def frames(self, survey, detected=None):
+        """
+        Frame names of a survey in time order.
+
+        Parameters:
+            - survey (str): Survey identifier.
+            - detected (bool, optional): Only frames with (True) or without (False) detections. Default is None (all).
+
+        Returns:
+            - names (list): Frame names such as 'frame_0.5s'.
+        """
+        if detected is None:
+            rows = self.connection.execute('SELECT name FROM frames WHERE survey = ? ORDER BY time', (survey,))
+        else:
+            rows = self.connection.execute('SELECT name FROM frames WHERE survey = ? AND detected = ? ORDER BY time',
+                                           (survey, int(detected)))
+        return [name for name, in rows]
+
+    def _class_table(self, table, survey):
+        """
+        Per-class values of a survey as a mapping of frame name to (num_classes,) array.
+        """
+        values = {}
+        for name, class_id, value in self.connection.execute(
+                f'SELECT name, class_id, area FROM {table} WHERE survey = ? ORDER BY time', (survey,)):
+            if name not in values:
+                values[name] = np.zeros(self.num_classes, dtype=np.float64)
+            values[name][class_id] = value
+        return values
+
+    def detection_areas(self, survey):
+        """
+        Inference mask area of each class per frame.
+
+        Parameters:
+            - survey (str): Survey identifier.
+
+        Returns:
+            - areas (dict): Mapping of frame name to (num_classes,) areas. Frames without detections are missing.
+        """
+        return self._class_table('detections', survey)
+
+    def areas(self, survey):
+        """
+        Area of each class per frame, as computed by comparative_analysis.
+
+        Parameters:
+            - survey (str): Survey identifier.
+
+        Returns:
+            - areas (dict): Mapping of frame name to (num_classes,) areas.
+        """
+        return self._class_table('areas', survey)
+
+    def matches(self, query_survey, search_survey):
+        """
+        Matched frame pairs in query time order.
+
+        Parameters:
+            - query_survey (str): Survey of the query frames.
+            - search_survey (str): Survey of the matched frames.
+
+        Returns:
+            - pairs (list): (query name, search name) tuples.
+        """
+        return self.connection.execute(
+            'SELECT query_name, search_name FROM matches WHERE query_survey = ? AND search_survey = ? ORDER BY query_time',
+            (query_survey, search_survey)).fetchall()
+
+    def close(self):
+        """
+        Commit and close the database.
+        """
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,36 @@
+import torch
+
+def select_device(device=None):
+    """
+    Select the device of a model, falling back to the CPU when CUDA is not available.
+    Shared by the YOLO inference backend and the frame matching embedding engine.
+
+    Parameters:
+        - device (int or str, optional): Requested device such as 0, 'cuda:0' or 'cpu'. Default is None (automatic).
+
+    Returns:
+        - device (int or str): Device usable on this machine, 0 (the first GPU) or 'cpu' when chosen automatically.
+    """
+    if device is None:
+        return 0 if torch.cuda.is_available() else 'cpu'
+    if str(device) != 'cpu' and not torch.cuda.is_available():
+        print(f'CUDA is not available, running on cpu instead of {device}')
+        return 'cpu'
+    return device
+
+def set_threads(num_threads=None, num_interop_threads=None):
+    """
+    Apply CPU thread counts to torch. Unset counts keep the torch default.
+
+    Parameters:
+        - num_threads (int, optional): Number of intra-op CPU threads. Default is None.
+        - num_interop_threads (int, optional): Number of inter-op CPU threads. Default is None.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # inter-op 스레드 수는 병렬 작업이 한 번이라도 실행된 뒤에는 바꿀 수 없다
+            print('inter-op threads are already fixed for this process, keeping', torch.get_num_interop_threads())
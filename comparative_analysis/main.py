@@ -1,8 +1,15 @@
 import os
+import sys
 import time
 import pickle
 
+# 여러 단계가 함께 쓰는 common 패키지를 불러올 수 있도록 저장소 루트를 추가한다
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from utils.comparing_the_inference_results import ComparativeAnalysis
+from utils.report_engine import ReportEngine
+from common.results_store import ResultsStore
+from common.frame_manifest import FrameManifest
 
 class Main:
     """
@@ -17,74 +24,117 @@ class Main:
         - runner(): Method to run the ComparativeAnalysis and process the results.
     """
     
-    def __init__(self, path, label, option):
+    def __init__(self, path, label, option, area_table=None, area_mode='sum', store=None, survey=None, workers=None, manifest=None):
         """
         Constructor for the Main class.
 
         Parameters:
-            - path (str): Path to the result file.
+            - path (str or list): Path to the result file, or a list of frame names.
             - label (str): Label path.
+            - option (str): Suffix of the output file name.
+            - area_table (str, optional): Path to the area table written during inference.
+                                          Used instead of the labels when it exists and was written with area_mode.
+            - area_mode (str): 'sum' or 'union' area of the label polygons of each class. Default is 'sum'.
+            - store (ResultsStore, optional): Results store receiving the areas. Default is None.
+            - survey (str, optional): Survey identifier of the analysed video, such as 'video_01'. Default is None.
+            - workers (int, optional): Number of processes parsing label files. Default is None (os.cpu_count()).
+            - manifest (str, optional): Path of the FrameManifest of the analysed video, used instead of scanning the labels. Default is None.
         """
         self.path = path
         self.label = label
         self.option = option
+        self.area_table = area_table
+        self.area_mode = area_mode
+        self.store = store
+        self.survey = survey
+        self.workers = workers
+        self.manifest = manifest
         
     def runner(self):
         """
         Method to run the ComparativeAnalysis and process the results.
+        The area table is used when it was written with area_mode, otherwise the areas are computed from the label files.
         """
-        results = ComparativeAnalysis(self.path, self.label, self.option)
+        if self.area_table and os.path.exists(self.area_table):
+            results = ComparativeAnalysis(self.path, self.label, self.option, self.area_table, area_mode=self.area_mode,
+                                          store=self.store, survey=self.survey)
+            table_mode = results.area_table_mode()
+            if table_mode == self.area_mode:
+                results.process_area_table()
+                return
+            # area table의 면적 방식이 다르면 label 파일에서 다시 계산하고, label도 없으면 멈춘다
+            if not os.path.isdir(self.label):
+                raise ValueError(f"Error: {self.area_table} holds '{table_mode}' areas and there are no labels to compute "
+                                 f"'{self.area_mode}' areas from. Run the YOLO stage with area_mode='{self.area_mode}' or save_labels=True.")
+
+        manifest = FrameManifest(self.manifest) if self.manifest and os.path.exists(self.manifest) else None
+        results = ComparativeAnalysis(self.path, self.label, self.option, area_mode=self.area_mode,
+                                      store=self.store, survey=self.survey, workers=self.workers, manifest=manifest)
         results.process_results_folder()
         
+def open_store():
+    """
+    Opens the results store written by the earlier stages.
+
+    Returns:
+        - store (ResultsStore): Results store, or None when the earlier stages wrote pickled lists instead.
+    """
+    store_path = os.path.join(os.getcwd(), 'dataset', 'results.db')
+    return ResultsStore(store_path) if os.path.exists(store_path) else None
+
 def main():
     """
     Main function that processes a list of results and runs the ComparativeAnalysis.
     """
     PATH = os.getcwd()
+    store = open_store()
     
-    run_01 = Main(os.path.join(PATH, 'dataset/result_txt', '_image_info.txt'), os.path.join(PATH, 'runs/segment', 'inference_video_01', 'labels/'), '01')
+    if store is not None:
+        # 검출된 video_01 프레임과, 그 프레임에 매칭된 video_02 프레임을 저장소에서 읽는다
+        path_01 = store.frames('video_01', detected=True)
+        path_02 = [search for _, search in store.matches('video_01', 'video_02')]
+    else:
+        path_01 = os.path.join(PATH, 'dataset/result_txt', '_image_info.txt')
+        path_02 = os.path.join(PATH, 'dataset/result_txt', '_pair_info.txt')
+    
+    run_01 = Main(path_01, os.path.join(PATH, 'runs/segment', 'inference_video_01', 'labels/'), '01',
+                  os.path.join(PATH, 'runs/segment', 'inference_video_01', 'area_table.pkl'), store=store, survey='video_01',
+                  manifest=os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_01.npy'))
     run_01.runner()
     
-    run_02 = Main(os.path.join(PATH, 'dataset/result_txt', '_pair_info.txt'), os.path.join(PATH, 'runs/segment', 'inference_video_02', 'labels/'), '02')
+    run_02 = Main(path_02, os.path.join(PATH, 'runs/segment', 'inference_video_02', 'labels/'), '02',
+                  os.path.join(PATH, 'runs/segment', 'inference_video_02', 'area_table.pkl'), store=store, survey='video_02',
+                  manifest=os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_02.npy'))
     run_02.runner()
+    
+    if store is not None:
+        store.close()
 
-def generate_final_report():
+def generate_final_report(formats=('txt', 'csv', 'jsonl')):
     """
     Function to generate the final report based on the processed results.
+    The areas of video_01 and video_02 are joined on the matched frames and written to results/final_report.{txt,csv,jsonl}.
+
+    Parameters:
+        - formats (tuple): Report files to write, any of 'txt', 'csv' and 'jsonl'. Default is all three.
     """
-    load_path = os.path.join(os.getcwd(), 'dataset/result_txt')
-    
-    with open(os.path.join(load_path, '_mask_info_01.txt'), 'rb') as lf:
-        right_01 = pickle.load(lf)
-    
-    with open(os.path.join(load_path, '_mask_info_02.txt'), 'rb') as lf:
-        right_02 = pickle.load(lf)
+    engine = ReportEngine()
+    store = open_store()
+    if store is not None:
+        joined = engine.join(store.areas('video_01'), store.areas('video_02'), store.matches('video_01', 'video_02'))
+        store.close()
+    else:
+        load_path = os.path.join(os.getcwd(), 'dataset/result_txt')
         
-    file_tmp = []
-    save_path = os.path.join(os.getcwd(), 'results')
-    
-    for num in range(len(right_01)):
-        info_tmp = []
-        
-        for i in right_01[num][1].keys():
-            if right_01[num][1][i] != 0:
-                info_tmp.append(str(round((right_01[num][1][i] - right_02[num][1][i])/right_01[num][1][i]*100, 2))+'% 변화')
-            else:
-                info_tmp.append('변화 없음')
-        frame_tmp = (right_02[num][0].split('_')[1]).split('.')[0]
-        txt = ' '.join([
-            f'video_02 {frame_tmp}s :',
-            f'reinforcement {info_tmp[0]} |',
-            f'white_bleeding {info_tmp[1]} |',
-            f'red_bleeding {info_tmp[2]}'
-        ])
-        file_tmp.append(txt)
+        with open(os.path.join(load_path, '_mask_info_01.txt'), 'rb') as lf:
+            right_01 = pickle.load(lf)
         
-    with open(save_path + '/final_report.txt', 'wb') as f:
-        pickle.dump(file_tmp, f)
+        with open(os.path.join(load_path, '_mask_info_02.txt'), 'rb') as lf:
+            right_02 = pickle.load(lf)
+        joined = engine.from_mask_info(right_01, right_02)
         
-    with open(save_path +'/final_report.txt', 'rb') as lf:
-        report = pickle.load(lf)
+    save_path = os.path.join(os.getcwd(), 'results')
+    engine.write(os.path.join(save_path, 'final_report'), joined, formats)
 
 if __name__ == "__main__":
     main()
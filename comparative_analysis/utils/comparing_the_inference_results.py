@@ -3,34 +3,56 @@ import pickle
 import natsort
 
 from shapely.geometry import Polygon
-from shapely.geometry.polygon import orient
+
+from utils.polygon_area import PolygonAreaEngine
 
 class ComparativeAnalysis:
     """
     A class for comparative analysis of instance segmentation results using YOLO labels.
 
     Methods:
-        - __init__(file_info, search_folder, option): Initializes the ComparativeAnalysis class.
+        - __init__(file_info, search_folder, option, area_table=None, area_mode='sum', store=None, survey=None, workers=None, manifest=None):
+          Initializes the ComparativeAnalysis class.
         - txt_file_sort(txts_path, without_file_type=False): Sorts and returns the list of YOLO label files.
         - calculate_polygon_area(coordinates): Calculates the area of a polygon given its coordinates.
         - read_yolo_labels(file_path): Reads YOLO labels from a file.
-        - process_results_folder(): Processes YOLO label files in the results folder and calculates the total area for each class.
+        - load_label_files(): Loads the list of frames to analyse from file_info.
+        - save_areas(tmp): Saves the per-class areas to the results store, or to a pickle file without one.
+        - process_results_folder(): Processes YOLO label files in the results folder and calculates the total area for each class
+                                    with the vectorized PolygonAreaEngine, sharded over a process pool.
+        - process_area_table(): Reads the total area for each class from the area table written during inference.
+        - area_table_mode(): Area mode the area table was written with.
     """
     
-    def __init__(self, file_info, search_folder, option):
+    def __init__(self, file_info, search_folder, option, area_table=None, area_mode='sum', store=None, survey=None, workers=None,
+                 manifest=None):
         """
         Initializes the ComparativeAnalysis class.
 
         Parameters:
-            - file_info (str): Path to the file containing information about YOLO label files.
+            - file_info (str or list): Path to the file containing information about YOLO label files, or a list of frame names.
             - search_folder (str): Path to the folder containing YOLO label files.
             - option (str): Additional option for the output file name.
+            - area_table (str, optional): Path to the area table written during inference. Used instead of the label files when given.
+            - area_mode (str): 'sum' adds up the polygon areas of each class, 'union' counts the pixels covered by them,
+                               so overlapping instances are not counted twice. Default is 'sum'.
+            - store (ResultsStore, optional): Results store receiving the areas instead of _mask_info_{option}.txt. Default is None.
+            - survey (str, optional): Survey identifier of the analysed video in the store, such as 'video_01'. Default is None.
+            - workers (int, optional): Number of processes parsing label files. 1 parses them serially. Default is None (os.cpu_count()).
+            - manifest (FrameManifest, optional): Manifest of the analysed video. Its detection flags tell which frames have label files,
+                                                  instead of scanning search_folder. Default is None.
         """
         self.file_info = file_info
         self.search_folder = search_folder
         self.image_width = 1280
         self.image_height = 720
         self.option = option
+        self.area_table = area_table
+        self.area_engine = PolygonAreaEngine(self.image_width, self.image_height, mode=area_mode)
+        self.store = store
+        self.survey = survey
+        self.workers = workers
+        self.manifest = manifest
 
     def txt_file_sort(self, txts_path, without_file_type=False):
         """
@@ -43,6 +65,11 @@ class ComparativeAnalysis:
         Returns:
             - txt_files (list): Sorted list of YOLO label files.
         """
+        if self.manifest is not None:
+            # label 파일은 검출된 프레임에만 있으므로 매니페스트의 검출 플래그로 대신한다
+            txt_files = self.manifest.names(detected=True)
+            return [name+'.txt' for name in txt_files] if without_file_type else txt_files
+
         txt_files = [f for f in os.listdir(txts_path) if f.endswith('.txt')]
         txt_files = [float(item.split('s')[0])for item in txt_files]
         txt_files = natsort.natsorted(txt_files)
@@ -92,60 +119,109 @@ class ComparativeAnalysis:
                 labels.append((class_id, coordinates))
         return labels 
 
-    def process_results_folder(self):
+    def load_label_files(self):
         """
-        Processes YOLO label files in the results folder and calculates the total area for each class.
-        Saves the result to a pickle file.
+        Loads the list of frames to analyse from file_info, without the image extension.
 
         Returns:
-            None
+            - label_files (list): List of frame names such as 'frame_0.5s'.
         """
+        if isinstance(self.file_info, (list, tuple)):
+            return [f.split('.jpg')[0] for f in self.file_info]
         try:
             with open(self.file_info, 'rb') as file:
                 label_files = pickle.load(file)
         except:
             with open(self.file_info, 'rb') as file:
                 label_files = file.readlines()
-                label_files = [(line.decode().strip()).split('.jpg')[0] for line in label_files]
-        search_list = [f.split('.txt')[0] for f in os.listdir(self.search_folder) if f.endswith('.txt')]
+                label_files = [line.decode().strip() for line in label_files]
+        # _pair_info.txt의 프레임 이름에는 .jpg 확장자가 붙어 있다
+        return [f.split('.jpg')[0] for f in label_files]
+
+    def save_areas(self, tmp):
+        """
+        Saves the per-class areas to the results store under survey, or to _mask_info_{option}.txt without a store.
+
+        Parameters:
+            - tmp (list): List of [frame name, {class_id: area}] pairs.
+        """
+        if self.store is not None:
+            self.store.clear('areas', self.survey)
+            self.store.add_areas(self.survey, [(name, [areas[c] for c in sorted(areas)]) for name, areas in tmp])
+            self.store.commit()
+            return
+
+        out_folder = os.path.join(os.getcwd(), 'dataset/result_txt')
+        with open(out_folder+f'/_mask_info_{self.option}.txt', 'wb') as f:
+            pickle.dump(tmp, f)
+
+    def area_table_mode(self):
+        """
+        Area mode the area table was written with. Tables written before the mode was recorded hold polygon sums.
+
+        Returns:
+            - area_mode (str): 'sum' or 'union'.
+        """
+        with open(self.area_table, 'rb') as file:
+            return pickle.load(file).get('area_mode', 'sum')
+
+    def process_area_table(self):
+        """
+        Reads the total area for each class of the frames in file_info from the area table written during inference.
+        Saves the result with save_areas() in the same format as process_results_folder().
+        Raises a ValueError when the table was written with another area mode than area_mode.
+
+        Returns:
+            None
+        """
+        with open(self.area_table, 'rb') as file:
+            table = pickle.load(file)
+        if table.get('area_mode', 'sum') != self.area_engine.mode:
+            raise ValueError(f"Error: The area table holds '{table.get('area_mode', 'sum')}' areas, not '{self.area_engine.mode}'.")
+        areas = dict(zip(table['frames'], table['areas']))
+        
+        tmp = []
+        for file_path in self.load_label_files():
+            frame_areas = areas.get(file_path)
+            if frame_areas is None:
+                total_areas = {0: 0, 1: 0, 2: 0}
+            else:
+                total_areas = {class_id: float(area) for class_id, area in enumerate(frame_areas)}
+            tmp.append([os.path.basename(file_path), total_areas])
+        self.save_areas(tmp)
+
+    def process_results_folder(self):
+        """
+        Processes YOLO label files in the results folder and calculates the total area for each class.
+        Every label file is parsed once, in parallel, and the areas are merged back in the order of file_info.
+        Saves the result with save_areas().
+
+        Returns:
+            None
+        """
+        label_files = self.load_label_files()
+        if self.manifest is not None:
+            search_set = set(self.manifest.names(detected=True))
+        else:
+            search_set = {f.split('.txt')[0] for f in os.listdir(self.search_folder) if f.endswith('.txt')}
+        # 여러 query 프레임이 같은 프레임에 매칭될 수 있으므로 label 파일은 한 번씩만 읽는다
+        present = list(dict.fromkeys(f for f in label_files if f in search_set))
+        if self.manifest is not None:
+            # 검출 플래그가 있어도 label 파일은 save_labels=True일 때만 저장되므로 실제로 있는 파일만 읽는다
+            present = [f for f in present if os.path.isfile(self.search_folder + f + '.txt')]
+        
+        areas = self.area_engine.parallel_frames_areas([self.search_folder+f+'.txt' for f in present], workers=self.workers)
+        areas = dict(zip(present, areas))
             
         tmp = []
 
         for file_path in label_files:
             total_areas = {0: 0, 1: 0, 2: 0}
             
-            if file_path in search_list:
-                yolo_labels = self.read_yolo_labels(self.search_folder+file_path+'.txt')
-                class_polygons = {}
-
-                for class_id, normalized_coordinates in yolo_labels:
-                    absolute_coordinates = [(x * self.image_width, y * self.image_height) for x, y in normalized_coordinates]
-                    
-                    if class_id not in class_polygons:
-                        class_polygons[class_id] = []
-                    class_polygons[class_id].append(absolute_coordinates)
-
-                for class_id, polygons in class_polygons.items():
-                    total_area = 0.0
-                    for poly_coords in polygons:
-                        
-                        if len(poly_coords) < 3:
-                            print("Skipping polygon with insufficient coordinates")
-                            continue
-
-                        poly_coords = orient(Polygon(poly_coords)).exterior.coords.xy
-                        area = self.calculate_polygon_area(list(zip(poly_coords[0], poly_coords[1])))
-                        total_area += area
-
-                    total_areas[class_id] = total_area
-            else: 
-                pass
+            if file_path in areas:
+                total_areas = {class_id: float(area) for class_id, area in enumerate(areas[file_path])}
 
             file_name = os.path.basename(file_path)
             tmp.append([file_name, total_areas])
-            
-            out_folder = os.path.join(os.getcwd(), 'dataset/result_txt')
-            
-            with open(out_folder+f'/_mask_info_{self.option}.txt', 'wb') as f:
-                pickle.dump(tmp, f)
+        self.save_areas(tmp)
     
\ No newline at end of file
@@ -0,0 +1,332 @@
+import os
+import math
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+
+from common.polygon_raster import UnionRasterizer
+
+def parse_label_file(file_path):
+    """
+    Parses a YOLO segmentation label file in bulk.
+    Rows are 'class x1 y1 ... xn yn' with an optional trailing confidence, and may have different lengths.
+
+    Parameters:
+        - file_path (str): Path to the YOLO label file.
+
+    Returns:
+        - class_ids (numpy.ndarray): (P,) class id of every polygon.
+        - coordinates (numpy.ndarray): (N, 2) normalized coordinates of all polygons, one after another.
+        - offsets (numpy.ndarray): (P + 1,) start of every polygon in coordinates.
+    """
+    with open(file_path, 'r') as file:
+        text = file.read()
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+
+    # np.fromstring은 잘못된 값에서 조용히 멈추므로 토큰을 모두 변환해서 오류를 드러낸다
+    try:
+        values = np.array(' '.join(lines).split(), dtype=np.float64)
+    except ValueError as error:
+        raise ValueError(f"Error: Malformed label file {file_path}: {error}") from error
+    counts = np.array([len(line.split()) for line in lines], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    # 좌표 쌍만 사용하고, 끝에 붙은 confidence는 버린다
+    num_points = (counts - 1) // 2
+
+    offsets = np.concatenate([[0], np.cumsum(num_points)])
+    point_rows = np.repeat(np.arange(len(lines)), num_points)
+    point_index = np.arange(offsets[-1]) - offsets[point_rows]
+    x_index = starts[point_rows] + 1 + 2 * point_index
+
+    coordinates = np.stack([values[x_index], values[x_index + 1]], axis=1)
+    return values[starts].astype(np.int64), coordinates, offsets
+
+def polygon_areas(coordinates, offsets):
+    """
+    Calculates the areas of all polygons at once with the shoelace formula.
+
+    Parameters:
+        - coordinates (numpy.ndarray): (N, 2) coordinates of all polygons, one after another.
+        - offsets (numpy.ndarray): (P + 1,) start of every polygon in coordinates.
+
+    Returns:
+        - areas (numpy.ndarray): (P,) area of every polygon. Polygons with fewer than 3 points have no area.
+    """
+    num_points = np.diff(offsets)
+    areas = np.zeros(len(num_points), dtype=np.float64)
+    if len(coordinates) == 0:
+        return areas
+
+    # 각 꼭짓점의 다음 꼭짓점, 폴리곤의 마지막 점은 첫 점으로 돌아간다
+    following = np.arange(1, len(coordinates) + 1)
+    nonempty = num_points > 0
+    following[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    cross = x * y[following] - x[following] * y
+    sums = np.add.reduceat(cross, offsets[:-1][nonempty])
+    areas[nonempty] = 0.5 * np.abs(sums)
+    areas[num_points < 3] = 0.0
+    return areas
+
+def chunk_areas(file_paths, image_width, image_height, num_classes, mode):
+    """
+    Per-class areas of a chunk of label files. Runs inside a worker process,
+    with one engine (and one union buffer) for the whole chunk.
+
+    Parameters:
+        - file_paths (list): Paths to YOLO label files.
+        - image_width (int): Width of the frames in pixels.
+        - image_height (int): Height of the frames in pixels.
+        - num_classes (int): Number of classes.
+        - mode (str): 'sum' or 'union'.
+
+    Returns:
+        - areas (numpy.ndarray): (len(file_paths), num_classes) areas, in file order.
+    """
+    engine = PolygonAreaEngine(image_width, image_height, num_classes, mode)
+    return engine.frames_areas(file_paths)
+
+class PolygonAreaEngine:
+    """
+    A vectorized per-class polygon area engine for YOLO segmentation label files.
+
+    Parameters:
+        - image_width (int): Width of the frames in pixels. Default is 1280.
+        - image_height (int): Height of the frames in pixels. Default is 720.
+        - num_classes (int): Number of classes. Default is 3.
+        - mode (str): 'sum' adds up the shoelace areas of the polygons, so overlapping instances are counted twice.
+                      'union' rasterizes every class into a frame-sized bitmap with UnionRasterizer and counts the covered pixels. Default is 'sum'.
+
+    Methods:
+        - frame_polygons(file_path): Class ids, pixel coordinates and offsets of the polygons of a label file.
+        - sum_areas(class_ids, coordinates, offsets): Sum of the polygon areas of each class.
+        - union_areas(class_ids, coordinates, offsets): Covered pixels of each class, rasterized into the reusable buffer.
+        - frame_areas(file_path): Total area of each class of a label file.
+        - frames_areas(file_paths): Total area of each class of several label files.
+        - parallel_frames_areas(file_paths, workers=None, chunk_size=None): The same, sharded over a process pool in chunks.
+        - scaling(file_paths, workers=(1, 2, 4, 8)): Files/s and speedup of parallel_frames_areas() for every number of workers.
+        - shapely_frame_areas(file_path): The same areas computed polygon by polygon with shapely.
+        - benchmark(file_paths): Polygons/s of the shapely path and of the vectorized path, and their largest difference.
+
+    Example:
+        engine = PolygonAreaEngine(mode='union')
+        areas = engine.frame_areas('runs/segment/inference_video_01/labels/frame_0.5s.txt')
+    """
+
+    MODES = ('sum', 'union')
+    # 이보다 작은 청크는 프로세스 간 전달 비용이 파싱 시간보다 크다
+    MIN_CHUNK = 16
+
+    def __init__(self, image_width=1280, image_height=720, num_classes=3, mode='sum'):
+        """
+        Initializes the PolygonAreaEngine class.
+
+        Parameters:
+            - image_width (int): Width of the frames in pixels. Default is 1280.
+            - image_height (int): Height of the frames in pixels. Default is 720.
+            - num_classes (int): Number of classes. Default is 3.
+            - mode (str): 'sum' or 'union'. Default is 'sum'.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Error: Unknown area mode '{mode}'.")
+
+        self.image_width = image_width
+        self.image_height = image_height
+        self.num_classes = num_classes
+        self.mode = mode
+        self.scale = np.array([image_width, image_height], dtype=np.float64)
+        self.rasterizer = UnionRasterizer(image_width, image_height, num_classes) if mode == 'union' else None
+
+    def frame_polygons(self, file_path):
+        """
+        Class ids, pixel coordinates and offsets of the polygons of a label file.
+
+        Parameters:
+            - file_path (str): Path to the YOLO label file.
+
+        Returns:
+            - class_ids (numpy.ndarray): (P,) class id of every polygon.
+            - coordinates (numpy.ndarray): (N, 2) pixel coordinates.
+            - offsets (numpy.ndarray): (P + 1,) start of every polygon in coordinates.
+        """
+        class_ids, coordinates, offsets = parse_label_file(file_path)
+        return class_ids, coordinates * self.scale, offsets
+
+    def sum_areas(self, class_ids, coordinates, offsets):
+        """
+        Sum of the shoelace polygon areas of each class.
+
+        Parameters:
+            - class_ids (numpy.ndarray): (P,) class id of every polygon.
+            - coordinates (numpy.ndarray): (N, 2) pixel coordinates.
+            - offsets (numpy.ndarray): (P + 1,) start of every polygon in coordinates.
+
+        Returns:
+            - areas (numpy.ndarray): (num_classes,) total polygon area of each class.
+        """
+        areas = polygon_areas(coordinates, offsets)
+        return np.bincount(class_ids, weights=areas, minlength=self.num_classes)[:self.num_classes]
+
+    def union_areas(self, class_ids, coordinates, offsets):
+        """
+        Covered pixels of each class. The polygons of every class are rasterized into its plane of the reusable buffer
+        of the UnionRasterizer, so pixels covered by overlapping instances are counted once.
+
+        Parameters:
+            - class_ids (numpy.ndarray): (P,) class id of every polygon.
+            - coordinates (numpy.ndarray): (N, 2) pixel coordinates.
+            - offsets (numpy.ndarray): (P + 1,) start of every polygon in coordinates.
+
+        Returns:
+            - areas (numpy.ndarray): (num_classes,) covered pixels of each class.
+        """
+        polygons = [coordinates[offsets[i]:offsets[i + 1]] for i in range(len(class_ids))]
+        return self.rasterizer.union_areas(class_ids, polygons)
+
+    def frame_areas(self, file_path):
+        """
+        Total area of each class of a label file: the sum of its polygon areas, or its covered pixels in 'union' mode.
+
+        Parameters:
+            - file_path (str): Path to the YOLO label file.
+
+        Returns:
+            - areas (numpy.ndarray): (num_classes,) total area of each class in pixels.
+        """
+        class_ids, coordinates, offsets = self.frame_polygons(file_path)
+        if self.mode == 'union':
+            return self.union_areas(class_ids, coordinates, offsets)
+        return self.sum_areas(class_ids, coordinates, offsets)
+
+    def frames_areas(self, file_paths):
+        """
+        Total area of each class of several label files.
+
+        Parameters:
+            - file_paths (list): Paths to YOLO label files.
+
+        Returns:
+            - areas (numpy.ndarray): (len(file_paths), num_classes) areas, in file order.
+        """
+        areas = np.zeros((len(file_paths), self.num_classes), dtype=np.float64)
+        for i, file_path in enumerate(file_paths):
+            areas[i] = self.frame_areas(file_path)
+        return areas
+
+    def parallel_frames_areas(self, file_paths, workers=None, chunk_size=None):
+        """
+        Total area of each class of several label files, sharded over a process pool.
+        Files are split into contiguous chunks, so every task parses many files, and chunks are merged in submission order,
+        so the result is identical to frames_areas() whatever the number of workers.
+        Only the label-file path of ComparativeAnalysis uses the pool; areas read from the area table need no parsing.
+
+        Parameters:
+            - file_paths (list): Paths to YOLO label files.
+            - workers (int, optional): Number of worker processes. 1 runs in this process. Default is os.cpu_count().
+            - chunk_size (int, optional): Number of label files per task.
+                                          Default is None (about four chunks per worker, at least MIN_CHUNK files each).
+
+        Returns:
+            - areas (numpy.ndarray): (len(file_paths), num_classes) areas, in file order.
+        """
+        workers = workers or os.cpu_count()
+        if chunk_size is None:
+            # worker마다 청크를 여러 개 주어 끝나는 시간이 고르게 한다
+            chunk_size = max(self.MIN_CHUNK, math.ceil(len(file_paths) / (4 * workers)))
+        if workers == 1 or len(file_paths) <= chunk_size:
+            return self.frames_areas(file_paths)
+
+        chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(chunk_areas, chunk, self.image_width, self.image_height, self.num_classes, self.mode)
+                       for chunk in chunks]
+            return np.concatenate([future.result() for future in futures])
+
+    def scaling(self, file_paths, workers=(1, 2, 4, 8)):
+        """
+        Files/s of parallel_frames_areas() on the same label files for every number of workers,
+        and the speedup over one worker. Run it on a machine with at least max(workers) cores.
+
+        Parameters:
+            - file_paths (list): Paths to YOLO label files.
+            - workers (tuple): Numbers of worker processes to time. Default is (1, 2, 4, 8).
+
+        Returns:
+            - report (dict): Mapping of number of workers to its 'files_per_sec' and 'speedup'.
+        """
+        report = {}
+        for count in workers:
+            start = time.perf_counter()
+            self.parallel_frames_areas(file_paths, workers=count)
+            elapsed = time.perf_counter() - start
+            report[count] = {'files_per_sec': len(file_paths) / elapsed if elapsed else float('inf')}
+            report[count]['speedup'] = report[count]['files_per_sec'] / report[workers[0]]['files_per_sec']
+            print(f"{count} workers: {report[count]['files_per_sec']:.0f} files/s, speedup {report[count]['speedup']:.2f}x "
+                  f"({os.cpu_count()} cores)")
+        return report
+
+    def shapely_frame_areas(self, file_path):
+        """
+        The same areas computed polygon by polygon with shapely, as process_results_folder() used to.
+
+        Parameters:
+            - file_path (str): Path to the YOLO label file.
+
+        Returns:
+            - areas (numpy.ndarray): (num_classes,) total area of each class in pixels.
+        """
+        areas = np.zeros(self.num_classes, dtype=np.float64)
+        with open(file_path, 'r') as file:
+            for line in file:
+                parts = line.strip().split()
+                if len(parts) < 1:
+                    continue
+                coordinates = [(float(parts[i]) * self.image_width, float(parts[i+1]) * self.image_height)
+                               for i in range(1, len(parts)-1, 2)]
+                if len(coordinates) < 3:
+                    continue
+                coords = orient(Polygon(coordinates)).exterior.coords.xy
+                areas[int(parts[0])] += Polygon(list(zip(coords[0], coords[1]))).area
+        return areas
+
+    def benchmark(self, file_paths, tolerance=1e-6):
+        """
+        Polygons/s of the shapely path and of the vectorized path on the same label files,
+        and the largest relative difference of their per-class areas.
+
+        Parameters:
+            - file_paths (list): Paths to YOLO label files.
+            - tolerance (float): Largest allowed relative difference. Default is 1e-6.
+
+        Returns:
+            - report (dict): 'polygons', 'shapely_polygons_per_sec', 'numpy_polygons_per_sec', 'max_relative_difference' and 'match'.
+        """
+        polygons = sum(len(parse_label_file(path)[0]) for path in file_paths)
+
+        start = time.perf_counter()
+        shapely_areas = np.array([self.shapely_frame_areas(path) for path in file_paths]).reshape(-1, self.num_classes)
+        shapely_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        numpy_areas = np.array([self.sum_areas(*self.frame_polygons(path)) for path in file_paths]).reshape(-1, self.num_classes)
+        numpy_sec = time.perf_counter() - start
+
+        difference = np.abs(numpy_areas - shapely_areas) / np.maximum(np.abs(shapely_areas), 1.0)
+        report = {
+            'polygons': polygons,
+            'shapely_polygons_per_sec': polygons / shapely_sec if shapely_sec else float('inf'),
+            'numpy_polygons_per_sec': polygons / numpy_sec if numpy_sec else float('inf'),
+            'max_relative_difference': float(difference.max()) if difference.size else 0.0,
+        }
+        report['match'] = report['max_relative_difference'] <= tolerance
+        print(f"{polygons} polygons: shapely {report['shapely_polygons_per_sec']:.0f}/s, "
+              f"numpy {report['numpy_polygons_per_sec']:.0f}/s, "
+              f"max relative difference {report['max_relative_difference']:.2e}")
+        return report
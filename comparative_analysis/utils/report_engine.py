@@ -0,0 +1,189 @@
+import csv
+import json
+import numpy as np
+
+from common.results_store import frame_time
+
+CLASS_NAMES = ('reinforcement', 'white_bleeding', 'red_bleeding')
+
+class ReportEngine:
+    """
+    A vectorized comparison and report engine. The per-class area tables of the two surveys are joined on the matched
+    frame keys, the change of every class in every matched frame is computed as one array operation,
+    and the report is streamed to text, CSV and JSON lines files in chunks.
+
+    Parameters:
+        - class_names (tuple): Name of every class, in class id order. Default is CLASS_NAMES.
+        - chunk_size (int): Number of report rows formatted and written at once. Default is 4096.
+
+    Methods:
+        - area_table(areas): Frame names and (N, num_classes) area array of a per-frame area mapping.
+        - join(areas_01, areas_02, matches): Areas of both surveys for every matched frame pair.
+        - from_mask_info(right_01, right_02): The same joined report from the pickled _mask_info lists.
+        - changes(areas_01, areas_02): Change percentage of every class in every matched frame.
+        - text_rows(joined, change, start, stop): Report lines of rows [start, stop).
+        - table_rows(joined, change, start, stop): CSV rows of rows [start, stop).
+        - write(path, joined, formats=('txt', 'csv', 'jsonl')): Stream the report to path with every requested extension.
+
+    Example:
+        engine = ReportEngine()
+        joined = engine.join(store.areas('video_01'), store.areas('video_02'), store.matches('video_01', 'video_02'))
+        engine.write('results/final_report', joined)
+    """
+
+    FORMATS = ('txt', 'csv', 'jsonl')
+
+    def __init__(self, class_names=CLASS_NAMES, chunk_size=4096):
+        """
+        Initializes the ReportEngine class.
+
+        Parameters:
+            - class_names (tuple): Name of every class, in class id order. Default is CLASS_NAMES.
+            - chunk_size (int): Number of report rows formatted and written at once. Default is 4096.
+        """
+        self.class_names = tuple(class_names)
+        self.num_classes = len(class_names)
+        self.chunk_size = chunk_size
+
+    def area_table(self, areas):
+        """
+        Frame names and area array of a per-frame area mapping, with an extra row of zeros for frames without areas.
+
+        Parameters:
+            - areas (dict): Mapping of frame name to (num_classes,) areas, e.g. ResultsStore.areas().
+
+        Returns:
+            - index (dict): Mapping of frame name to row.
+            - table (numpy.ndarray): (len(areas) + 1, num_classes) areas. The last row is zeros.
+        """
+        index = {name: row for row, name in enumerate(areas)}
+        table = np.zeros((len(areas) + 1, self.num_classes), dtype=np.float64)
+        if areas:
+            table[:-1] = np.array(list(areas.values()), dtype=np.float64).reshape(len(areas), self.num_classes)
+        return index, table
+
+    def join(self, areas_01, areas_02, matches):
+        """
+        Areas of both surveys for every matched frame pair. Each table is gathered with one index array,
+        and frames missing from a table get zero areas.
+
+        Parameters:
+            - areas_01 (dict): Mapping of query frame name to (num_classes,) areas.
+            - areas_02 (dict): Mapping of search frame name to (num_classes,) areas.
+            - matches (list): (query name, search name) pairs in report order, e.g. ResultsStore.matches().
+
+        Returns:
+            - joined (dict): 'query' and 'search' frame names, and 'areas_01' and 'areas_02' (N, num_classes) arrays.
+        """
+        query = [q for q, _ in matches]
+        search = [s for _, s in matches]
+        index_01, table_01 = self.area_table(areas_01)
+        index_02, table_02 = self.area_table(areas_02)
+        rows_01 = np.fromiter((index_01.get(name, -1) for name in query), dtype=np.int64, count=len(query))
+        rows_02 = np.fromiter((index_02.get(name, -1) for name in search), dtype=np.int64, count=len(search))
+        return {
+            'query': query,
+            'search': search,
+            'areas_01': table_01[rows_01],
+            'areas_02': table_02[rows_02],
+        }
+
+    def from_mask_info(self, right_01, right_02):
+        """
+        The same joined report from the pickled _mask_info lists, which are paired by position.
+
+        Parameters:
+            - right_01 (list): [frame name, {class_id: area}] pairs of video_01.
+            - right_02 (list): [frame name, {class_id: area}] pairs of the matched video_02 frames.
+
+        Returns:
+            - joined (dict): 'query' and 'search' frame names, and 'areas_01' and 'areas_02' (N, num_classes) arrays.
+        """
+        def areas(rows):
+            return np.array([[row[1][c] for c in range(self.num_classes)] for row in rows], dtype=np.float64).reshape(-1, self.num_classes)
+
+        return {
+            'query': [row[0] for row in right_01],
+            'search': [row[0] for row in right_02],
+            'areas_01': areas(right_01),
+            'areas_02': areas(right_02),
+        }
+
+    def changes(self, areas_01, areas_02):
+        """
+        Change percentage of every class in every matched frame, (area_01 - area_02) / area_01 * 100 rounded to 2 decimals.
+
+        Parameters:
+            - areas_01 (numpy.ndarray): (N, num_classes) areas of the query frames.
+            - areas_02 (numpy.ndarray): (N, num_classes) areas of the matched search frames.
+
+        Returns:
+            - change (numpy.ndarray): (N, num_classes) percentages. NaN where the query frame has no area of the class.
+        """
+        observed = areas_01 != 0
+        change = np.full(areas_01.shape, np.nan)
+        np.divide((areas_01 - areas_02) * 100, areas_01, out=change, where=observed)
+        return np.round(change, 2)
+
+    def text_rows(self, joined, change, start, stop):
+        """
+        Report lines of rows [start, stop), such as 'video_02 20s : reinforcement 100.0% 변화 | ...'.
+        """
+        seconds = np.floor([frame_time(name) for name in joined['search'][start:stop]]).astype(np.int64)
+        # 면적이 없던 클래스는 '변화 없음'으로 적는다
+        cells = np.where(np.isnan(change[start:stop]), '변화 없음',
+                         np.char.add(change[start:stop].astype(str), '% 변화'))
+        lines = []
+        for second, row in zip(seconds.tolist(), cells.tolist()):
+            classes = ' | '.join(f'{name} {cell}' for name, cell in zip(self.class_names, row))
+            lines.append(f'video_02 {second}s : {classes}\n')
+        return lines
+
+    def table_rows(self, joined, change, start, stop):
+        """
+        CSV rows of rows [start, stop): frame names, then the two areas and the change of every class.
+        A missing change is None.
+        """
+        values = np.stack([joined['areas_01'][start:stop], joined['areas_02'][start:stop], change[start:stop]], axis=2)
+        values = values.reshape(stop - start, -1).astype(object)
+        values[np.isnan(values.astype(np.float64))] = None
+        return [[q, s] + row for q, s, row in zip(joined['query'][start:stop], joined['search'][start:stop], values.tolist())]
+
+    def write(self, path, joined, formats=FORMATS):
+        """
+        Stream the report to path with every requested extension, chunk_size rows at a time.
+
+        Parameters:
+            - path (str): Output path without extension, e.g. 'results/final_report'.
+            - joined (dict): Joined report returned by join() or from_mask_info().
+            - formats (tuple): Any of 'txt', 'csv' and 'jsonl'. Default is ('txt', 'csv', 'jsonl').
+
+        Returns:
+            - change (numpy.ndarray): (N, num_classes) change percentages.
+        """
+        unknown = set(formats) - set(self.FORMATS)
+        if unknown:
+            raise ValueError(f"Error: Unknown report formats {sorted(unknown)}.")
+
+        change = self.changes(joined['areas_01'], joined['areas_02'])
+        header = ['query_frame', 'search_frame'] + [f'{name}_{column}' for name in self.class_names
+                                                    for column in ('area_01', 'area_02', 'change')]
+        files = {fmt: open(f'{path}.{fmt}', 'w', encoding='utf-8', newline='' if fmt == 'csv' else None) for fmt in formats}
+        try:
+            if 'csv' in files:
+                writer = csv.writer(files['csv'])
+                writer.writerow(header)
+            for start in range(0, len(change), self.chunk_size):
+                stop = min(start + self.chunk_size, len(change))
+                if 'txt' in files:
+                    files['txt'].writelines(self.text_rows(joined, change, start, stop))
+                if 'csv' in files or 'jsonl' in files:
+                    rows = self.table_rows(joined, change, start, stop)
+                    if 'csv' in files:
+                        writer.writerows(rows)
+                    if 'jsonl' in files:
+                        files['jsonl'].writelines(json.dumps(dict(zip(header, row))) + '\n' for row in rows)
+        finally:
+            for file in files.values():
+                file.close()
+        return change
@@ -1,10 +1,24 @@
 import os
+import sys
+import time
 import pickle
 import natsort
 import pandas as pd
 
+# 여러 단계가 함께 쓰는 common 패키지를 불러올 수 있도록 저장소 루트를 추가한다
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ann_index import IVFIndex
 from utils.image_search import ImageSearch
+from utils.feature_cache import FeatureCache
 from utils.latent_features import LatentFeaturesDict
+from utils.embedding_engine import EmbeddingEngine
+from utils.coarse_to_fine import CoarseToFineSearch
+from utils.yolo_features import YoloFeaturesDict, compare_embeddings
+from common.model_registry import registry
+from common.results_store import ResultsStore
+from common.frame_manifest import FrameManifest
+from common.frame_pack import FramePack
 
 class Main:
     """
@@ -12,11 +26,31 @@ class Main:
 
     Parameters:
         - query_path (str): Path to the query frames.
-        - query_input_list (str): Path to the query input list.
+        - query_input_list (str, list or FrameManifest): Path to the query input list, a list of query frame names, or a FrameManifest.
         - search_path (str): Path to the search frames.
-        - file_name (str): Name of the file to save the matching results.
+        - file_name (str): Name of the file to save the matching results. Unused when store is given.
+        - search_input_list (FrameManifest, optional): Manifest of the sampled search frames. None uses every frame in search_path.
+        - cache_dir (str, optional): Directory of the on-disk feature cache. None disables caching.
+        - device (str, optional): Embedding device. None uses CUDA if available, otherwise cpu.
+        - precision (str): Embedding precision, 'fp32', 'bf16' or 'fp16' (CUDA only). Default is 'fp32'.
+        - num_threads (int, optional): Number of CPU threads used for embedding. None keeps the torch default.
+        - search_mode (str): 'nearest' for independent nearest neighbours, 'align' to opt into the monotonic banded alignment of the two videos. Default is 'nearest'.
+        - coarse_stride (int, optional): Embed the search video every coarse_stride frames first and refine only around the best candidates.
+                                         Faster, but may miss matches the exhaustive search finds. Default is None (embed every search frame).
+        - compressor (FeatureCompressor, optional): Compression of the search features, fitted on them and searched as codes. None keeps float32 features. Default is None.
+        - backbone_features (tuple, optional): Paths of the query and search backbone_features.pkl saved by the YOLO stage.
+                                               When given, they replace EfficientNet as retrieval features. Default is None.
+        - evaluate_embeddings (bool): With backbone_features, also run EfficientNet and report the match agreement and the time saved. Default is False.
+        - store (ResultsStore, optional): Results store receiving the matches in place of file_name. Default is None.
+        - surveys (tuple): Survey identifiers of the query and search videos in the store. Default is ('video_01', 'video_02').
+        - index_path (str, optional): Path of a persistent IVFIndex (.npz) receiving the search frames under their survey,
+                                      so later surveys can be searched against the archive. Trained on the first survey added.
+                                      Does not change the matching. Default is None (no index).
 
     Methods:
+        - efficientnet_feature_dictionaries(): Query and search feature dictionaries embedded with EfficientNet.
+        - backbone_feature_dictionaries(): Query and search feature dictionaries of the YOLO backbone features.
+        - update_index(search_feature_dictionary): Add the search frames to the persistent index.
         - main(): Main method for performing frame matching and saving the results to a text file.
 
     Example:
@@ -27,34 +61,146 @@ class Main:
         main_instance.main()
     """
     
-    def __init__(self, query_path, query_input_list, search_path, file_name):
+    def __init__(self, query_path, query_input_list, search_path, file_name, search_input_list=None, cache_dir=None,
+                 device=None, precision='fp32', num_threads=None, search_mode='nearest',
+                 coarse_stride=None, compressor=None, backbone_features=None, evaluate_embeddings=False,
+                 store=None, surveys=('video_01', 'video_02'), index_path=None):
         """
         Initializes the Main class.
 
         Parameters:
             - query_path (str): Path to the query frames.
-            - query_input_list (str): Path to the query input list.
+            - query_input_list (str, list or FrameManifest): Query frames.
             - search_path (str): Path to the search frames.
             - file_name (str): Name of the file to save the matching results.
+            - search_input_list (FrameManifest, optional): Manifest of the sampled search frames. Default is None.
+            - cache_dir (str, optional): Directory of the on-disk feature cache. Default is None.
+            - device (str, optional): Embedding device. Default is None.
+            - precision (str): Embedding precision. Default is 'fp32'.
+            - num_threads (int, optional): Number of CPU threads used for embedding. Default is None.
+            - search_mode (str): 'nearest' or 'align'. Default is 'nearest'.
+            - coarse_stride (int, optional): Coarse stride of the search video. Default is None (exhaustive).
+            - compressor (FeatureCompressor, optional): Compression of the search features. Default is None.
+            - backbone_features (tuple, optional): Paths of the query and search backbone_features.pkl. Default is None.
+            - evaluate_embeddings (bool): Compare backbone features against EfficientNet. Default is False.
+            - store (ResultsStore, optional): Results store receiving the matches. Default is None.
+            - surveys (tuple): Survey identifiers of the query and search videos. Default is ('video_01', 'video_02').
+            - index_path (str, optional): Path of a persistent IVFIndex, ending with '.npz', receiving the search frames. Default is None.
         """
         self.query_path = query_path
         self.query_input_list = query_input_list
         self.search_path = search_path
         self.file_name = file_name
+        self.search_input_list = search_input_list
+        self.cache_dir = cache_dir
+        self.device = device
+        self.precision = precision
+        self.num_threads = num_threads
+        self.search_mode = search_mode
+        self.coarse_stride = coarse_stride
+        self.compressor = compressor
+        self.backbone_features = backbone_features
+        self.evaluate_embeddings = evaluate_embeddings
+        self.store = store
+        self.surveys = surveys
+        if index_path is not None and not index_path.endswith(IVFIndex.SUFFIX):
+            raise ValueError(f"Error: Index path '{index_path}' must end with '{IVFIndex.SUFFIX}'.")
+        self.index_path = index_path
         
-    def runner(self):
+    def efficientnet_feature_dictionaries(self):
         """
-        Main method for performing frame matching and saving the results to a text file.
+        Query and search feature dictionaries embedded with EfficientNet.
+        
+        Returns:
+            - query_feature_dictionary (dict): Features of the query frames.
+            - search_feature_dictionary (dict): Features of the search frames.
         """
-        query_features = LatentFeaturesDict(path=self.query_path, batch_size=4, input_list=self.query_input_list)
+        engine = EmbeddingEngine(device=self.device, precision=self.precision, num_threads=self.num_threads)
+        
+        cache = None
+        if self.cache_dir:
+            # precision이나 디코딩 방식이 다르면 feature도 조금씩 달라지므로 캐시 버전에 포함한다
+            version = f'{LatentFeaturesDict.feature_version()}|{engine.precision}'
+            cache = FeatureCache(self.cache_dir, version=version, max_bytes=8 * 1024**3)
+        
+        query_features = LatentFeaturesDict(path=self.query_path, batch_size=None, input_list=self.query_input_list, cache=cache, engine=engine)
         query_feature_dictionary = query_features.make_feature_dictionary()
         
-        search_features = LatentFeaturesDict(path=self.search_path, batch_size=4, input_list=None)
-        search_feature_dictionary = search_features.make_feature_dictionary()
+        if self.coarse_stride:
+            coarse_to_fine = CoarseToFineSearch(self.search_path, self.search_input_list, stride=self.coarse_stride, cache=cache, engine=engine)
+            search_feature_dictionary = coarse_to_fine.make_feature_dictionary(query_feature_dictionary)
+        else:
+            search_features = LatentFeaturesDict(path=self.search_path, batch_size=None, input_list=self.search_input_list, cache=cache, engine=engine)
+            search_feature_dictionary = search_features.make_feature_dictionary()
+        return query_feature_dictionary, search_feature_dictionary
+    
+    def backbone_feature_dictionaries(self):
+        """
+        Query and search feature dictionaries of the pooled YOLO backbone activations saved during segmentation.
+        
+        Returns:
+            - query_feature_dictionary (dict): Features of the query frames.
+            - search_feature_dictionary (dict): Features of the search frames.
+        """
+        query_backbone_features, search_backbone_features = self.backbone_features
+        query_feature_dictionary = YoloFeaturesDict(query_backbone_features, self.query_input_list).make_feature_dictionary()
+        search_feature_dictionary = YoloFeaturesDict(search_backbone_features, self.search_input_list).make_feature_dictionary()
+        return query_feature_dictionary, search_feature_dictionary
+
+    def update_index(self, search_feature_dictionary):
+        """
+        Add the search frames to the persistent IVFIndex at index_path under the search survey, and save it.
+        The index is created and trained on these frames when it does not exist yet. A survey already in the index is skipped.
+
+        Parameters:
+            - search_feature_dictionary (dict): Uncompressed features of the search frames.
+        """
+        survey = self.surveys[1]
+        if os.path.exists(self.index_path):
+            index = IVFIndex.load(self.index_path)
+        else:
+            index = IVFIndex()
+            index.train(search_feature_dictionary['features'])
+        if survey in index.surveys:
+            print(f'{survey} is already in {self.index_path}')
+            return
+        index.add_feature_dictionary(search_feature_dictionary, survey)
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        index.save(self.index_path)
+        
+    def runner(self):
+        """
+        Main method for performing frame matching and saving the results to the results store, or to a text file without one.
+        """
+        if self.backbone_features is None:
+            query_feature_dictionary, search_feature_dictionary = self.efficientnet_feature_dictionaries()
+        else:
+            query_feature_dictionary, search_feature_dictionary = self.backbone_feature_dictionaries()
+            if self.evaluate_embeddings:
+                start = time.perf_counter()
+                reference = self.efficientnet_feature_dictionaries()
+                print(f'EfficientNet embedding took {time.perf_counter() - start:.1f}s, saved by reusing the YOLO backbone')
+                compare_embeddings(reference, (query_feature_dictionary, search_feature_dictionary), mode=self.search_mode)
         
-        image_search = ImageSearch(query_feature_dictionary, search_feature_dictionary)
+        if self.index_path is not None:
+            self.update_index(search_feature_dictionary)
+        
+        if self.compressor is not None:
+            self.compressor.fit(search_feature_dictionary['features'])
+            search_feature_dictionary = self.compressor.compress_dictionary(search_feature_dictionary)
+        
+        image_search = ImageSearch(query_feature_dictionary, search_feature_dictionary, mode=self.search_mode, compressor=self.compressor)
         matching_result = image_search.get_match_result()
         
+        if self.store is not None:
+            query_survey, search_survey = self.surveys
+            self.store.clear('matches', query_survey)
+            self.store.add_matches(query_survey, search_survey,
+                                   [(query_feature_dictionary['name'][idx], search_feature_dictionary['name'][j], float(d))
+                                    for idx, (d, j) in enumerate(matching_result)])
+            self.store.commit()
+            return
+        
         temp = pd.DataFrame()
         query_= []
         search_ = []
@@ -76,16 +222,57 @@ class Main:
         with open(self.file_name, 'wb') as file:
             pickle.dump(matching_frame_list, file)
 
-def main():
+def main(use_backbone_features=False):
+    """
+    Match the detected video_01 frames to video_02 and save the matches.
+
+    Parameters:
+        - use_backbone_features (bool): Use the backbone_features.pkl saved by the YOLO stage (backbone_features=True) instead of
+                                        EfficientNet. Opt-in until evaluate_embeddings shows acceptable match agreement on real footage.
+                                        Default is False.
+    """
     PATH = os.getcwd()
     
     query_path = os.path.join(PATH, 'dataset/image_extraction/video_01')
     query_input_list = os.path.join(PATH, 'dataset/result_txt', '_image_info.txt')
     search_path = os.path.join(PATH, 'dataset/image_extraction/video_02')
     file_name = os.path.join(PATH, 'dataset/result_txt', '_pair_info.txt')
+    # YOLO 단계가 프레임을 pack 파일에 저장했다면 폴더 대신 pack에서 읽는다
+    if os.path.exists(query_path + FramePack.SUFFIX):
+        query_path += FramePack.SUFFIX
+    if os.path.exists(search_path + FramePack.SUFFIX):
+        search_path += FramePack.SUFFIX
+    # YOLO 단계가 저장한 매니페스트로 폴더를 읽지 않고 프레임 목록을 얻는다
+    manifest_01 = os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_01.npy')
+    manifest_02 = os.path.join(PATH, 'dataset/result_txt', '_frame_manifest_02.npy')
+    search_input_list = FrameManifest(manifest_02) if os.path.exists(manifest_02) else None
+    if os.path.exists(manifest_01):
+        query_input_list = FrameManifest(manifest_01).names(detected=True)
+
+    # YOLO 단계가 결과 저장소에 기록했다면 검출된 프레임 목록을 저장소에서 읽고, 매칭 결과도 저장소에 쓴다
+    store = None
+    store_path = os.path.join(PATH, 'dataset', 'results.db')
+    if os.path.exists(store_path):
+        store = ResultsStore(store_path)
+        query_input_list = store.frames('video_01', detected=True)
+
+    cache_dir = os.path.join(PATH, 'dataset/feature_cache')
+
+    # 요청한 경우에만 YOLO 단계에서 저장한 backbone feature로 EfficientNet을 대신한다
+    backbone_features = None
+    if use_backbone_features:
+        backbone_features = (os.path.join(PATH, 'runs/segment/inference_video_01/backbone_features.pkl'),
+                             os.path.join(PATH, 'runs/segment/inference_video_02/backbone_features.pkl'))
+        missing = [path for path in backbone_features if not os.path.exists(path)]
+        if missing:
+            raise ValueError(f"Error: Backbone features {missing} not found. Run the YOLO stage with backbone_features=True.")
 
-    runner = Main(query_path, query_input_list, search_path, file_name)
+    runner = Main(query_path, query_input_list, search_path, file_name, search_input_list, cache_dir,
+                  backbone_features=backbone_features, store=store)
     runner.runner()
+    if store is not None:
+        store.close()
+    registry.report()
     
     
 if __name__ == "__main__":
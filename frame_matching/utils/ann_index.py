@@ -0,0 +1,295 @@
+import time
+import numpy as np
+
+from utils.matrix_search import MatrixSearch
+
+def kmeans(features, n_clusters, iterations=20, seed=0, block_size=2048):
+    """
+    Lloyd's k-means with random initialization. Assignments use the blocked MatrixSearch engine.
+
+    Args:
+    - features (numpy.ndarray): (N, D) float32 feature matrix
+    - n_clusters (int): Number of clusters
+    - iterations (int): Number of Lloyd iterations (default: 20)
+    - seed (int): Random seed (default: 0)
+    - block_size (int): Rows per block of the assignment search (default: 2048)
+
+    Returns:
+    - numpy.ndarray: (n_clusters, D) centroids
+    - numpy.ndarray: (N,) cluster assignment of every row
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(features))
+    centroids = features[rng.choice(len(features), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        _, assignment = MatrixSearch(centroids, block_size=block_size).search(features, k=1)
+        assignment = assignment[:, 0]
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignment, features)
+
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(centroids.dtype)
+        # 비어 있는 클러스터는 임의의 벡터로 다시 시작한다
+        if empty.any():
+            centroids[empty] = features[rng.choice(len(features), empty.sum(), replace=False)]
+    return centroids, assignment
+
+class IVFIndex:
+    """
+    A persistent inverted-file (IVF) approximate nearest neighbour index over survey frame features.
+    Vectors are grouped into nlist k-means cells, and a query only scans the nprobe closest cells,
+    so archive-wide queries do not have to scan every frame of every survey.
+
+    Parameters:
+        - nlist (int): Number of k-means cells. Default is 256.
+        - nprobe (int): Number of cells scanned per query. Higher is slower and more accurate. Default is 8.
+        - metric (str): 'l2' or 'cosine'. Default is 'l2'.
+
+    Methods:
+        - prepare(features): Converts features to float32 and normalizes them for cosine.
+        - train(features): Fits the cell centroids.
+        - add(features, names, survey): Adds the frames of a survey to the index.
+        - add_feature_dictionary(feature_dict, survey): Adds a LatentFeaturesDict feature dictionary.
+        - lists(): Rows of every cell.
+        - search(query_features, k, nprobe): Finds the approximate k nearest frames of every query.
+        - recall_report(query_features, nprobes): Recall@1 and speed against exact search.
+        - save(path): Saves the index to a .npz file.
+        - load(path): Loads an index saved with save().
+
+    Example:
+        index = IVFIndex(nlist=256, nprobe=8)
+        index.train(video_01_dict['features'])
+        index.add_feature_dictionary(video_01_dict, survey='2023_video_01')
+        index.save('dataset/index/structure_a.npz')
+
+        index = IVFIndex.load('dataset/index/structure_a.npz')
+        index.add_feature_dictionary(video_02_dict, survey='2024_video_02')
+        distances, indices = index.search(query_dict['features'], k=5)
+        matched = [(index.surveys[i], index.names[i]) for i in indices[:, 0]]
+    """
+
+    METRICS = ('l2', 'cosine')
+    SUFFIX = '.npz'
+
+    def __init__(self, nlist=256, nprobe=8, metric='l2'):
+        """
+        Initialize the IVFIndex class.
+
+        Args:
+        - nlist (int): Number of k-means cells (default: 256)
+        - nprobe (int): Number of cells scanned per query (default: 8)
+        - metric (str): 'l2' or 'cosine' (default: 'l2')
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Error: Unknown metric '{metric}'.")
+
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.metric = metric
+        self.centroids = None
+        self.vectors = None
+        self.list_ids = np.zeros(0, dtype=np.int32)
+        self.names = []
+        self.surveys = []
+        self._lists = None
+
+    def prepare(self, features):
+        """
+        Convert features to float32 and L2-normalize them for the cosine metric.
+        Cosine search is then l2 search on unit vectors.
+
+        Args:
+        - features (numpy.ndarray): (N, D) feature matrix
+
+        Returns:
+        - numpy.ndarray: Prepared (N, D) float32 matrix
+        """
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if self.metric == 'cosine':
+            features = features / np.maximum(np.linalg.norm(features, axis=1, keepdims=True), 1e-12)
+        return features
+
+    def train(self, features, max_train_points=256, iterations=20, seed=0):
+        """
+        Fit the cell centroids on a sample of the features.
+
+        Args:
+        - features (numpy.ndarray): (N, D) training features
+        - max_train_points (int): Training points sampled per cell (default: 256)
+        - iterations (int): Number of k-means iterations (default: 20)
+        - seed (int): Random seed (default: 0)
+        """
+        features = self.prepare(features)
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(features), self.nlist * max_train_points)
+        sample = features[rng.choice(len(features), sample_size, replace=False)]
+        self.centroids, _ = kmeans(sample, self.nlist, iterations=iterations, seed=seed)
+        self.nlist = len(self.centroids)
+
+    def add(self, features, names, survey):
+        """
+        Add the frames of a survey to the index. Can be called again for new surveys after load().
+
+        Args:
+        - features (numpy.ndarray): (N, D) frame features
+        - names (list): Frame names, e.g. 'frame_0.5s.jpg'
+        - survey (str): Survey identifier stored with every frame
+        """
+        if self.centroids is None:
+            raise ValueError("Error: Train the index before adding vectors.")
+
+        features = self.prepare(features)
+        _, assignment = MatrixSearch(self.centroids).search(features, k=1)
+        self.vectors = features if self.vectors is None else np.concatenate([self.vectors, features])
+        self.list_ids = np.concatenate([self.list_ids, assignment[:, 0].astype(np.int32)])
+        self.names += list(names)
+        self.surveys += [survey] * len(features)
+        self._lists = None
+
+    def add_feature_dictionary(self, feature_dict, survey):
+        """
+        Add a feature dictionary built by LatentFeaturesDict.make_feature_dictionary().
+
+        Args:
+        - feature_dict (dict): Dictionary with 'name' and 'features'
+        - survey (str): Survey identifier stored with every frame
+        """
+        self.add(feature_dict['features'], feature_dict['name'], survey)
+
+    def lists(self):
+        """
+        Rows of every cell, rebuilt lazily after add().
+
+        Returns:
+        - numpy.ndarray: Row ids sorted by cell
+        - numpy.ndarray: (nlist + 1,) offsets of every cell into the sorted row ids
+        """
+        if self._lists is None:
+            order = np.argsort(self.list_ids, kind='stable')
+            offsets = np.searchsorted(self.list_ids[order], np.arange(self.nlist + 1))
+            self._lists = (order, offsets)
+        return self._lists
+
+    def search(self, query_features, k=1, nprobe=None):
+        """
+        Find the approximate k nearest frames of every query by scanning the nprobe closest cells.
+
+        Args:
+        - query_features (numpy.ndarray): (Q, D) query features
+        - k (int): Number of neighbours per query (default: 1)
+        - nprobe (int, optional): Cells scanned per query (default: the index nprobe)
+
+        Returns:
+        - numpy.ndarray: (Q, k) distances sorted in ascending order (inf where fewer than k frames were scanned)
+        - numpy.ndarray: (Q, k) row ids into names and surveys (-1 where fewer than k frames were scanned)
+        """
+        queries = self.prepare(query_features)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        _, probes = MatrixSearch(self.centroids).search(queries, k=nprobe)
+        order, offsets = self.lists()
+
+        best_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_i = np.full((len(queries), k), -1, dtype=np.int64)
+
+        # 같은 셀을 보는 쿼리끼리 묶어서 한 번에 계산한다
+        for cell in np.unique(probes):
+            rows = order[offsets[cell]:offsets[cell + 1]]
+            if len(rows) == 0:
+                continue
+            members = np.nonzero((probes == cell).any(axis=1))[0]
+            d, i = MatrixSearch(self.vectors[rows]).search(queries[members], k=k)
+            i = rows[i]
+
+            candidates_d = np.concatenate([best_d[members], d], axis=1)
+            candidates_i = np.concatenate([best_i[members], i], axis=1)
+            top = np.argsort(candidates_d, axis=1, kind='stable')[:, :k]
+            best_d[members] = np.take_along_axis(candidates_d, top, axis=1)
+            best_i[members] = np.take_along_axis(candidates_i, top, axis=1)
+
+        if self.metric == 'cosine':
+            best_d = best_d ** 2 / 2
+        return best_d, best_i
+
+    def recall_report(self, query_features, nprobes=(1, 2, 4, 8, 16, 32)):
+        """
+        Recall@1 and query speed of the index against exact search, for several nprobe values.
+
+        Args:
+        - query_features (numpy.ndarray): (Q, D) query features
+        - nprobes (tuple): nprobe values to evaluate (default: (1, 2, 4, 8, 16, 32))
+
+        Returns:
+        - list: One dict per setting with 'nprobe', 'recall@1' and 'queries_per_sec' (nprobe None is exact search)
+        """
+        queries = self.prepare(query_features)
+        start = time.perf_counter()
+        _, exact = MatrixSearch(self.vectors).search(queries, k=1)
+        report = [{'nprobe': None, 'recall@1': 1.0, 'queries_per_sec': len(queries) / (time.perf_counter() - start)}]
+
+        for nprobe in nprobes:
+            if nprobe > self.nlist:
+                continue
+            start = time.perf_counter()
+            _, approx = self.search(queries, k=1, nprobe=nprobe)
+            elapsed = time.perf_counter() - start
+            report.append({
+                'nprobe': nprobe,
+                'recall@1': float(np.mean(approx[:, 0] == exact[:, 0])),
+                'queries_per_sec': len(queries) / elapsed,
+            })
+
+        for row in report:
+            setting = 'exact' if row['nprobe'] is None else f"nprobe {row['nprobe']}"
+            print(f"{setting}: recall@1 {row['recall@1']:.3f}, {row['queries_per_sec']:.1f} queries/s")
+        return report
+
+    def save(self, path):
+        """
+        Save the index to a .npz file. A trained index without vectors saves an empty (0, D) matrix.
+
+        Args:
+        - path (str): Output path, ending with '.npz' (np.savez would add it otherwise)
+        """
+        if not path.endswith(self.SUFFIX):
+            raise ValueError(f"Error: Index path '{path}' must end with '{self.SUFFIX}'.")
+        if self.centroids is None:
+            raise ValueError("Error: Train the index before saving it.")
+        vectors = self.vectors
+        if vectors is None:
+            vectors = np.zeros((0, self.centroids.shape[1]), dtype=np.float32)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            vectors=vectors,
+            list_ids=self.list_ids,
+            names=np.array(self.names, dtype=str),
+            surveys=np.array(self.surveys, dtype=str),
+            config=np.array([self.nlist, self.nprobe]),
+            metric=np.array(self.metric),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save().
+
+        Args:
+        - path (str): Path of the saved index
+
+        Returns:
+        - IVFIndex: Loaded index
+        """
+        if not path.endswith(cls.SUFFIX):
+            raise ValueError(f"Error: Index path '{path}' must end with '{cls.SUFFIX}'.")
+        data = np.load(path)
+        nlist, nprobe = data['config']
+        index = cls(nlist=int(nlist), nprobe=int(nprobe), metric=str(data['metric']))
+        index.centroids = data['centroids']
+        # 학습만 하고 저장한 인덱스는 벡터가 없는 상태로 돌아온다
+        index.vectors = data['vectors'] if len(data['vectors']) else None
+        index.list_ids = data['list_ids']
+        index.names = data['names'].tolist()
+        index.surveys = data['surveys'].tolist()
+        return index
@@ -0,0 +1,157 @@
+import os
+import pickle
+import numpy as np
+
+from utils.matrix_search import MatrixSearch
+from common.frame_manifest import FrameManifest
+from common.frame_pack import list_frames
+from utils.image_search import frame_times
+from utils.latent_features import LatentFeaturesDict
+
+class CoarseToFineSearch:
+    """
+    A two-stage builder of the search-side feature dictionary.
+    The search video is first embedded at a coarse temporal stride, the queries are matched against the coarse frames,
+    and only the full-rate frames around the best coarse candidates are embedded for the final search.
+
+    Parameters:
+        - search_path (str): Path to the search frames, or a FramePack path ending with '.pack'.
+        - search_input_list (FrameManifest, list or str, optional): FrameManifest of the sampled search frames, a list of frame names,
+                                                                    or the path of a pickled list. Default is None (every frame in search_path).
+        - stride (int): Coarse stride in search frames. Default is 20.
+        - top_k (int): Coarse candidates refined per query. Default is 2.
+        - radius (int, optional): Full-rate frames embedded on each side of a coarse candidate. Default is None (half the stride).
+        - batch_size (int, optional): Batch size of the embedding loader. Default is None (adaptive).
+        - cache (FeatureCache, optional): On-disk feature cache. Default is None.
+        - engine (EmbeddingEngine, optional): Embedding engine. Default is None.
+        - metric (str): 'l2' or 'cosine' for the coarse search. Default is 'l2'.
+
+    Methods:
+        - search_names(): Names of the search frames in time order.
+        - embed(names): Feature dictionary of the given search frames.
+        - refine_positions(query_features, coarse_features, num_frames): Full-rate positions around the coarse candidates.
+        - make_feature_dictionary(query_feature_dictionary): Search feature dictionary of the refined frames.
+
+    Example:
+        coarse_to_fine = CoarseToFineSearch(search_path, search_input_list, stride=20, cache=cache, engine=engine)
+        search_feature_dictionary = coarse_to_fine.make_feature_dictionary(query_feature_dictionary)
+        matching_result = ImageSearch(query_feature_dictionary, search_feature_dictionary).get_match_result()
+    """
+
+    def __init__(self, search_path, search_input_list=None, stride=20, top_k=2, radius=None,
+                 batch_size=None, cache=None, engine=None, metric='l2'):
+        """
+        Initialize the CoarseToFineSearch class.
+
+        Args:
+        - search_path (str): Path to the search frames
+        - search_input_list (FrameManifest, list or str, optional): Sampled search frames (default: None)
+        - stride (int): Coarse stride in search frames (default: 20)
+        - top_k (int): Coarse candidates refined per query (default: 2)
+        - radius (int, optional): Full-rate frames embedded on each side of a coarse candidate (default: None, half the stride)
+        - batch_size (int, optional): Batch size of the embedding loader (default: None)
+        - cache (FeatureCache, optional): On-disk feature cache (default: None)
+        - engine (EmbeddingEngine, optional): Embedding engine (default: None)
+        - metric (str): 'l2' or 'cosine' (default: 'l2')
+        """
+        if stride < 1:
+            raise ValueError("Error: The coarse stride must be at least 1.")
+
+        self.search_path = search_path
+        self.search_input_list = search_input_list
+        self.stride = stride
+        self.top_k = top_k
+        self.radius = radius if radius is not None else stride // 2
+        self.batch_size = batch_size
+        self.cache = cache
+        self.engine = engine
+        self.metric = metric
+
+    def search_names(self):
+        """
+        Names of the search frames without '.jpg', in time order.
+
+        Returns:
+        - list: Frame names such as 'frame_0.5s'
+        """
+        if isinstance(self.search_input_list, FrameManifest):
+            return self.search_input_list.names()
+        if isinstance(self.search_input_list, (list, tuple)):
+            names = [name.strip() for name in self.search_input_list]
+        elif self.search_input_list:
+            with open(self.search_input_list, 'rb') as f:
+                names = [name.strip() for name in pickle.load(f)]
+        else:
+            names = [os.path.splitext(name)[0] for name in list_frames(self.search_path) if name.endswith('.jpg')]
+        order = np.argsort(frame_times(names), kind='stable')
+        return [names[i] for i in order]
+
+    def embed(self, names):
+        """
+        Feature dictionary of the given search frames.
+
+        Args:
+        - names (list): Frame names without '.jpg'
+
+        Returns:
+        - dict: Feature dictionary as built by LatentFeaturesDict.make_feature_dictionary()
+        """
+        features = LatentFeaturesDict(path=self.search_path, batch_size=self.batch_size, input_list=list(names),
+                                      cache=self.cache, engine=self.engine)
+        return features.make_feature_dictionary()
+
+    def refine_positions(self, query_features, coarse_features, num_frames):
+        """
+        Full-rate positions within radius of the top_k coarse candidates of every query.
+
+        Args:
+        - query_features (numpy.ndarray): (Q, D) query features
+        - coarse_features (numpy.ndarray): (C, D) features of every stride-th search frame
+        - num_frames (int): Number of full-rate search frames
+
+        Returns:
+        - numpy.ndarray: Sorted unique positions into the time-ordered search frames
+        """
+        _, candidates = MatrixSearch(coarse_features, metric=self.metric).search(query_features, k=self.top_k)
+        centers = np.unique(candidates) * self.stride
+        offsets = np.arange(-self.radius, self.radius + 1)
+        positions = (centers[:, None] + offsets[None, :]).ravel()
+        return np.unique(np.clip(positions, 0, num_frames - 1))
+
+    def make_feature_dictionary(self, query_feature_dictionary):
+        """
+        Search feature dictionary of the frames around the best coarse candidates of the queries, in time order.
+        Coarse frames are embedded once and reused in the refined dictionary.
+
+        Args:
+        - query_feature_dictionary (dict): Query feature dictionary
+
+        Returns:
+        - dict: Search feature dictionary with 'indexes', 'name', 'path' and 'features'
+        """
+        names = self.search_names()
+        coarse_positions = np.arange(0, len(names), self.stride)
+        coarse = self.embed([names[p] for p in coarse_positions])
+        if len(query_feature_dictionary['features']) == 0:
+            return coarse
+
+        positions = self.refine_positions(query_feature_dictionary['features'], coarse['features'], len(names))
+        # coarse 단계에서 이미 계산한 프레임은 다시 임베딩하지 않는다
+        is_coarse = positions % self.stride == 0
+        fine = self.embed([names[p] for p in positions[~is_coarse]])
+
+        features = np.zeros((len(positions), coarse['features'].shape[1]), dtype=np.float32)
+        features[is_coarse] = coarse['features'][positions[is_coarse] // self.stride]
+        features[~is_coarse] = fine['features']
+        paths = np.empty(len(positions), dtype=object)
+        paths[is_coarse] = coarse['path'][positions[is_coarse] // self.stride]
+        paths[~is_coarse] = fine['path']
+
+        embedded = len(coarse_positions) + int((~is_coarse).sum())
+        print(f'embedded {embedded} of {len(names)} search frames ({len(names) / max(embedded, 1):.1f}x fewer forward passes)')
+        return {
+            'indexes': list(range(len(positions))),
+            'name': [os.path.basename(path) for path in paths],
+            'path': paths,
+            'features': features,
+        }
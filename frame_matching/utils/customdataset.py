@@ -1,55 +1,92 @@
+import numpy as np
 from PIL import Image
 
+import torch
 from torch.utils.data.dataset import Dataset
 from torchvision import transforms
 
+from common.frame_pack import open_frame
+
 class CustomDataset(Dataset):
     """
     Custom Dataset class for image processing.
 
     Attributes:
-    - dataFrame (pandas.DataFrame): DataFrame containing image paths
-    - transformations (torchvision.transforms.Compose): Composed image transformations
+    - dataFrame (pandas.DataFrame): DataFrame containing image paths, which may be paths inside a FramePack
+    - image_size (int): Side of the square model input
+    - draft_size (tuple): Smallest (width, height) the JPEG decoder may scale down to, or None to decode at full size
+    - uint8 (bool): Return pre-resized uint8 tensors, normalized later on the model device
+    - transformations (torchvision.transforms.Compose): Composed image transformations of the float path
 
     Methods:
-    - __init__(dataFrame): Initializes the CustomDataset.
+    - __init__(dataFrame, image_size=380, draft_size=None, uint8=False): Initializes the CustomDataset.
+    - load_image(image_path): Decodes and resizes an image.
     - __getitem__(idx): Gets an item (image) from the dataset by index.
     - __len__(): Gets the length of the dataset.
     """
-    
-    def __init__(self, dataFrame):
+
+    def __init__(self, dataFrame, image_size=380, draft_size=None, uint8=False):
         """
         Initializes the CustomDataset.
 
         Parameters:
         - dataFrame (pandas.DataFrame): DataFrame containing image paths
+        - image_size (int): Side of the square model input (default: 380)
+        - draft_size (tuple, optional): Smallest (width, height) the JPEG decoder may scale down to (default: None)
+        - uint8 (bool): Return uint8 (3, H, W) tensors instead of normalized float tensors (default: False)
         """
         self.dataFrame = dataFrame
+        self.image_size = image_size
+        self.draft_size = draft_size
+        self.uint8 = uint8
         self.transformations = transforms.Compose([
-            transforms.Resize((380, 380)),
+            transforms.Resize((image_size, image_size)),
             transforms.ToTensor(),
             transforms.Normalize((0.485, 0.456, 0.406), (0.229, 0.224, 0.225))
         ])
 
+    def load_image(self, image_path):
+        """
+        Decode an image, letting the JPEG decoder scale it down by 1/2, 1/4 or 1/8 while it stays at least draft_size,
+        and resize it to the model input.
+
+        Args:
+        - image_path (str): Path to the image file, or to a frame inside a FramePack
+
+        Returns:
+        - PIL.Image.Image: (image_size, image_size) RGB image
+        """
+        with open_frame(image_path) as f, Image.open(f) as image:
+            if self.draft_size is not None:
+                # JPEG는 DCT 단계에서 축소해서 디코딩하므로 전체 해상도를 풀지 않아도 된다
+                image.draft('RGB', self.draft_size)
+            image = image.convert('RGB')
+        return image.resize((self.image_size, self.image_size), Image.BILINEAR)
+
     def __getitem__(self, idx):
         """
         Get an item (image) from the dataset by index.
-        
+
         Args:
         - idx (int): Index of the item
-        
+
         Returns:
-        - torch.Tensor: Transformed image tensor
+        - torch.Tensor: Transformed image tensor, or a uint8 (3, H, W) tensor with uint8=True
         """
         image_path = self.dataFrame['image'][idx]
-        image = Image.open(image_path)
-        image = self.transformations(image)
-        return image
+        if not self.uint8:
+            with open_frame(image_path) as f, Image.open(f) as image:
+                if self.draft_size is not None:
+                    image.draft('RGB', self.draft_size)
+                return self.transformations(image)
+
+        image = self.load_image(image_path)
+        return torch.from_numpy(np.asarray(image).copy()).permute(2, 0, 1)
 
     def __len__(self):
         """
         Get the length of the dataset.
-        
+
         Returns:
         - int: Length of the dataset
         """
@@ -0,0 +1,181 @@
+import time
+import numpy as np
+
+import torch
+from efficientnet_pytorch import EfficientNet
+
+from utils.matrix_search import MatrixSearch
+from common.model_registry import registry
+from common.torch_device import select_device, set_threads
+
+class EmbeddingEngine:
+    """
+    A CPU-first EfficientNet-b4 embedding engine.
+    Runs extract_features under inference mode in channels-last layout, optionally in reduced precision,
+    and average-pools the feature map to a 1792-d vector.
+
+    Parameters:
+        - device (str, optional): 'cpu', 'cuda' or 'cuda:N'. Default is None (CUDA if available, otherwise cpu).
+        - precision (str): 'fp32', 'bf16' (CPU or CUDA autocast) or 'fp16' (CUDA only). Default is 'fp32'.
+        - channels_last (bool): Run the convolutions in channels-last layout. Default is True.
+        - num_threads (int, optional): Number of intra-op CPU threads. Default is None (torch default).
+        - num_interop_threads (int, optional): Number of inter-op CPU threads. Default is None (torch default).
+
+    Methods:
+        - set_threads(): Apply the configured CPU thread counts to torch.
+        - load_model(): Load EfficientNet-b4 on the device.
+        - normalize(images): Normalize a uint8 image batch on the device.
+        - embed(images): 1792-d features of a batch of image tensors.
+        - embed_loader(dataloader): Features of every batch of a data loader.
+        - benchmark(query_loader, search_loader, precisions): Images/s of every precision and retrieval drift against fp32.
+
+    Example:
+        engine = EmbeddingEngine(device='cpu', precision='bf16', num_threads=8)
+        features = engine.embed_loader(dataloader)
+    """
+
+    PRECISIONS = {'fp32': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+    MEAN = (0.485, 0.456, 0.406)
+    STD = (0.229, 0.224, 0.225)
+
+    def __init__(self, device=None, precision='fp32', channels_last=True, num_threads=None, num_interop_threads=None):
+        """
+        Initialize the EmbeddingEngine class.
+
+        Args:
+        - device (str, optional): Embedding device (default: None, automatic)
+        - precision (str): 'fp32', 'bf16' or 'fp16' (default: 'fp32')
+        - channels_last (bool): Run the convolutions in channels-last layout (default: True)
+        - num_threads (int, optional): Number of intra-op CPU threads (default: None)
+        - num_interop_threads (int, optional): Number of inter-op CPU threads (default: None)
+        """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Error: Unknown precision '{precision}'.")
+
+        self.device = torch.device(select_device(device))
+        if precision == 'fp16' and self.device.type == 'cpu':
+            raise ValueError("Error: fp16 is only supported on CUDA, use bf16 on the CPU.")
+
+        self.precision = precision
+        self.channels_last = channels_last
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+
+        self.mean = torch.tensor(self.MEAN, device=self.device).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor(self.STD, device=self.device).view(1, 3, 1, 1) * 255
+
+        self.set_threads()
+        self.model = registry.get(('efficientnet-b4', str(self.device), channels_last), self.load_model)
+
+    def set_threads(self):
+        """
+        Apply the configured CPU thread counts to torch.
+        """
+        set_threads(self.num_threads, self.num_interop_threads)
+
+    def load_model(self):
+        """
+        Load EfficientNet-b4 in eval mode on the device. Called once per process through the model registry.
+
+        Returns:
+        - EfficientNet: Loaded model
+        """
+        model = EfficientNet.from_pretrained('efficientnet-b4').eval().to(self.device)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        return model
+
+    def normalize(self, images):
+        """
+        Normalize a uint8 image batch on the device, the same as ToTensor() followed by ImageNet Normalize().
+
+        Args:
+        - images (torch.Tensor): (B, 3, H, W) uint8 batch on the device
+
+        Returns:
+        - torch.Tensor: (B, 3, H, W) float32 normalized batch
+        """
+        return (images.float() - self.mean) / self.std
+
+    def embed(self, images, precision=None):
+        """
+        1792-d features of a batch of image tensors.
+
+        Args:
+        - images (torch.Tensor): (B, 3, H, W) normalized float batch, or uint8 batch normalized on the device
+        - precision (str, optional): Precision to run instead of the configured one (default: None)
+
+        Returns:
+        - numpy.ndarray: (B, 1792) float32 features
+        """
+        dtype = self.PRECISIONS[precision or self.precision]
+        images = images.to(self.device, non_blocking=True)
+        if images.dtype == torch.uint8:
+            images = self.normalize(images)
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
+
+        with torch.inference_mode(), torch.autocast(self.device.type, dtype=dtype, enabled=dtype is not None):
+            features = self.model.extract_features(images)
+            # 매 배치 AdaptiveAvgPool2d를 새로 만들지 않고 공간 평균으로 pooling한다
+            features = features.mean(dim=(2, 3))
+        return features.float().cpu().numpy()
+
+    def embed_loader(self, dataloader, precision=None):
+        """
+        Features of every batch of a data loader, in order.
+
+        Args:
+        - dataloader (torch.utils.data.DataLoader): Loader of normalized image batches
+        - precision (str, optional): Precision to run instead of the configured one (default: None)
+
+        Returns:
+        - numpy.ndarray: (N, 1792) float32 features
+        """
+        batches = [self.embed(images, precision) for images in dataloader]
+        return np.concatenate(batches) if batches else np.zeros((0, 1792), dtype=np.float32)
+
+    def benchmark(self, query_loader, search_loader, precisions=('fp32', 'bf16')):
+        """
+        Images/s of every precision and the drift of its retrieval results against the fp32 baseline:
+        the share of queries whose nearest search frame changes, and the cosine similarity of the features.
+
+        Args:
+        - query_loader (torch.utils.data.DataLoader): Loader of the query images
+        - search_loader (torch.utils.data.DataLoader): Loader of the search images
+        - precisions (tuple): Precisions to compare. fp32 is always run as the baseline (default: ('fp32', 'bf16'))
+
+        Returns:
+        - list: One dict per precision with 'precision', 'images_per_sec', 'top1_agreement' and 'min_cosine'
+        """
+        precisions = ['fp32'] + [p for p in precisions if p != 'fp32']
+        # 첫 배치로 warm-up 한다
+        self.embed(next(iter(query_loader)))
+
+        report = []
+        baseline = None
+        for precision in precisions:
+            start = time.perf_counter()
+            query_features = self.embed_loader(query_loader, precision)
+            search_features = self.embed_loader(search_loader, precision)
+            elapsed = time.perf_counter() - start
+
+            _, matches = MatrixSearch(search_features).search(query_features, k=1)
+            features = np.concatenate([query_features, search_features])
+            if baseline is None:
+                baseline = (features, matches)
+            base_features, base_matches = baseline
+            cosine = np.einsum('ij,ij->i', features, base_features) / np.maximum(
+                np.linalg.norm(features, axis=1) * np.linalg.norm(base_features, axis=1), 1e-12)
+
+            report.append({
+                'precision': precision,
+                'images_per_sec': len(features) / elapsed,
+                'top1_agreement': float(np.mean(matches[:, 0] == base_matches[:, 0])),
+                'min_cosine': float(cosine.min()),
+            })
+
+        for row in report:
+            print(f"{row['precision']} on {self.device}: {row['images_per_sec']:.1f} images/s, "
+                  f"top-1 agreement {row['top1_agreement']:.3f}, min cosine {row['min_cosine']:.5f}")
+        return report
@@ -0,0 +1,215 @@
+import os
+import heapq
+import pickle
+import hashlib
+import numpy as np
+
+from common.frame_pack import open_frame
+
+class FeatureCache:
+    """
+    A content-addressed on-disk cache of image features.
+    Features are keyed by the hash of the image file content plus a model/transform version string,
+    stored in a memory-mapped array with a pickled index, and evicted least-recently-used beyond max_bytes.
+
+    Parameters:
+        - cache_dir (str): Directory holding features.dat and index.pkl.
+        - version (str): Model and transform version. Features of another version never match.
+        - dim (int): Feature dimension. Default is 1792 (EfficientNet-b4).
+        - max_bytes (int, optional): Maximum size of the feature array. Default is None (no eviction).
+        - dtype (numpy.dtype): Stored dtype. Default is numpy.float32.
+
+    Methods:
+        - key(image_path): Cache key of an image.
+        - lookup(keys): Cached features of the given keys.
+        - store(keys, features): Stores features under the given keys.
+        - stats(): Hit and miss counters.
+        - save(): Writes the index file and flushes the features.
+
+    Example:
+        cache = FeatureCache('dataset/feature_cache', version='efficientnet-b4|avgpool|380', max_bytes=8 * 1024**3)
+        keys = [cache.key(path) for path in image_paths]
+        features, hits = cache.lookup(keys)
+        cache.store([k for k, hit in zip(keys, hits) if not hit], new_features)
+        cache.save()
+    """
+
+    def __init__(self, cache_dir, version, dim=1792, max_bytes=None, dtype=np.float32):
+        """
+        Initialize the FeatureCache class.
+
+        Args:
+        - cache_dir (str): Directory holding features.dat and index.pkl
+        - version (str): Model and transform version
+        - dim (int): Feature dimension (default: 1792)
+        - max_bytes (int, optional): Maximum size of the feature array (default: None)
+        - dtype (numpy.dtype): Stored dtype (default: numpy.float32)
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self.max_rows = None if max_bytes is None else max(1, max_bytes // self.row_bytes)
+        self.data_path = os.path.join(cache_dir, 'features.dat')
+        self.index_path = os.path.join(cache_dir, 'index.pkl')
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.rows = {}
+        self.last_used = {}
+        self.free_rows = []
+        self.capacity = 0
+        self.clock = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                index = pickle.load(f)
+            if index['dim'] == dim and index['dtype'] == self.dtype.str:
+                self.rows = index['rows']
+                self.last_used = index['last_used']
+                self.free_rows = index['free_rows']
+                self.capacity = index['capacity']
+                self.clock = index['clock']
+        self.data = None
+        self._resize(self.capacity)
+
+    def _resize(self, capacity):
+        """
+        Grow the feature file and re-map it with the given number of rows.
+        """
+        with open(self.data_path, 'ab') as f:
+            if f.tell() < capacity * self.row_bytes:
+                f.truncate(capacity * self.row_bytes)
+        self.capacity = capacity
+        self.data = None
+        if capacity:
+            self.data = np.memmap(self.data_path, dtype=self.dtype, mode='r+', shape=(capacity, self.dim))
+
+    def key(self, image_path):
+        """
+        Cache key of an image: hash of the file content and the version string.
+
+        Args:
+        - image_path (str): Path to the image file, or to a frame inside a FramePack
+
+        Returns:
+        - str: Hex digest
+        """
+        digest = hashlib.sha1(self.version.encode())
+        with open_frame(image_path) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, keys):
+        """
+        Cached features of the given keys.
+
+        Args:
+        - keys (list): Cache keys
+
+        Returns:
+        - numpy.ndarray: (len(keys), dim) features, zero where missing
+        - numpy.ndarray: Boolean hit mask
+        """
+        features = np.zeros((len(keys), self.dim), dtype=self.dtype)
+        hits = np.array([k in self.rows for k in keys], dtype=bool)
+        if hits.any():
+            rows = np.array([self.rows[k] for k, hit in zip(keys, hits) if hit])
+            features[hits] = self.data[rows]
+            for k, hit in zip(keys, hits):
+                if hit:
+                    self.clock += 1
+                    self.last_used[k] = self.clock
+        self.hits += int(hits.sum())
+        self.misses += int((~hits).sum())
+        return features, hits
+
+    def _allocate(self, count):
+        """
+        Reserve count free rows, growing the file up to max_rows and evicting the least recently used entries beyond it.
+        Evictions are written to the index before their rows are handed out, so a crash before save() never leaves
+        the index on disk pointing an old key at another image's features.
+        """
+        if self.max_rows is not None:
+            count = min(count, self.max_rows)
+        missing = count - len(self.free_rows)
+        if missing > 0:
+            new_capacity = max(self.capacity * 2, self.capacity + missing)
+            if self.max_rows is not None:
+                new_capacity = min(new_capacity, self.max_rows)
+            if new_capacity > self.capacity:
+                self.free_rows += list(range(self.capacity, new_capacity))
+                self._resize(new_capacity)
+        missing = count - len(self.free_rows)
+        if missing > 0:
+            for k, _ in heapq.nsmallest(missing, self.last_used.items(), key=lambda item: item[1]):
+                self.free_rows.append(self.rows.pop(k))
+                del self.last_used[k]
+            # 재사용할 행을 덮어쓰기 전에 제거된 key가 빠진 index를 먼저 저장한다
+            self._write_index()
+        return [self.free_rows.pop() for _ in range(count)]
+
+    def store(self, keys, features):
+        """
+        Store features under the given keys. With max_bytes, only the last entries that fit are kept.
+
+        Args:
+        - keys (list): Cache keys
+        - features (numpy.ndarray): (len(keys), dim) features
+        """
+        new = {}
+        for k, feature in zip(keys, features):
+            if k not in self.rows:
+                new[k] = feature
+        if not new:
+            return
+
+        rows = self._allocate(len(new))
+        items = list(new.items())[-len(rows):]
+        for row, (k, _) in zip(rows, items):
+            self.rows[k] = row
+            self.clock += 1
+            self.last_used[k] = self.clock
+        self.data[rows] = np.array([feature for _, feature in items], dtype=self.dtype)
+
+    def stats(self):
+        """
+        Hit and miss counters since the cache was opened.
+
+        Returns:
+        - dict: hits, misses, hit rate and number of cached entries
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.rows),
+        }
+
+    def save(self):
+        """
+        Write the index file and flush the features to disk.
+        """
+        if self.data is not None:
+            self.data.flush()
+        self._write_index()
+
+    def _write_index(self):
+        """
+        Atomically replace the index file with the current index.
+        """
+        index = {
+            'dim': self.dim,
+            'dtype': self.dtype.str,
+            'rows': self.rows,
+            'last_used': self.last_used,
+            'free_rows': self.free_rows,
+            'capacity': self.capacity,
+            'clock': self.clock,
+        }
+        with open(self.index_path + '.tmp', 'wb') as f:
+            pickle.dump(index, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
@@ -0,0 +1,304 @@
+import time
+import numpy as np
+
+from utils.ann_index import kmeans
+from utils.matrix_search import MatrixSearch
+
+class FeatureCompressor:
+    """
+    A feature compression stage: optional PCA projection, then float16/float32 storage or scalar/product quantization.
+    Search frames are stored as compact codes, and queries stay uncompressed (asymmetric distance).
+
+    Parameters:
+        - dtype (str): 'float32' or 'float16' storage when quantization is None. Default is 'float32'.
+        - pca_dim (int, optional): Dimension of the fitted PCA projection. Default is None (no projection).
+        - quantization (str, optional): None, 'scalar' (one uint8 per dimension) or 'product' (one uint8 per subvector). Default is None.
+        - pq_subvectors (int): Number of product quantization subvectors. Must divide the (projected) dimension. Default is 32.
+        - max_train_points (int): Rows sampled to fit PCA and the quantizers. Default is 65536.
+        - seed (int): Random seed. Default is 0.
+
+    Methods:
+        - fit(features): Fits the projection and the quantizer.
+        - project(features): Applies the PCA projection.
+        - encode(features): Compresses features to codes.
+        - decode(codes): Approximate float32 features of codes.
+        - code_bytes(): Bytes per frame of the codes.
+        - compress_dictionary(feature_dict): Replaces the features of a feature dictionary by their codes.
+
+    Example:
+        compressor = FeatureCompressor(pca_dim=256, quantization='scalar')
+        compressor.fit(search_feature_dictionary['features'])
+        search_feature_dictionary = compressor.compress_dictionary(search_feature_dictionary)
+        results = ImageSearch(query_feature_dictionary, search_feature_dictionary, compressor=compressor).get_match_result()
+    """
+
+    DTYPES = ('float32', 'float16')
+    QUANTIZATIONS = (None, 'scalar', 'product')
+
+    def __init__(self, dtype='float32', pca_dim=None, quantization=None, pq_subvectors=32, max_train_points=65536, seed=0):
+        """
+        Initialize the FeatureCompressor class.
+
+        Args:
+        - dtype (str): 'float32' or 'float16' (default: 'float32')
+        - pca_dim (int, optional): Dimension of the PCA projection (default: None)
+        - quantization (str, optional): None, 'scalar' or 'product' (default: None)
+        - pq_subvectors (int): Number of product quantization subvectors (default: 32)
+        - max_train_points (int): Rows sampled for fitting (default: 65536)
+        - seed (int): Random seed (default: 0)
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Error: Unknown storage dtype '{dtype}'.")
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Error: Unknown quantization '{quantization}'.")
+
+        self.dtype = dtype
+        self.pca_dim = pca_dim
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.max_train_points = max_train_points
+        self.seed = seed
+        self.mean = None
+        self.components = None
+        self.sq_min = None
+        self.sq_scale = None
+        self.codebooks = None
+        self.dim = None
+
+    def __repr__(self):
+        parts = [self.dtype if self.quantization is None else self.quantization]
+        if self.pca_dim:
+            parts.append(f'pca{self.pca_dim}')
+        if self.quantization == 'product':
+            parts.append(f'm{self.pq_subvectors}')
+        return '-'.join(parts)
+
+    def fit(self, features):
+        """
+        Fit the PCA projection and the quantizer on a sample of the features.
+
+        Args:
+        - features (numpy.ndarray): (N, D) features
+
+        Returns:
+        - FeatureCompressor: self
+        """
+        features = np.asarray(features, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if len(features) > self.max_train_points:
+            features = features[rng.choice(len(features), self.max_train_points, replace=False)]
+
+        if self.pca_dim:
+            self.mean = features.mean(axis=0)
+            _, _, vt = np.linalg.svd(features - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:self.pca_dim])
+        projected = self.project(features)
+        self.dim = projected.shape[1]
+
+        if self.quantization == 'scalar':
+            self.sq_min = projected.min(axis=0)
+            self.sq_scale = np.maximum(projected.max(axis=0) - self.sq_min, 1e-12) / 255
+        elif self.quantization == 'product':
+            if self.dim % self.pq_subvectors:
+                raise ValueError(f"Error: {self.pq_subvectors} subvectors do not divide dimension {self.dim}.")
+            # 서브벡터마다 256개 중심을 학습해 uint8 하나로 표현한다
+            subvectors = projected.reshape(len(projected), self.pq_subvectors, -1)
+            self.codebooks = np.stack([
+                kmeans(np.ascontiguousarray(subvectors[:, m]), 256, seed=self.seed)[0]
+                for m in range(self.pq_subvectors)
+            ])
+        return self
+
+    def project(self, features):
+        """
+        Apply the PCA projection.
+
+        Args:
+        - features (numpy.ndarray): (N, D) features
+
+        Returns:
+        - numpy.ndarray: (N, pca_dim) float32 features, or the features unchanged without PCA
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if self.components is None:
+            return features
+        return (features - self.mean) @ self.components.T
+
+    def encode(self, features):
+        """
+        Compress features to codes.
+
+        Args:
+        - features (numpy.ndarray): (N, D) features
+
+        Returns:
+        - numpy.ndarray: (N, dim) float16/float32 or uint8 codes, or (N, pq_subvectors) uint8 product codes
+        """
+        if self.dim is None:
+            raise ValueError("Error: Fit the compressor before encoding features.")
+
+        projected = self.project(features)
+        if self.quantization == 'scalar':
+            return np.clip(np.rint((projected - self.sq_min) / self.sq_scale), 0, 255).astype(np.uint8)
+        if self.quantization == 'product':
+            subvectors = projected.reshape(len(projected), self.pq_subvectors, -1)
+            codes = np.empty((len(projected), self.pq_subvectors), dtype=np.uint8)
+            for m in range(self.pq_subvectors):
+                _, nearest = MatrixSearch(self.codebooks[m]).search(subvectors[:, m], k=1)
+                codes[:, m] = nearest[:, 0]
+            return codes
+        return projected.astype(self.dtype)
+
+    def decode(self, codes):
+        """
+        Approximate float32 features of codes, in the projected space.
+
+        Args:
+        - codes (numpy.ndarray): Codes returned by encode()
+
+        Returns:
+        - numpy.ndarray: (N, dim) float32 features
+        """
+        if self.quantization == 'scalar':
+            return self.sq_min + codes.astype(np.float32) * self.sq_scale
+        if self.quantization == 'product':
+            return self.codebooks[np.arange(self.pq_subvectors), codes].reshape(len(codes), -1)
+        return codes.astype(np.float32)
+
+    def code_bytes(self):
+        """
+        Bytes per frame of the codes.
+
+        Returns:
+        - int: Code size of one frame
+        """
+        if self.quantization == 'product':
+            return self.pq_subvectors
+        if self.quantization == 'scalar':
+            return self.dim
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    def compress_dictionary(self, feature_dict):
+        """
+        Replace the features of a feature dictionary by their codes.
+
+        Args:
+        - feature_dict (dict): Dictionary built by LatentFeaturesDict.make_feature_dictionary()
+
+        Returns:
+        - dict: Copy of the dictionary with 'codes' instead of 'features'
+        """
+        compressed = {key: value for key, value in feature_dict.items() if key != 'features'}
+        compressed['codes'] = self.encode(feature_dict['features'])
+        return compressed
+
+class CompressedSearch(MatrixSearch):
+    """
+    Blocked l2 nearest neighbour search over compressed codes, with the same interface as MatrixSearch.
+    Queries are projected but not quantized. Float and scalar codes are decoded one block at a time,
+    and product codes are scored with per-query lookup tables.
+
+    Parameters:
+        - compressor (FeatureCompressor): Fitted compressor that produced the codes.
+        - codes (numpy.ndarray): Codes of the search frames.
+        - block_size (int): Number of query and search rows per block. Default is 2048.
+
+    Example:
+        engine = CompressedSearch(compressor, search_feature_dictionary['codes'])
+        distances, indices = engine.search(query_features, k=5)
+    """
+
+    def __init__(self, compressor, codes, block_size=2048):
+        """
+        Initialize the CompressedSearch class.
+
+        Args:
+        - compressor (FeatureCompressor): Fitted compressor that produced the codes
+        - codes (numpy.ndarray): Codes of the search frames
+        - block_size (int): Number of query and search rows per block (default: 2048)
+        """
+        self.compressor = compressor
+        self.metric = 'l2'
+        self.block_size = block_size
+        self.dtype = np.float32
+        self.search_features = codes
+
+    def prepare(self, features):
+        """
+        Project queries into the code space.
+
+        Args:
+        - features (numpy.ndarray): (N, D) query features
+
+        Returns:
+        - numpy.ndarray: (N, dim) float32 projected queries
+        """
+        return np.ascontiguousarray(self.compressor.project(features), dtype=np.float32)
+
+    def block_distances(self, queries, query_sq_norms, start, stop):
+        """
+        Squared l2 distances between a projected query block and the codes [start, stop).
+
+        Args:
+        - queries (numpy.ndarray): Projected (q, dim) query block
+        - query_sq_norms (numpy.ndarray): Squared norms of the query block
+        - start (int): First search row
+        - stop (int): One past the last search row
+
+        Returns:
+        - numpy.ndarray: (q, stop - start) squared distances
+        """
+        codes = self.search_features[start:stop]
+        if self.compressor.quantization == 'product':
+            codebooks = self.compressor.codebooks
+            subqueries = queries.reshape(len(queries), codebooks.shape[0], -1)
+            # (q, M, 256) 룩업 테이블에서 코드별 거리를 더한다
+            tables = (np.einsum('qmd,qmd->qm', subqueries, subqueries)[:, :, None]
+                      - 2 * np.einsum('qmd,mkd->qmk', subqueries, codebooks)
+                      + np.einsum('mkd,mkd->mk', codebooks, codebooks)[None])
+            distances = np.zeros((len(queries), len(codes)), dtype=np.float32)
+            for m in range(codebooks.shape[0]):
+                distances += tables[:, m, codes[:, m]]
+            return distances
+
+        decoded = self.compressor.decode(codes)
+        decoded_sq_norms = np.einsum('ij,ij->i', decoded, decoded)
+        distances = query_sq_norms[:, None] - 2 * (queries @ decoded.T) + decoded_sq_norms[None, :]
+        return np.maximum(distances, 0, out=distances)
+
+def compression_report(query_features, search_features, compressors):
+    """
+    Memory per frame and top-1 match agreement of compressed search against uncompressed float32 search.
+
+    Args:
+    - query_features (numpy.ndarray): (Q, D) query features
+    - search_features (numpy.ndarray): (S, D) search features
+    - compressors (list): FeatureCompressor instances to evaluate. They are fitted on search_features.
+
+    Returns:
+    - list: One dict per setting with 'setting', 'bytes_per_frame', 'top1_agreement' and 'search_sec'
+    """
+    start = time.perf_counter()
+    _, baseline = MatrixSearch(search_features).search(query_features, k=1)
+    report = [{
+        'setting': 'float32',
+        'bytes_per_frame': search_features.shape[1] * 4,
+        'top1_agreement': 1.0,
+        'search_sec': time.perf_counter() - start,
+    }]
+
+    for compressor in compressors:
+        codes = compressor.fit(search_features).encode(search_features)
+        start = time.perf_counter()
+        _, matches = CompressedSearch(compressor, codes).search(query_features, k=1)
+        report.append({
+            'setting': repr(compressor),
+            'bytes_per_frame': compressor.code_bytes(),
+            'top1_agreement': float(np.mean(matches[:, 0] == baseline[:, 0])),
+            'search_sec': time.perf_counter() - start,
+        })
+
+    for row in report:
+        print(f"{row['setting']}: {row['bytes_per_frame']} bytes/frame, "
+              f"top-1 agreement {row['top1_agreement']:.3f}, search {row['search_sec']:.2f}s")
+    return report
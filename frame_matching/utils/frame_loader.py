@@ -0,0 +1,119 @@
+import os
+import time
+
+import numpy as np
+import psutil
+import torch
+from torch.utils.data import DataLoader
+
+from utils.customdataset import CustomDataset
+from utils.matrix_search import MatrixSearch
+
+# EfficientNet-b4, 380x380 입력을 inference mode로 돌릴 때 이미지 한 장이 차지하는 activation 메모리의 여유 있는 추정치
+BYTES_PER_IMAGE = 64 * 1024**2
+
+def adaptive_batch_size(device, max_batch_size=64, memory_fraction=0.5, bytes_per_image=BYTES_PER_IMAGE):
+    """
+    Largest batch size whose activations fit in a fraction of the free memory of the device.
+
+    Args:
+    - device (torch.device): Embedding device
+    - max_batch_size (int): Upper bound of the batch size (default: 64)
+    - memory_fraction (float): Fraction of the free memory the batch may use (default: 0.5)
+    - bytes_per_image (int): Estimated activation memory per image (default: BYTES_PER_IMAGE)
+
+    Returns:
+    - int: Batch size between 1 and max_batch_size
+    """
+    if device.type == 'cuda':
+        free, _ = torch.cuda.mem_get_info(device)
+    else:
+        free = psutil.virtual_memory().available
+    return int(max(1, min(max_batch_size, free * memory_fraction // bytes_per_image)))
+
+def draft_size_for(image_size, draft):
+    """
+    Smallest (width, height) the JPEG decoder may scale down to for a model input side.
+
+    Args:
+    - image_size (int): Side of the square model input
+    - draft (bool): Whether reduced-size JPEG decoding is enabled
+
+    Returns:
+    - tuple: (width, height) at 3/4 of image_size, or None to decode at full size
+    """
+    # 720 높이는 380의 두 배가 안 되므로 (image_size, image_size)로는 축소되지 않는다. 3/4까지 허용하고 resize로 맞춘다
+    return (image_size * 3 // 4, image_size * 3 // 4) if draft else None
+
+def make_frame_loader(df, device, batch_size=None, num_workers=None, prefetch_factor=4, image_size=380, draft=False):
+    """
+    Data loader of pre-resized uint8 frames, decoded in worker processes
+    and pinned for asynchronous copies when the model runs on CUDA. Normalization happens on the model device.
+
+    Args:
+    - df (pandas.DataFrame): DataFrame with an 'image' column of image paths
+    - device (torch.device): Embedding device
+    - batch_size (int, optional): Batch size (default: None, adaptive_batch_size(device))
+    - num_workers (int, optional): Decoding worker processes (default: None, up to 8 CPUs)
+    - prefetch_factor (int): Batches prefetched per worker (default: 4)
+    - image_size (int): Side of the square model input (default: 380)
+    - draft (bool): Let the JPEG decoder scale frames down by 1/2, 1/4 or 1/8 while both sides stay at least 3/4 of image_size,
+      before the resize to image_size. 1280x720 frames decode at 640x360. Lossy, so it changes the features:
+      check draft_report() on the footage before enabling it (default: False, full decode)
+
+    Returns:
+    - torch.utils.data.DataLoader: Loader of (B, 3, image_size, image_size) uint8 batches
+    """
+    if batch_size is None:
+        batch_size = adaptive_batch_size(device)
+    if num_workers is None:
+        num_workers = min(8, os.cpu_count() or 1)
+
+    dataset = CustomDataset(dataFrame=df, image_size=image_size, draft_size=draft_size_for(image_size, draft), uint8=True)
+    return DataLoader(
+        dataset = dataset,
+        batch_size = batch_size,
+        shuffle = False,
+        num_workers = num_workers,
+        pin_memory = device.type == 'cuda',
+        prefetch_factor = prefetch_factor if num_workers else None,
+    )
+
+def draft_report(query_df, search_df, engine, image_size=380, batch_size=None):
+    """
+    Images/s of full and draft decoding, and the drift of the draft features and matches against full decoding:
+    the share of queries whose nearest search frame is unchanged, and the cosine similarity of the features.
+
+    Args:
+    - query_df (pandas.DataFrame): DataFrame with an 'image' column of the query image paths
+    - search_df (pandas.DataFrame): DataFrame with an 'image' column of the search image paths
+    - engine (EmbeddingEngine): Embedding engine
+    - image_size (int): Side of the square model input (default: 380)
+    - batch_size (int, optional): Batch size (default: None, adaptive_batch_size(device))
+
+    Returns:
+    - dict: 'full_images_per_sec', 'draft_images_per_sec', 'top1_agreement', 'mean_cosine' and 'min_cosine'
+    """
+    results = {}
+    for draft in (False, True):
+        start = time.perf_counter()
+        query_features, search_features = (
+            engine.embed_loader(make_frame_loader(df, engine.device, batch_size=batch_size, image_size=image_size, draft=draft))
+            for df in (query_df, search_df))
+        elapsed = time.perf_counter() - start
+        _, matches = MatrixSearch(search_features).search(query_features, k=1)
+        results[draft] = (np.concatenate([query_features, search_features]), matches, elapsed)
+
+    (full, full_matches, full_sec), (drafted, draft_matches, draft_sec) = results[False], results[True]
+    cosine = np.einsum('ij,ij->i', full, drafted) / np.maximum(
+        np.linalg.norm(full, axis=1) * np.linalg.norm(drafted, axis=1), 1e-12)
+    report = {
+        'full_images_per_sec': len(full) / full_sec,
+        'draft_images_per_sec': len(full) / draft_sec,
+        'top1_agreement': float(np.mean(full_matches[:, 0] == draft_matches[:, 0])),
+        'mean_cosine': float(cosine.mean()),
+        'min_cosine': float(cosine.min()),
+    }
+    print(f"full decode {report['full_images_per_sec']:.1f} images/s, draft decode {report['draft_images_per_sec']:.1f} images/s, "
+          f"top-1 agreement {report['top1_agreement']:.3f}, cosine mean {report['mean_cosine']:.5f} min {report['min_cosine']:.5f}")
+    return report
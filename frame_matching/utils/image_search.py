@@ -1,5 +1,27 @@
+import re
 import numpy as np
 
+from utils.matrix_search import MatrixSearch
+from utils.feature_compression import CompressedSearch
+
+def frame_times(names):
+    """
+    Timestamps of frames named like 'frame_0.5s.jpg'.
+
+    Args:
+    - names (list): Frame names
+
+    Returns:
+    - numpy.ndarray: Timestamp of every frame in seconds, or the position in the list when a name has no timestamp
+    """
+    times = []
+    for name in names:
+        match = re.search(r'frame_([0-9.]+)s', str(name))
+        if match is None:
+            return np.arange(len(names), dtype=np.float64)
+        times.append(float(match.group(1)))
+    return np.array(times, dtype=np.float64)
+
 class ImageSearch:
     """
     A class for performing image search based on query and search features.
@@ -7,11 +29,23 @@ class ImageSearch:
     Parameters:
         - query_index_dict (dict): Dictionary containing query features.
         - search_index_dict (dict): Dictionary containing search features.
+        - metric (str): 'l2' or 'cosine'. Default is 'l2'.
+        - block_size (int): Rows per block of the batched search. Default is 2048.
+        - mode (str): 'nearest' matches every query independently against the whole search video,
+                      'align' matches the time-ordered queries monotonically within a band around their expected position. Default is 'nearest'.
+        - window (int, optional): Search frames on each side of the expected position in 'align' mode. Default is None (5% of the search frames, at least 25).
+        - n_anchors (int): Queries searched against the whole video to estimate the expected positions in 'align' mode. Default is 8.
+        - compressor (FeatureCompressor, optional): Fitted compressor. The search frames are then searched as compressed codes
+                                                    (the dictionary's 'codes', or its encoded 'features'). Requires metric='l2'. Default is None.
 
     Methods:
         - __init__(query_index_dict, search_index_dict): Initializes the ImageSearch class.
         - euclidean(a, b): Calculates the Euclidean distance between two vectors.
         - perform_search(queryFeatures, search_index_dict, maxResults): Performs search based on query features and search index.
+        - make_engine(order): Search engine over the (reordered) search frames.
+        - search(k): Finds the k nearest search frames of every query with blocked matrix products.
+        - expected_positions(engine, queries, query_times): Expected search position of every time-ordered query.
+        - align(): Monotonic banded alignment of the query sequence to the search sequence.
         - get_match_result(): Gets matching results based on query and search features.
 
     Example:
@@ -20,16 +54,37 @@ class ImageSearch:
         results = searcher.get_match_result()
     """
     
-    def __init__(self, query_index_dict, search_index_dict):
+    MODES = ('nearest', 'align')
+    
+    def __init__(self, query_index_dict, search_index_dict, metric='l2', block_size=2048, mode='nearest', window=None, n_anchors=8,
+                 compressor=None):
         """
         Initialize the ImageSearch class.
         
         Args:
         - query_index_dict (dict): Dictionary containing query features
         - search_index_dict (dict): Dictionary containing search features
+        - metric (str): 'l2' or 'cosine' (default: 'l2')
+        - block_size (int): Rows per block of the batched search (default: 2048)
+        - mode (str): 'nearest' or 'align' (default: 'nearest')
+        - window (int, optional): Search frames on each side of the expected position in 'align' mode (default: None)
+        - n_anchors (int): Queries used to estimate the expected positions in 'align' mode (default: 8)
+        - compressor (FeatureCompressor, optional): Fitted compressor of the search frames (default: None)
         """
+        if mode not in self.MODES:
+            raise ValueError(f"Error: Unknown search mode '{mode}'.")
+        if compressor is not None and metric != 'l2':
+            # CompressedSearch는 l2 거리만 계산하므로 align의 비용이 metric과 맞지 않게 된다
+            raise ValueError(f"Error: Compressed search only supports the l2 metric, not '{metric}'.")
+        
+        self.mode = mode
+        self.window = window
+        self.n_anchors = n_anchors
         self.query_index_dict = query_index_dict
-        self.search_index_dict = search_index_dict   
+        self.search_index_dict = search_index_dict
+        self.metric = metric
+        self.block_size = block_size
+        self.compressor = compressor
 
     def euclidean(self, a, b):
         """
@@ -62,18 +117,137 @@ class ImageSearch:
         results = sorted(results)[:maxResults]
         return results
     
+    def make_engine(self, order=None):
+        """
+        Search engine over the search frames, compressed codes when a compressor is set.
+        
+        Args:
+        - order (numpy.ndarray, optional): Row order of the search frames (default: None, dictionary order)
+        
+        Returns:
+        - MatrixSearch: MatrixSearch, or CompressedSearch with the same interface
+        """
+        if self.compressor is None:
+            features = np.asarray(self.search_index_dict['features'])
+            features = features if order is None else features[order]
+            return MatrixSearch(features, metric=self.metric, block_size=self.block_size)
+        
+        codes = self.search_index_dict.get('codes')
+        if codes is None:
+            codes = self.compressor.encode(self.search_index_dict['features'])
+        codes = codes if order is None else codes[order]
+        return CompressedSearch(self.compressor, codes, block_size=self.block_size)
+    
+    def search(self, k=1):
+        """
+        Find the k nearest search frames of every query with blocked matrix products.
+        
+        Args:
+        - k (int): Number of neighbours per query (default: 1)
+        
+        Returns:
+        - numpy.ndarray: (Q, k) distances sorted in ascending order
+        - numpy.ndarray: (Q, k) indices into the search features
+        """
+        engine = self.make_engine()
+        return engine.search(self.query_index_dict['features'], k=k)
+    
+    def expected_positions(self, engine, queries, query_times):
+        """
+        Expected search position of every time-ordered query. A few anchor queries are searched against the whole video,
+        their matches are made monotonic, and the other queries are interpolated between them by time.
+        
+        Args:
+        - engine (MatrixSearch): Engine over the time-ordered search features
+        - queries (numpy.ndarray): (Q, D) time-ordered query features
+        - query_times (numpy.ndarray): (Q,) sorted query timestamps
+        
+        Returns:
+        - numpy.ndarray: (Q,) expected search positions
+        """
+        anchors = np.unique(np.linspace(0, len(queries) - 1, min(self.n_anchors, len(queries))).round().astype(int))
+        _, matches = engine.search(queries[anchors], k=1)
+        # 두 영상은 같은 방향으로 진행하므로 anchor 위치도 증가해야 한다
+        anchor_positions = np.maximum.accumulate(matches[:, 0])
+        if len(anchors) == 1:
+            return np.full(len(queries), anchor_positions[0], dtype=np.int64)
+        return np.interp(query_times, query_times[anchors], anchor_positions).round().astype(np.int64)
+    
+    def align(self):
+        """
+        Monotonic banded alignment of the query sequence to the search sequence.
+        Queries and search frames are ordered by timestamp, every query is compared only with the search frames
+        within window of its expected position, and dynamic programming picks the non-decreasing assignment
+        with the smallest total distance, so the comparison count is about Q * (2 * window + 1) instead of Q * S.
+        
+        Returns:
+        - numpy.ndarray: (Q,) distance of every query to its aligned search frame
+        - numpy.ndarray: (Q,) index of the aligned search frame in the search dictionary
+        """
+        query_features = np.asarray(self.query_index_dict['features'])
+        num_search = len(self.search_index_dict['codes' if 'codes' in self.search_index_dict else 'features'])
+        query_times = frame_times(self.query_index_dict.get('name', range(len(query_features))))
+        search_times = frame_times(self.search_index_dict.get('name', range(num_search)))
+        if len(query_features) == 0:
+            return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64)
+        query_order = np.argsort(query_times, kind='stable')
+        search_order = np.argsort(search_times, kind='stable')
+        window = self.window if self.window is not None else max(25, num_search // 20)
+        
+        engine = self.make_engine(search_order)
+        queries = engine.prepare(query_features[query_order])
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        centers = self.expected_positions(engine, query_features[query_order], query_times[query_order])
+        
+        lows = np.clip(centers - window, 0, num_search - 1)
+        highs = np.clip(centers + window + 1, 1, num_search)
+        distances = []
+        backpointers = []
+        cost = None
+        for r in range(len(queries)):
+            lo, hi = lows[r], highs[r]
+            d = engine.block_distances(queries[r:r + 1], query_sq_norms[r:r + 1], lo, hi)[0]
+            if self.metric == 'l2':
+                d = np.sqrt(d)
+            distances.append(d)
+            if cost is None:
+                cost = d.astype(np.float64)
+                backpointers.append(None)
+                continue
+            
+            # 이전 query의 band에서 j 이하 위치까지의 최소 누적 비용과 그 위치
+            prev_lo = lows[r - 1]
+            prefix_min = np.minimum.accumulate(cost)
+            positions = np.arange(len(cost))
+            prefix_arg = np.maximum.accumulate(np.where(cost == prefix_min, positions, 0))
+            k = np.minimum(np.arange(lo, hi) - prev_lo, len(cost) - 1)
+            cost = d + prefix_min[k]
+            backpointers.append(prefix_arg[k] + prev_lo)
+        
+        path = np.empty(len(queries), dtype=np.int64)
+        path[-1] = lows[-1] + np.argmin(cost)
+        for r in range(len(queries) - 1, 0, -1):
+            path[r - 1] = backpointers[r][path[r] - lows[r]]
+        
+        aligned_distances = np.empty(len(queries), dtype=np.float64)
+        aligned_indices = np.empty(len(queries), dtype=np.int64)
+        aligned_distances[query_order] = [distances[r][path[r] - lows[r]] for r in range(len(queries))]
+        aligned_indices[query_order] = search_order[path]
+        
+        comparisons = int((highs - lows).sum()) + min(self.n_anchors, len(queries)) * num_search
+        print(f'aligned {len(queries)} queries with {comparisons} comparisons ({len(queries) * num_search} for a full search)')
+        return aligned_distances, aligned_indices
+    
     def get_match_result(self):
         """
         Get matching results based on query and search features.
         
         Returns:
-        - list: Matching results
-        """
-        matching_result = []
-        for i in range(len(self.query_index_dict['features'])):
-            MAX_RESULTS = 1
-            queryIdx = i
-            queryFeatures = self.query_index_dict['features'][queryIdx]
-            results = self.perform_search(queryFeatures, self.search_index_dict, maxResults=MAX_RESULTS)
-            matching_result += results
-        return matching_result
+        - list: Matching results as [distance, search index] pairs, one per query
+        """
+        if self.mode == 'align':
+            distances, indices = self.align()
+            return [[float(d), int(i)] for d, i in zip(distances, indices)]
+        
+        distances, indices = self.search(k=1)
+        return [[float(d), int(i)] for d, i in zip(distances[:, 0], indices[:, 0])]
@@ -4,28 +4,32 @@ import pickle
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from pathlib import Path
 
-import torch
-from utils.customdataset import CustomDataset
-from torch.utils.data import DataLoader
+from utils.frame_loader import make_frame_loader, draft_size_for
 
-from efficientnet_pytorch import EfficientNet
+from utils.embedding_engine import EmbeddingEngine
+from common.frame_manifest import FrameManifest
+from common.frame_pack import list_frames
 
 class LatentFeaturesDict:
     """
     A class for extracting and managing latent features of images using EfficientNet.
 
     Parameters:
-        - path (str): Path to image files.
-        - batch_size (int): Batch size for the data loader.
-        - input_list (str, optional): Path to the image list file (default: None).
+        - path (str): Path to image files, or a FramePack path ending with '.pack'.
+        - batch_size (int, optional): Batch size for the data loader. None adapts it to the free memory of the device.
+        - input_list (str, list or FrameManifest, optional): Path to the image list file, a list of frame names without '.jpg',
+                                                             or the FrameManifest of the frames (default: None, every file in path).
+        - cache (FeatureCache, optional): On-disk feature cache. Only images missing from it are embedded (default: None).
+        - engine (EmbeddingEngine, optional): Embedding engine (default: fp32 on CUDA if available, otherwise cpu).
+        - draft (bool): Reduced-size JPEG decoding of the frames, see make_frame_loader() (default: False, full decode).
 
     Methods:
-        - __init__(path, batch_size, input_list=None): Initializes the LatentFeaturesDict class.
+        - __init__(path, batch_size, input_list=None, cache=None, engine=None, draft=False): Initializes the LatentFeaturesDict class.
+        - feature_version(draft=False): Cache version of the features, including the decode path.
         - make_dataframe(): Converts image files to a DataFrame.
-        - make_dataloader(): Creates a data loader using the DataFrame.
-        - get_latent_features(): Extracts latent features of images.
+        - make_dataloader(df=None): Creates a multi-worker uint8 frame loader using the DataFrame.
+        - get_latent_features(df=None): Extracts latent features of images.
         - make_feature_dictionary(): Generates a feature dictionary containing latent features.
 
     Example:
@@ -33,22 +37,43 @@ class LatentFeaturesDict:
         feature_dictionary = features_dict.make_feature_dictionary()
     """
     
-    def __init__(self, path, batch_size, input_list=None):
+    # 모델이나 전처리를 바꾸면 캐시된 feature가 재사용되지 않도록 버전을 올린다
+    FEATURE_VERSION = 'efficientnet-b4|extract_features|avgpool|resize380|imagenet-norm'
+    
+    def __init__(self, path, batch_size, input_list=None, cache=None, engine=None, draft=False):
         """
         Initializes the LatentFeaturesDict class.
         
         Args:
         - path (str): Path to image files
-        - batch_size (int): Batch size for the data loader
-        - input_list (str, optional): Path to the image list file (default: None)
+        - batch_size (int, optional): Batch size for the data loader (None: adaptive)
+        - input_list (str, list or FrameManifest, optional): Path to the image list file, a list of frame names, or a FrameManifest (default: None)
+        - cache (FeatureCache, optional): On-disk feature cache (default: None)
+        - engine (EmbeddingEngine, optional): Embedding engine (default: None)
+        - draft (bool): Reduced-size JPEG decoding of the frames (default: False)
         """
         self.path = path
         self.batch_size = batch_size
-        self.model = EfficientNet.from_pretrained('efficientnet-b4')
-        self.model = self.model.eval()
-        self.device = torch.device("cuda")
-        self.model = self.model.to(self.device)
+        self.engine = engine if engine is not None else EmbeddingEngine()
+        self.device = self.engine.device
         self.input_list = input_list
+        self.cache = cache
+        self.draft = draft
+
+    @classmethod
+    def feature_version(cls, draft=False):
+        """
+        Cache version of the features: FEATURE_VERSION and the decode path, since draft decoding changes the features.
+        Build the FeatureCache with the same draft as the LatentFeaturesDict using it.
+
+        Args:
+        - draft (bool): Reduced-size JPEG decoding of the frames (default: False)
+
+        Returns:
+        - str: Version string such as '...|fulldecode' or '...|draft(285, 285)'
+        """
+        draft_size = draft_size_for(380, draft)
+        return cls.FEATURE_VERSION + ('|fulldecode' if draft_size is None else f'|draft{draft_size}')
     
     def make_dataframe(self):
         """
@@ -58,7 +83,12 @@ class LatentFeaturesDict:
         - pandas.DataFrame: DataFrame containing information about image files
         """
         df = pd.DataFrame()
-        if self.input_list: # If a query list exists
+        if isinstance(self.input_list, FrameManifest): # Image paths of the manifest, already in time order
+            df['image'] = self.input_list.paths()
+        elif isinstance(self.input_list, (list, tuple)): # Frame names given directly
+            df['image'] = [f.strip() for f in self.input_list]
+            df['image'] = self.path + '/' + df['image'].astype(str) + '.jpg'
+        elif self.input_list: # If a query list exists
             query_list = []
             with open(self.input_list, 'rb') as f:
                 file = pickle.load(f)
@@ -67,39 +97,63 @@ class LatentFeaturesDict:
             df['image'] = [f for f in query_list]
             df['image'] = self.path + '/' + df['image'].astype(str) + '.jpg'
         else:   
-            df['image'] = [f for f in os.listdir(Path(self.path))]
+            df['image'] = [f for f in list_frames(self.path)]
             df['image'] = self.path + '/' + df['image'].astype(str)
         return df
     
-    def make_dataloader(self):
+    def make_dataloader(self, df=None):
         """
-        Create a data loader using the DataFrame.
+        Create a multi-worker data loader of pre-resized uint8 frames using the DataFrame.
+        
+        Args:
+        - df (pandas.DataFrame, optional): DataFrame of the images to load (default: make_dataframe())
         
         Returns:
         - torch.utils.data.DataLoader: Image data loader
         """
-        df = self.make_dataframe()
-        dataset = CustomDataset(dataFrame=df)
-        dataloader = DataLoader(dataset=dataset, batch_size=self.batch_size, shuffle=False)
-        return dataloader
+        if df is None:
+            df = self.make_dataframe()
+        return make_frame_loader(df, self.device, batch_size=self.batch_size, draft=self.draft)
     
-    def get_latent_features(self):
+    def get_latent_features(self, df=None):
         """
-        Extract latent features of images.
+        Extract latent features of images. With a cache, only images missing from it are embedded.
+        
+        Args:
+        - df (pandas.DataFrame, optional): DataFrame of the images (default: make_dataframe())
         
         Returns:
         - numpy.ndarray: Vector of latent features of images
         """
-        df = self.make_dataframe()
-        dataloader = self.make_dataloader()
+        if df is None:
+            df = self.make_dataframe()
+        latent_features = np.zeros((len(df), 1792), dtype=np.float32)
+        missing = np.ones(len(df), dtype=bool)
+        
+        if self.cache is not None:
+            keys = [self.cache.key(image) for image in df.image.values]
+            cached_features, hits = self.cache.lookup(keys)
+            latent_features[hits] = cached_features[hits]
+            missing = ~hits
+        
+        missing_df = df[missing].reset_index(drop=True)
+        if len(missing_df) == 0:
+            return latent_features
+        
+        dataloader = self.make_dataloader(missing_df)
+        new_features = np.zeros((len(missing_df), 1792), dtype=np.float32)
         
-        images = df.image.values
-        latent_features = np.zeros((len(df), 1792))
+        offset = 0
+        for image in tqdm(dataloader):
+            feature_vec = self.engine.embed(image)
+            new_features[offset:offset + len(feature_vec)] = feature_vec
+            offset += len(feature_vec)
+        latent_features[missing] = new_features
         
-        for i, image in enumerate(tqdm(dataloader)):
-            features = self.model.extract_features(image.to(self.device))
-            feature_vec = torch.nn.AdaptiveAvgPool2d(1)(features).cpu().view(-1, 1792).detach().numpy()
-            latent_features[i * self.batch_size:(i+1) * self.batch_size] = feature_vec
+        if self.cache is not None:
+            self.cache.store([key for key, miss in zip(keys, missing) if miss], new_features)
+            self.cache.save()
+            print('feature cache:', self.cache.stats())
         
         del feature_vec
         gc.collect()
@@ -113,11 +167,12 @@ class LatentFeaturesDict:
         - dict: Dictionary containing image features
         """
         df = self.make_dataframe()
-        latent_features = self.get_latent_features()
+        # 프레임 목록은 한 번만 만들어 feature 추출에도 그대로 쓴다
+        latent_features = self.get_latent_features(df)
         
         indexes = list(range(0, len(df)))
         images_path = df.image.values
-        images_names = [f for f in os.listdir(Path(self.path))]
+        images_names = [os.path.basename(f) for f in images_path]
         feature_dict = {'indexes': indexes, 'name': images_names, 'path': images_path, 'features': latent_features}
         
         return feature_dict
@@ -0,0 +1,134 @@
+import numpy as np
+
+class MatrixSearch:
+    """
+    A class for exact nearest neighbour search with blocked matrix products.
+    Query x search distances are computed one block at a time with BLAS, and the top-k of each block
+    is merged with partial selection, so memory is bounded by block_size regardless of the number of frames.
+
+    Parameters:
+        - search_features (numpy.ndarray): (S, D) matrix of search features.
+        - metric (str): 'l2' (Euclidean distance) or 'cosine' (1 - cosine similarity). Default is 'l2'.
+        - block_size (int): Number of query and search rows per block. A block holds block_size^2 distances. Default is 2048.
+        - dtype (numpy.dtype): Dtype of the distance computation. Default is numpy.float32.
+
+    Methods:
+        - __init__(search_features, metric, block_size, dtype): Initializes the MatrixSearch class.
+        - prepare(features): Converts features to the computation dtype and normalizes them for cosine.
+        - block_distances(queries, query_sq_norms, start, stop): Distances between a query block and a search block.
+        - search(query_features, k): Finds the k nearest search rows of every query.
+
+    Example:
+        engine = MatrixSearch(search_features, metric='cosine', block_size=4096)
+        distances, indices = engine.search(query_features, k=5)
+    """
+
+    METRICS = ('l2', 'cosine')
+
+    def __init__(self, search_features, metric='l2', block_size=2048, dtype=np.float32):
+        """
+        Initialize the MatrixSearch class.
+
+        Args:
+        - search_features (numpy.ndarray): (S, D) matrix of search features
+        - metric (str): 'l2' or 'cosine' (default: 'l2')
+        - block_size (int): Number of query and search rows per block (default: 2048)
+        - dtype (numpy.dtype): Dtype of the distance computation (default: numpy.float32)
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Error: Unknown metric '{metric}'.")
+
+        self.metric = metric
+        self.block_size = block_size
+        self.dtype = dtype
+        self.search_features = self.prepare(search_features)
+        self.search_sq_norms = np.einsum('ij,ij->i', self.search_features, self.search_features)
+
+    def prepare(self, features):
+        """
+        Convert features to the computation dtype and L2-normalize them for the cosine metric.
+
+        Args:
+        - features (numpy.ndarray): (N, D) feature matrix
+
+        Returns:
+        - numpy.ndarray: Prepared (N, D) feature matrix
+        """
+        features = np.ascontiguousarray(features, dtype=self.dtype)
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(features, axis=1, keepdims=True)
+            features = features / np.maximum(norms, np.finfo(self.dtype).tiny)
+        return features
+
+    def block_distances(self, queries, query_sq_norms, start, stop):
+        """
+        Distances between a prepared query block and the search rows [start, stop).
+
+        Args:
+        - queries (numpy.ndarray): Prepared (q, D) query block
+        - query_sq_norms (numpy.ndarray): Squared norms of the query block
+        - start (int): First search row
+        - stop (int): One past the last search row
+
+        Returns:
+        - numpy.ndarray: (q, stop - start) distance matrix (squared distances for 'l2')
+        """
+        products = queries @ self.search_features[start:stop].T
+        if self.metric == 'cosine':
+            return 1 - products
+        distances = query_sq_norms[:, None] - 2 * products + self.search_sq_norms[None, start:stop]
+        return np.maximum(distances, 0, out=distances)
+
+    def search(self, query_features, k=1):
+        """
+        Find the k nearest search rows of every query.
+
+        Args:
+        - query_features (numpy.ndarray): (Q, D) matrix of query features
+        - k (int): Number of neighbours per query (default: 1)
+
+        Returns:
+        - numpy.ndarray: (Q, k) distances sorted in ascending order
+        - numpy.ndarray: (Q, k) indices into the search features
+        """
+        queries_all = self.prepare(query_features)
+        num_search = len(self.search_features)
+        k = min(k, num_search)
+        distances = np.empty((len(queries_all), k), dtype=self.dtype)
+        indices = np.empty((len(queries_all), k), dtype=np.int64)
+
+        for q_start in range(0, len(queries_all), self.block_size):
+            queries = queries_all[q_start:q_start + self.block_size]
+            query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+            best_d = np.full((len(queries), k), np.inf, dtype=self.dtype)
+            best_i = np.zeros((len(queries), k), dtype=np.int64)
+
+            for s_start in range(0, num_search, self.block_size):
+                s_stop = min(s_start + self.block_size, num_search)
+                block = self.block_distances(queries, query_sq_norms, s_start, s_stop)
+
+                if k == 1:
+                    arg = np.argmin(block, axis=1)
+                    block_best = block[np.arange(len(block)), arg]
+                    # 같은 거리면 앞선 프레임을 유지한다
+                    better = block_best < best_d[:, 0]
+                    best_d[better, 0] = block_best[better]
+                    best_i[better, 0] = arg[better] + s_start
+                    continue
+
+                candidates_d = np.concatenate([best_d, block], axis=1)
+                candidates_i = np.concatenate([best_i, np.broadcast_to(np.arange(s_start, s_stop), block.shape)], axis=1)
+                if candidates_d.shape[1] > k:
+                    part = np.argpartition(candidates_d, k - 1, axis=1)[:, :k]
+                    candidates_d = np.take_along_axis(candidates_d, part, axis=1)
+                    candidates_i = np.take_along_axis(candidates_i, part, axis=1)
+                best_d, best_i = candidates_d, candidates_i
+
+            order = np.lexsort((best_i, best_d), axis=1)
+            best_d = np.take_along_axis(best_d, order, axis=1)
+            best_i = np.take_along_axis(best_i, order, axis=1)
+            if self.metric == 'l2':
+                best_d = np.sqrt(best_d)
+            distances[q_start:q_start + len(queries)] = best_d
+            indices[q_start:q_start + len(queries)] = best_i
+        return distances, indices
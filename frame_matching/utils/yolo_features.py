@@ -0,0 +1,94 @@
+import pickle
+import numpy as np
+
+from utils.image_search import ImageSearch, frame_times
+from common.frame_manifest import FrameManifest
+
+class YoloFeaturesDict:
+    """
+    A class for loading the pooled YOLO backbone features saved during segmentation (YOLO/utils/backbone_features.py)
+    as a feature dictionary, in place of EfficientNet features.
+
+    Parameters:
+        - path (str): Path to the backbone_features.pkl file of a video.
+        - input_list (str, list or FrameManifest, optional): Path to the image list file, a list of frame names without '.jpg',
+                                                             or a FrameManifest. Default is None (every frame of the file).
+
+    Methods:
+        - __init__(path, input_list=None): Initializes the YoloFeaturesDict class.
+        - make_feature_dictionary(): Generates a feature dictionary of the listed frames, in list order.
+
+    Example:
+        features_dict = YoloFeaturesDict(path='runs/segment/inference_video_01/backbone_features.pkl', input_list='_image_info.txt')
+        feature_dictionary = features_dict.make_feature_dictionary()
+    """
+
+    def __init__(self, path, input_list=None):
+        """
+        Initializes the YoloFeaturesDict class.
+
+        Args:
+        - path (str): Path to the backbone_features.pkl file
+        - input_list (str, list or FrameManifest, optional): Path to the image list file, a list of frame names, or a FrameManifest (default: None)
+        """
+        self.path = path
+        self.input_list = input_list
+
+    def make_feature_dictionary(self):
+        """
+        Generate a feature dictionary of the listed frames, in list order.
+
+        Returns:
+        - dict: Dictionary containing image features
+        """
+        with open(self.path, 'rb') as f:
+            feature_dict = pickle.load(f)
+        if not self.input_list:
+            return feature_dict
+
+        if isinstance(self.input_list, FrameManifest):
+            names = self.input_list.names(extension=True)
+        elif isinstance(self.input_list, (list, tuple)):
+            names = [name.strip() + '.jpg' for name in self.input_list]
+        else:
+            with open(self.input_list, 'rb') as f:
+                names = [name.strip() + '.jpg' for name in pickle.load(f)]
+        rows = {name: i for i, name in enumerate(feature_dict['name'])}
+        missing = [name for name in names if name not in rows]
+        if missing:
+            raise ValueError(f"Error: {len(missing)} listed frames are missing from {self.path}, e.g. {missing[0]}.")
+
+        selected = np.array([rows[name] for name in names], dtype=np.int64)
+        return {
+            'indexes': list(range(len(names))),
+            'name': names,
+            'path': np.asarray(feature_dict['path'])[selected],
+            'features': feature_dict['features'][selected],
+        }
+
+def compare_embeddings(reference, candidate, mode='nearest', tolerance_sec=0.5):
+    """
+    Agreement of the matches found with two embeddings of the same query and search frames.
+
+    Args:
+    - reference (tuple): (query_dict, search_dict) of the reference embedding, e.g. EfficientNet
+    - candidate (tuple): (query_dict, search_dict) of the candidate embedding, e.g. YOLO backbone features
+    - mode (str): ImageSearch mode used for both (default: 'nearest')
+    - tolerance_sec (float): Largest time difference between two matches that still agree (default: 0.5)
+
+    Returns:
+    - dict: 'exact' share of identical matches and 'within_tolerance' share of matches within tolerance_sec
+    """
+    matched = []
+    for query_dict, search_dict in (reference, candidate):
+        result = ImageSearch(query_dict, search_dict, mode=mode).get_match_result()
+        matched.append(np.array([search_dict['name'][i] for _, i in result]))
+
+    exact = matched[0] == matched[1]
+    close = np.abs(frame_times(matched[0]) - frame_times(matched[1])) <= tolerance_sec
+    agreement = {
+        'exact': float(exact.mean()) if len(exact) else 1.0,
+        'within_tolerance': float(close.mean()) if len(close) else 1.0,
+    }
+    print(f"embedding agreement: {agreement['exact']:.3f} exact, {agreement['within_tolerance']:.3f} within {tolerance_sec}s")
+    return agreement